@@ -6,8 +6,19 @@ import sqlite3
 import re
 import shutil
 import io
+import hashlib
+import json
+import threading
 import calendar
+import time
+import itertools
+import bisect
+import math
+import multiprocessing
 from datetime import datetime
+from collections import OrderedDict, deque
+from queue import Empty
+from concurrent.futures import ProcessPoolExecutor, wait
 from PyQt6.QtWidgets import *
 from PyQt6.QtCore import *
 from PyQt6.QtGui import *
@@ -27,17 +38,259 @@ from docx.shared import Inches, Pt
 from docx.enum.text import WD_ALIGN_PARAGRAPH
 import openpyxl
 from openpyxl.styles import Font, Alignment
+from openpyxl.utils import get_column_letter
 from openpyxl.drawing.image import Image as ExcelImage
 
+# ==================== ЗАПИСИ ОТЧЕТА ====================
+class ReportRecords:
+    """
+    Строки разобранного отчета, собранные по колонкам, - то, что парсеры отдают в save_data.
+    Кусок строк добавляется массивами колонок (add), одиночные строки - add_row.
+    Значение, общее для всех строк куска (компания, тип документа, 0.0), хранится один раз;
+    колонки, которые парсер не задал, получают значения по умолчанию только при записи
+    """
+
+    # Метка "значение по умолчанию" для строк, где колонка не задана. Ellipsis, а не object():
+    # записи передаются из процессов параллельного импорта, а синглтон переживает pickle
+    _DEFAULT = Ellipsis
+
+    def __init__(self):
+        self._length = 0
+        self._parts = {}  # колонка -> [(значение или массив, строк), ...]
+
+    def __len__(self):
+        return self._length
+
+    def add(self, count, keep=None, **columns):
+        """
+        Кусок из count строк: колонки - массивы длины count или одно значение на все строки.
+        keep - маска строк куска, которые попадают в записи
+        """
+        if keep is not None:
+            keep = np.asarray(keep, dtype=bool)
+            rows = int(keep.sum())
+        else:
+            rows = count
+        if rows == 0:
+            return
+
+        for name in self._parts.keys() - columns.keys():
+            self._parts[name].append((self._DEFAULT, rows))
+        for name, value in columns.items():
+            if isinstance(value, (list, tuple, np.ndarray)):
+                value = value if isinstance(value, np.ndarray) else np.array(value, dtype=object)
+                if keep is not None:
+                    value = value[keep]
+            parts = self._parts.get(name)
+            if parts is None:
+                parts = self._parts[name] = [(self._DEFAULT, self._length)] if self._length else []
+            parts.append((value, rows))
+        self._length += rows
+
+    def add_row(self, **values):
+        """Одна строка; для отчетов, где строк немного (итоги ОСВ, контрагенты)"""
+        self.add(1, **values)
+
+    def columns(self):
+        return list(self._parts)
+
+    def column(self, name, default=None):
+        """
+        Значения колонки: одно значение, если оно одинаково для всех строк,
+        иначе массив длины len(self). Не заданная колонка - default
+        """
+        parts = [(default if value is self._DEFAULT else value, rows) for value, rows in self._parts.get(name, [])]
+        if all(not isinstance(value, np.ndarray) for value, _ in parts):
+            constants = {(type(value), value) for value, _ in parts}
+            if len(constants) <= 1:
+                return parts[0][0] if parts else default
+        return np.concatenate([
+            value if isinstance(value, np.ndarray)
+            else np.full(rows, value, dtype=None if isinstance(value, (int, float)) else object)
+            for value, rows in parts
+        ])
+
+    def to_frame(self):
+        """DataFrame с заданными колонками - для просмотра и отладки"""
+        return pd.DataFrame({name: self.column(name) for name in self._parts}, index=range(self._length))
+
+
 # ==================== БАЗА ДАННЫХ ====================
 class DatabaseManager:
+
+    # Индексы таблицы reports: компания+период, тип документа+период,
+    # товарная группа и ORDER BY period_start DESC, company без сортировки в памяти;
+    # idx_reports_table_order - постраничное чтение таблицы (ReportsTableModel)
+    # Создаются миграцией 3; новый индекс добавляется отдельной миграцией
+    REPORT_INDEXES = {
+        'idx_reports_company_period': 'reports(company, period_start)',
+        'idx_reports_doc_type_period': 'reports(doc_type, period_start)',
+        'idx_reports_product_group': 'reports(product_group)',
+        'idx_reports_period_company': 'reports(period_start DESC, company)',
+        'idx_reports_table_order': "reports(IFNULL(period_start, '') DESC, IFNULL(company, ''))",
+        'idx_reports_import_batch': 'reports(import_batch_id)',
+        'idx_import_history_filename': 'import_history(filename)',
+    }
+
+    # Порядок таблицы внутри фильтра по компании, типу документа и товарной группе:
+    # после равенства по первой колонке строки идут в порядке idx_reports_table_order,
+    # и страница ReportsTableModel читается без сортировки всей выборки. Создаются миграцией 6,
+    # она же удаляет idx_reports_product_group
+    TABLE_ORDER_INDEXES = {
+        'idx_reports_company_table_order': "reports(company, IFNULL(period_start, '') DESC, IFNULL(company, ''))",
+        'idx_reports_doc_type_table_order': "reports(doc_type, IFNULL(period_start, '') DESC, IFNULL(company, ''))",
+        'idx_reports_group_table_order': "reports(product_group, IFNULL(period_start, '') DESC, IFNULL(company, ''))",
+    }
+
+    # Все колонки reports (кроме id и import_date) со значениями по умолчанию.
+    # Порядок задает список колонок пакетного INSERT в save_data
+    REPORT_COLUMNS = {
+        'company': '',
+        'period_start': '',
+        'period_end': '',
+        'doc_type': '',
+        'account': '',
+        'product_group': '',
+        'nomenclature': '',
+        'article': '',
+        'revenue': 0.0,
+        'cost_price': 0.0,
+        'gross_profit': 0.0,
+        'sales_expenses': 0.0,
+        'other_income_expenses': 0.0,
+        'net_profit': 0.0,
+        'vat_deductible': 0.0,
+        'vat_to_budget': 0.0,
+        'quantity': 0,
+        'seller': '',
+        'buyer': '',
+        'document_number': '',
+        'document_date': '',
+        'operation_code': '',
+        'acceptance_date': '',
+        'payment_document': '',
+        'purchase_amount_with_vat': 0.0,
+        'sales_amount_without_vat': 0.0,
+        'sales_amount_with_vat': 0.0,
+        'osv_begin_balance': 0.0,
+        'osv_end_balance': 0.0,
+        'osv_turnover_debit': 0.0,
+        'osv_turnover_credit': 0.0,
+        'osv_begin_balance_debit': 0.0,
+        'osv_begin_balance_credit': 0.0,
+        'osv_end_balance_debit': 0.0,
+        'osv_end_balance_credit': 0.0
+    }
+
+    # Свертка для итогов и квартальных графиков: компания × квартал × тип документа × группа
+    ROLLUP_SUM_COLUMNS = [
+        'sales_amount_with_vat', 'sales_amount_without_vat', 'purchase_amount_with_vat',
+        'vat_deductible', 'vat_to_budget', 'net_profit'
+    ]
+
+    # Квартал из period_start ('2025-02-01' -> '2025-Q1'), пусто для нераспознанных дат
+    QUARTER_SQL = (
+        "CASE WHEN period_start GLOB '[0-9][0-9][0-9][0-9]-[0-9][0-9]*' "
+        "THEN substr(period_start, 1, 4) || '-Q' || ((CAST(substr(period_start, 6, 2) AS INTEGER) + 2) / 3) "
+        "ELSE '' END"
+    )
+
+    # Служебные колонки reports, которые не показываются и не выгружаются
+    INTERNAL_COLUMNS = {'import_batch_id'}
+
+    # Названия типов документов (doc_type) в таблице и при сортировке по этой колонке
+    DOC_TYPE_NAMES = {
+        'purchase_book': 'Книга покупок',
+        'sales_book': 'Книга продаж',
+        'osv_19': 'ОСВ 19',
+        'osv_41': 'ОСВ 41',
+        'osv_41_summary': 'ОСВ 41 (итоги)',
+        'osv_44_summary': 'ОСВ 44 (итоги)',
+        'osv_60': 'ОСВ 60',
+        'osv_60_summary': 'ОСВ 60 (итоги)'
+    }
+
+    # Полнотекстовый поиск (FTS5): индекс reports_fts по этим колонкам reports с rowid = reports.id.
+    # Хранит только индекс (content='reports'), обновляется в save_data и clear_all
+    SEARCH_COLUMNS = ['seller', 'buyer', 'nomenclature', 'article', 'document_number']
+
+    # Наборы колонок для get_filtered_data(columns=...): каждый потребитель читает только то,
+    # что использует. 'export' - все колонки кроме служебных (см. _projection)
+    COLUMN_SETS = {
+        'table': [
+            'id', 'company', 'period_start', 'period_end', 'doc_type', 'account', 'product_group',
+            'seller', 'buyer', 'nomenclature', 'article',
+            'document_number', 'document_date', 'operation_code', 'acceptance_date', 'payment_document',
+            'purchase_amount_with_vat', 'sales_amount_without_vat', 'sales_amount_with_vat',
+            'revenue', 'cost_price', 'gross_profit',
+            'sales_expenses', 'other_income_expenses', 'net_profit',
+            'vat_deductible', 'vat_to_budget', 'quantity',
+            'osv_begin_balance_debit', 'osv_begin_balance_credit',      # Сальдо на начало
+            'osv_turnover_debit', 'osv_turnover_credit',                 # Обороты
+            'osv_end_balance_debit', 'osv_end_balance_credit',           # Сальдо на конец
+            'import_date'
+        ],
+        'totals': [
+            'doc_type', 'sales_amount_with_vat', 'sales_amount_without_vat', 'vat_to_budget',
+            'purchase_amount_with_vat', 'vat_deductible'
+        ],
+        'export': None,
+    }
+
     def __init__(self, db_path='buh_tuund.db'):
+        self.db_path = db_path
         self.conn = sqlite3.connect(db_path, check_same_thread=False)
-        self.create_tables()
-        
-    def create_tables(self):
-        cursor = self.conn.cursor()
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.last_import_stats = None
+        self._search_state = None  # (запрос MATCH, data_version, найдено строк) в temp.search_matches
+        self._facets = None        # (data_version, значения списков фильтров), см. get_facets
+        self.migrate()
+
+    # ==================== МИГРАЦИИ СХЕМЫ ====================
+    # Версия схемы хранится в PRAGMA user_version: миграция N переводит БД с версии N-1 на N.
+    # Примененные миграции не меняются - новые колонки, индексы и таблицы добавляются
+    # новой миграцией в конец списка
+    MIGRATIONS = [
+        (1, '_migration_reports_columns'),
+        (2, '_migration_import_history'),
+        (3, '_migration_report_indexes'),
+        (4, '_migration_reports_rollup'),
+        (5, '_migration_reports_search'),
+        (6, '_migration_table_order_indexes'),
+    ]
+
+    def migrate(self):
+        """
+        Применяет недостающие миграции одной транзакцией.
+        На актуальной БД это одно чтение user_version
+        """
+        version = self.conn.execute("PRAGMA user_version").fetchone()[0]
+        pending = [(number, name) for number, name in self.MIGRATIONS if number > version]
 
+        if pending:
+            cursor = self.conn.cursor()
+            cursor.execute("BEGIN")
+            try:
+                for number, name in pending:
+                    print(f"Миграция схемы БД {number}: {name}")
+                    getattr(self, name)(cursor)
+                cursor.execute(f"PRAGMA user_version = {pending[-1][0]}")
+                self.conn.commit()
+            except Exception:
+                self.conn.rollback()
+                raise
+
+        self.table_columns = [row[1] for row in self.conn.execute("PRAGMA table_info(reports)")]
+
+    @staticmethod
+    def _add_missing_columns(cursor, table, columns):
+        """ALTER TABLE ADD COLUMN для колонок, которых нет в таблице (БД до появления user_version)"""
+        existing = [col[1] for col in cursor.execute(f"PRAGMA table_info({table})")]
+        for col, typ in columns.items():
+            if col not in existing:
+                cursor.execute(f"ALTER TABLE {table} ADD COLUMN {col} {typ}")
+
+    def _migration_reports_columns(self, cursor):
         # Основная таблица reports
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS reports (
@@ -61,11 +314,8 @@ class DatabaseManager:
             )
         ''')
 
-        # Добавляем новые колонки, если их нет
-        cursor.execute("PRAGMA table_info(reports)")
-        existing = [col[1] for col in cursor.fetchall()]
-        
-        new_columns = {
+        self._add_missing_columns(cursor, 'reports', {
+            # Книги покупок и продаж
             'seller': 'TEXT',
             'buyer': 'TEXT',
             'document_number': 'TEXT',
@@ -75,46 +325,22 @@ class DatabaseManager:
             'payment_document': 'TEXT',
             'purchase_amount_with_vat': 'REAL',
             'sales_amount_without_vat': 'REAL',
-            'sales_amount_with_vat': 'REAL'
-        }
-        
-        for col, typ in new_columns.items():
-            if col not in existing:
-                cursor.execute(f"ALTER TABLE reports ADD COLUMN {col} {typ}")
-
-        # Добавляем колонки для итогов ОСВ
-        osv_summary_columns = {
+            'sales_amount_with_vat': 'REAL',
+            # Итоги ОСВ
             'osv_begin_balance': 'REAL',      # Сальдо на начало
             'osv_end_balance': 'REAL',        # Сальдо на конец
             'osv_turnover_debit': 'REAL',     # Обороты по дебету
             'osv_turnover_credit': 'REAL',    # Обороты по кредиту
-        }
-
-        for col, typ in osv_summary_columns.items():
-            if col not in existing:
-                cursor.execute(f"ALTER TABLE reports ADD COLUMN {col} {typ}") 
-
-        # Добавляем колонки для ОСВ 60
-        osv_60_columns = {
+            # ОСВ 60
             'osv_begin_balance_debit': 'REAL',
             'osv_begin_balance_credit': 'REAL',
             'osv_end_balance_debit': 'REAL',
             'osv_end_balance_credit': 'REAL',
-        }
-
-        for col, typ in osv_60_columns.items():
-            if col not in existing:
-                cursor.execute(f"ALTER TABLE reports ADD COLUMN {col} {typ}")       
-        
-        # 👇👇👇 СЮДА ВСТАВЛЯЕМ НОВУЮ КОЛОНКУ 👇👇👇
-        if 'account' not in existing:
-            cursor.execute("ALTER TABLE reports ADD COLUMN account TEXT")
-        # 👆👆👆
-
-        # Добавляем колонку "article" (артикул)
-        if 'article' not in existing:
-            cursor.execute("ALTER TABLE reports ADD COLUMN article TEXT")
+            'account': 'TEXT',
+            'article': 'TEXT',                # Артикул
+        })
 
+    def _migration_import_history(self, cursor):
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS import_history (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -124,2400 +350,4077 @@ class DatabaseManager:
             )
         ''')
 
-        self.conn.commit()
+        # Статистика скорости пакетной записи и отпечаток файла (хеш, размер, mtime)
+        self._add_missing_columns(cursor, 'import_history', {
+            'duration_sec': 'REAL',
+            'rows_per_sec': 'REAL',
+            'file_hash': 'TEXT',
+            'file_size': 'INTEGER',
+            'file_mtime': 'REAL',
+        })
+
+        # Пакет импорта (id записи import_history) - для замены строк при повторном импорте файла
+        self._add_missing_columns(cursor, 'reports', {'import_batch_id': 'INTEGER'})
+
+    def _migration_report_indexes(self, cursor):
+        # Индексы под реальные фильтры get_filtered_data и сортировку
+        for name, target in self.REPORT_INDEXES.items():
+            cursor.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {target}")
+
+    def _migration_reports_rollup(self, cursor):
+        # Свертка reports_rollup, обновляется в save_data в той же транзакции
+        sum_columns = ',\n'.join(f"                {col} REAL" for col in self.ROLLUP_SUM_COLUMNS)
+        cursor.execute(f'''
+            CREATE TABLE IF NOT EXISTS reports_rollup (
+                company TEXT NOT NULL,
+                quarter TEXT NOT NULL,
+                doc_type TEXT NOT NULL,
+                product_group TEXT NOT NULL,
+{sum_columns},
+                records_count INTEGER,
+                PRIMARY KEY (company, quarter, doc_type, product_group)
+            )
+        ''')
 
-    def save_data(self, df):
-        """Сохраняет данные из DataFrame в таблицу reports"""
-        df_to_save = df.copy()
-
-        # Все возможные колонки со значениями по умолчанию
-        all_columns = {
-            'company': '',
-            'period_start': '',
-            'period_end': '',
-            'doc_type': '',
-            'account': '',
-            'product_group': '',
-            'nomenclature': '',
-            'article': '',
-            'revenue': 0.0,
-            'cost_price': 0.0,
-            'gross_profit': 0.0,
-            'sales_expenses': 0.0,
-            'other_income_expenses': 0.0,
-            'net_profit': 0.0,
-            'vat_deductible': 0.0,
-            'vat_to_budget': 0.0,
-            'quantity': 0,
-            'seller': '',
-            'buyer': '',
-            'document_number': '',
-            'document_date': '',
-            'operation_code': '',
-            'acceptance_date': '',
-            'payment_document': '',
-            'purchase_amount_with_vat': 0.0,
-            'sales_amount_without_vat': 0.0,
-            'sales_amount_with_vat': 0.0,
-            'osv_begin_balance': 0.0,
-            'osv_end_balance': 0.0,
-            'osv_turnover_debit': 0.0,
-            'osv_turnover_credit': 0.0,
-            'osv_begin_balance_debit': 0.0,
-            'osv_begin_balance_credit': 0.0,
-            'osv_end_balance_debit': 0.0,
-            'osv_end_balance_credit': 0.0
-        }
+        # Для уже заполненной БД строим свертку один раз по всем строкам
+        if cursor.execute("SELECT 1 FROM reports LIMIT 1").fetchone():
+            print("Построение свертки reports_rollup...")
+            self._rebuild_rollup(cursor)
+
+    def _migration_reports_search(self, cursor):
+        # Индекс поиска: слова без учета регистра, префиксы 2-3 символов
+        # индексируются отдельно для поиска по мере ввода
+        cursor.execute(f"""
+            CREATE VIRTUAL TABLE IF NOT EXISTS reports_fts USING fts5(
+                {', '.join(self.SEARCH_COLUMNS)},
+                content='reports', content_rowid='id',
+                tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+            )
+        """)
+        if cursor.execute("SELECT 1 FROM reports LIMIT 1").fetchone():
+            print("Построение индекса поиска reports_fts...")
+            cursor.execute("INSERT INTO reports_fts(reports_fts) VALUES ('rebuild')")
+
+    def _migration_table_order_indexes(self, cursor):
+        for name, target in self.TABLE_ORDER_INDEXES.items():
+            cursor.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {target}")
+        # Равенство по product_group обслуживает idx_reports_group_table_order - лишний индекс
+        # только замедлял бы save_data
+        cursor.execute("DROP INDEX IF EXISTS idx_reports_product_group")
+
+    def save_data(self, df, filename=None, fingerprint=None):
+        """
+        Сохраняет данные из DataFrame в таблицу reports.
+        Один подготовленный INSERT с фиксированным списком колонок, строки подаются
+        итератором в executemany внутри одной транзакции.
+        Если передан filename - строки получают номер пакета из import_history,
+        а строки прошлого импорта этого же файла удаляются в той же транзакции.
+        """
+        started = time.perf_counter()
+        cursor = self.conn.cursor()
+        batch_id = None
+        replaced = 0
 
-        for col, default in all_columns.items():
-            if col not in df_to_save.columns:
-                df_to_save[col] = default
+        self._begin_import_session()
+        try:
+            if filename is not None:
+                filename = os.path.abspath(filename)
+                file_hash, file_size, file_mtime = fingerprint if fingerprint else (None, None, None)
+                old_batches = "WHERE import_batch_id IN (SELECT id FROM import_history WHERE filename = ?)"
+                cursor.execute(self._rollup_upsert_sql(old_batches, sign='-'), (filename,))
+                cursor.execute(self._search_sync_sql(old_batches, delete=True), (filename,))
+                cursor.execute(f"DELETE FROM reports {old_batches}", (filename,))
+                replaced = max(cursor.rowcount, 0)
+                if replaced > 0:
+                    print(f"Удалено строк прошлого импорта файла: {replaced}")
+                cursor.execute(
+                    "INSERT INTO import_history (filename, records_count, file_hash, file_size, file_mtime) VALUES (?, 0, ?, ?, ?)",
+                    (filename, file_hash, file_size, file_mtime)
+                )
+                batch_id = cursor.lastrowid
+
+            last_id = cursor.execute("SELECT IFNULL(MAX(id), 0) FROM reports").fetchone()[0]
+            cursor.executemany(self._insert_sql, self._iter_report_rows(df, batch_id))
+            count = max(cursor.rowcount, 0)
+
+            # Свертка: добавляем только что вставленные строки, убираем опустевшие ключи
+            cursor.execute(self._rollup_upsert_sql("WHERE id > ?"), (last_id,))
+            cursor.execute("DELETE FROM reports_rollup WHERE records_count <= 0")
+            cursor.execute(self._search_sync_sql("WHERE id > ?"), (last_id,))
+
+            duration = time.perf_counter() - started
+            rows_per_sec = count / duration if duration > 0 else 0.0
+            if batch_id is not None:
+                cursor.execute(
+                    "UPDATE import_history SET records_count = ?, duration_sec = ?, rows_per_sec = ? WHERE id = ?",
+                    (count, duration, rows_per_sec, batch_id)
+                )
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+        finally:
+            self._end_import_session()
+
+        self._search_state = None
+        self._facets = None
+        self.last_import_stats = {'rows': count, 'duration_sec': duration, 'rows_per_sec': rows_per_sec,
+                                  'batch_id': batch_id, 'replaced': replaced}
+        print(f"Сохранено записей: {count} за {duration:.2f} с ({rows_per_sec:,.0f} строк/с)".replace(",", " "))
+        return count
+
+    @staticmethod
+    def file_fingerprint(file_path):
+        """Отпечаток файла: (sha256 содержимого, размер, mtime)"""
+        stat = os.stat(file_path)
+        digest = hashlib.sha256()
+        with open(file_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+        return digest.hexdigest(), stat.st_size, stat.st_mtime
+
+    def check_file_fingerprint(self, file_path):
+        """
+        Проверяет, менялся ли файл с прошлого импорта.
+        Возвращает (не изменился, отпечаток для save_data или None)
+        """
+        filename = os.path.abspath(file_path)
+        last = self.conn.execute(
+            "SELECT id, file_hash, file_size, file_mtime FROM import_history "
+            "WHERE filename = ? AND file_hash IS NOT NULL ORDER BY id DESC LIMIT 1",
+            (filename,)
+        ).fetchone()
+
+        stat = os.stat(file_path)
+        if last is not None and last[2] == stat.st_size and last[3] == stat.st_mtime:
+            return True, None
+
+        fingerprint = self.file_fingerprint(file_path)
+        if last is not None and last[1] == fingerprint[0]:
+            # Содержимое то же, сменилась только дата файла
+            self.conn.execute("UPDATE import_history SET file_mtime = ? WHERE id = ?", (fingerprint[2], last[0]))
+            self.conn.commit()
+            return True, None
+        return False, fingerprint
+
+    def _iter_report_rows(self, df, batch_id=None):
+        """
+        Готовит колонки целиком (значения по умолчанию, типы) и отдает строки кортежами.
+        df - DataFrame или ReportRecords; колонка с одним значением на все строки
+        подается itertools.repeat без списка на каждую строку
+        """
+        n = len(df)
+        if isinstance(df, ReportRecords):
+            column = df.column
+        else:
+            column = lambda col, default: df[col] if col in df.columns else default
 
-        # Числовые колонки
-        numeric_cols = [
-            'revenue', 'cost_price', 'gross_profit', 'sales_expenses',
-            'other_income_expenses', 'net_profit', 'vat_deductible', 'vat_to_budget',
-            'purchase_amount_with_vat', 'sales_amount_without_vat', 'sales_amount_with_vat'
-        ]
-        for col in numeric_cols:
-            if col in df_to_save.columns:
-                df_to_save[col] = pd.to_numeric(df_to_save[col], errors='coerce').fillna(0.0)
+        columns = []
+        for col, default in self.REPORT_COLUMNS.items():
+            values = column(col, default)
+            if not isinstance(values, (pd.Series, np.ndarray)):
+                columns.append(itertools.repeat(self._typed_value(values, default), n))
+                continue
+            values = pd.Series(values, copy=False)
+            if col == 'quantity':
+                columns.append(pd.to_numeric(values, errors='coerce').fillna(0).astype(int).tolist())
+            elif isinstance(default, float):
+                columns.append(pd.to_numeric(values, errors='coerce').fillna(0.0).astype(float).tolist())
+            else:
+                columns.append(self._text_column(values))
+
+        # import_date: если парсер не указал дату - подставится CURRENT_TIMESTAMP
+        import_date = column('import_date', None)
+        if isinstance(import_date, (pd.Series, np.ndarray)):
+            columns.append(self._text_column(pd.Series(import_date, copy=False)))
+        else:
+            columns.append(itertools.repeat(import_date, n))
+
+        columns.append(itertools.repeat(batch_id, n))
+        return zip(*columns)
+
+    @staticmethod
+    def _typed_value(value, default):
+        """Одно значение колонки к типу значения по умолчанию, как в колонках-массивах"""
+        if value is None or (isinstance(value, float) and np.isnan(value)):
+            return None if isinstance(default, str) else default
+        if isinstance(default, float):
+            return float(value)
+        if isinstance(default, int):
+            return int(value)
+        return value
+
+    @staticmethod
+    def _text_column(series):
+        if pd.api.types.is_datetime64_any_dtype(series):
+            series = series.dt.strftime('%Y-%m-%d %H:%M:%S')
+        series = series.astype(object)
+        return series.where(series.notna(), None).tolist()
+
+    @property
+    def _insert_sql(self):
+        columns = list(self.REPORT_COLUMNS) + ['import_date', 'import_batch_id']
+        placeholders = ', '.join(['?'] * len(self.REPORT_COLUMNS) + ['COALESCE(?, CURRENT_TIMESTAMP)', '?'])
+        return f"INSERT INTO reports ({', '.join(columns)}) VALUES ({placeholders})"
+
+    def _rollup_select_sql(self, where, sign=''):
+        """GROUP BY по строкам reports в формате таблицы reports_rollup"""
+        sums = ', '.join(f"{sign}TOTAL({col}) AS {col}" for col in self.ROLLUP_SUM_COLUMNS)
+        return (
+            f"SELECT IFNULL(company, '') AS company, {self.QUARTER_SQL} AS quarter, "
+            f"IFNULL(doc_type, '') AS doc_type, IFNULL(product_group, '') AS product_group, "
+            f"{sums}, {sign}COUNT(*) AS records_count "
+            f"FROM reports {where} GROUP BY 1, 2, 3, 4"
+        )
+
+    def _rollup_upsert_sql(self, where, sign=''):
+        """Прибавляет (или вычитает при sign='-') агрегаты выбранных строк к reports_rollup"""
+        columns = self.ROLLUP_SUM_COLUMNS + ['records_count']
+        updates = ', '.join(f"{col} = {col} + excluded.{col}" for col in columns)
+        return (
+            f"INSERT INTO reports_rollup (company, quarter, doc_type, product_group, {', '.join(columns)}) "
+            f"{self._rollup_select_sql(where, sign)} "
+            f"ON CONFLICT(company, quarter, doc_type, product_group) DO UPDATE SET {updates}"
+        )
+
+    def _search_sync_sql(self, where, delete=False):
+        """
+        Добавляет выбранные строки reports в индекс поиска или (delete=True) убирает их.
+        Удаление из индекса передает те же значения колонок, поэтому выполняется до DELETE FROM reports
+        """
+        columns = ', '.join(self.SEARCH_COLUMNS)
+        if delete:
+            return (f"INSERT INTO reports_fts (reports_fts, rowid, {columns}) "
+                    f"SELECT 'delete', id, {columns} FROM reports {where}")
+        return f"INSERT INTO reports_fts (rowid, {columns}) SELECT id, {columns} FROM reports {where}"
+
+    @staticmethod
+    def search_query(text):
+        """
+        Строка поиска -> запрос FTS5 MATCH: каждое слово ищется как начало слова
+        в любой из колонок поиска, все слова должны найтись. None - искать нечего
+        """
+        words = re.findall(r'[^\W_]+', (text or '').casefold())
+        if not words:
+            return None
+        return ' '.join(f'"{word}"*' for word in words)
+
+    # Найденные строки выбираются из индекса один раз на строку поиска и хранятся во временной
+    # таблице соединения: страницы таблицы, количество и итоги читают готовый список id.
+    # Если найдена большая часть таблицы, строки выгоднее просматривать в порядке индекса
+    # сортировки и проверять по списку (условие +id), чем читать каждую по id и сортировать
+    BROAD_SEARCH_SHARE = 0.1
+
+    def _search_condition(self, match):
+        """Условие WHERE по строкам, найденным запросом match"""
+        version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+        if self._search_state is None or self._search_state[:2] != (match, version):
+            self.conn.execute("CREATE TEMP TABLE IF NOT EXISTS search_matches (id INTEGER PRIMARY KEY)")
+            self.conn.execute("DELETE FROM temp.search_matches")
+            cursor = self.conn.execute(
+                "INSERT INTO temp.search_matches SELECT rowid FROM reports_fts WHERE reports_fts MATCH ?", (match,))
+            found = max(cursor.rowcount, 0)
+            self.conn.commit()
+            self._search_state = (match, version, found)
+
+        found = self._search_state[2]
+        last_id = self.conn.execute("SELECT IFNULL(MAX(id), 0) FROM reports").fetchone()[0]
+        column = '+id' if found > last_id * self.BROAD_SEARCH_SHARE else 'id'
+        return f" AND {column} IN (SELECT id FROM temp.search_matches)"
+
+    def _rebuild_rollup(self, cursor):
+        cursor.execute("DELETE FROM reports_rollup")
+        cursor.execute(self._rollup_upsert_sql(''))
+
+    def get_rollup(self, company=None, date_from=None, date_to=None, product_group=None, search=None):
+        """
+        Свертка компания × квартал × тип документа × группа с суммами и количеством строк.
+        Без фильтра по датам и поиска читается готовая таблица reports_rollup,
+        иначе тот же GROUP BY считается по отфильтрованным строкам reports.
+        """
+        if date_from or date_to or self.search_query(search):
+            where, params = self._build_filter_query(company, date_from, date_to, product_group, search=search)
+            query = self._rollup_select_sql(where)
+        else:
+            where, params = self._build_filter_query(company, None, None, product_group)
+            query = f"SELECT * FROM reports_rollup {where}"
+        return pd.read_sql_query(query, self.conn, params=params)
+
+    def get_financial_totals(self, company=None, date_from=None, date_to=None, product_group=None, doc_type=None,
+                             batch_ids=None, search=None):
+        """
+        Финансовые показатели одним запросом SUM(CASE WHEN doc_type = ...) с теми же
+        фильтрами, что get_filtered_data. Совпадает с MainWindow.calculate_financials
+        по тем же строкам, но не загружает их в память
+        """
+        where, params = self._build_filter_query(company, date_from, date_to, product_group, doc_type, batch_ids, search)
+        query = f"""
+            SELECT
+                TOTAL(CASE WHEN doc_type = 'sales_book' THEN sales_amount_with_vat END),
+                TOTAL(CASE WHEN doc_type = 'sales_book' THEN sales_amount_without_vat END),
+                TOTAL(CASE WHEN doc_type = 'sales_book' THEN vat_to_budget END),
+                TOTAL(CASE WHEN doc_type = 'purchase_book' THEN purchase_amount_with_vat END),
+                TOTAL(CASE WHEN doc_type = 'purchase_book' THEN vat_deductible END)
+            FROM reports {where}
+        """
+        revenue_with_vat, revenue_without_vat, vat_sales, expenses_with_vat, vat_purchases = \
+            self.conn.execute(query, params).fetchone()
+        return self.build_financials(
+            revenue_with_vat=revenue_with_vat,
+            revenue_without_vat=revenue_without_vat,
+            vat_sales=vat_sales,
+            expenses_with_vat=expenses_with_vat,
+            vat_purchases=vat_purchases,
+        )
+
+    @staticmethod
+    def build_financials(revenue_with_vat=0.0, revenue_without_vat=0.0, vat_sales=0.0,
+                         expenses_with_vat=0.0, vat_purchases=0.0):
+        """Финансовые показатели из сумм по книге продаж и книге покупок"""
+        expenses_without_vat = expenses_with_vat - vat_purchases
+
+        gross_profit_with_vat = revenue_with_vat - expenses_with_vat
+        profit_without_vat = revenue_without_vat - expenses_without_vat
+
+        profit_margin = (profit_without_vat / revenue_without_vat * 100) if revenue_without_vat != 0 else 0.0
+
+        vat_to_budget_net = vat_sales - vat_purchases
+        profit_tax = profit_without_vat * 0.25  # 25% налог на прибыль
 
-        if 'quantity' in df_to_save.columns:
-            df_to_save['quantity'] = pd.to_numeric(df_to_save['quantity'], errors='coerce').fillna(0).astype(int)
+        return {
+            'revenue_with_vat': revenue_with_vat,
+            'revenue_without_vat': revenue_without_vat,
+            'expenses_with_vat': expenses_with_vat,
+            'expenses_without_vat': expenses_without_vat,
+            'gross_profit_with_vat': gross_profit_with_vat,
+            'profit_without_vat': profit_without_vat,
+            'profit_margin': profit_margin,
+            'vat_sales': vat_sales,
+            'vat_purchases': vat_purchases,
+            'vat_to_budget_net': vat_to_budget_net,
+            'profit_tax': profit_tax,
+        }
+
+    # Исходные суммы build_financials: остальные показатели линейны по ним
+    FINANCIAL_SUMS = ('revenue_with_vat', 'revenue_without_vat', 'vat_sales', 'expenses_with_vat', 'vat_purchases')
 
-        if 'id' in df_to_save.columns:
-            df_to_save = df_to_save.drop(columns=['id'])
+    @classmethod
+    def merge_financials(cls, *items):
+        """Показатели по объединению непересекающихся наборов строк (например, итоги + новый пакет)"""
+        return cls.build_financials(**{key: sum(fin[key] for fin in items) for key in cls.FINANCIAL_SUMS})
 
-        df_to_save.to_sql('reports', self.conn, if_exists='append', index=False)
+    def clear_all(self):
+        """Удаляет все данные отчетов, историю импорта, свертку и индекс поиска"""
+        cursor = self.conn.cursor()
+        cursor.execute("DELETE FROM reports")
+        cursor.execute("DELETE FROM import_history")
+        cursor.execute("DELETE FROM reports_rollup")
+        cursor.execute("INSERT INTO reports_fts(reports_fts) VALUES ('delete-all')")
+        cursor.execute("DELETE FROM sqlite_sequence WHERE name IN ('reports', 'import_history')")
         self.conn.commit()
-        return len(df_to_save)
+        self._search_state = None
+        self._facets = None
+
+    def _begin_import_session(self):
+        """Настройки соединения на время пакетной записи"""
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("PRAGMA cache_size=-65536")  # 64 МБ
+        self.conn.execute("PRAGMA temp_store=MEMORY")
+
+    def _end_import_session(self):
+        self.conn.execute("PRAGMA synchronous=FULL")
+        self.conn.execute("PRAGMA cache_size=-2000")
+        self.conn.execute("PRAGMA temp_store=DEFAULT")
 
     def get_all_data(self):
         query = "SELECT * FROM reports ORDER BY period_start DESC, company"
         return pd.read_sql_query(query, self.conn)
 
-    def get_filtered_data(self, company=None, date_from=None, date_to=None, product_group=None, doc_type=None):
-        query = "SELECT * FROM reports WHERE 1=1"
+    def _build_filter_query(self, company=None, date_from=None, date_to=None, product_group=None, doc_type=None,
+                            batch_ids=None, search=None):
+        """
+        Собирает условие WHERE и параметры для фильтров get_filtered_data.
+        batch_ids - только строки указанных пакетов импорта,
+        search - строка поиска по SEARCH_COLUMNS (см. search_query)
+        """
+        where = "WHERE 1=1"
         params = []
 
         if company and company != "Все компании":
-            query += " AND company = ?"
+            where += " AND company = ?"
             params.append(company)
 
         if date_from:
-            query += " AND period_start >= ?"
+            where += " AND period_start >= ?"
             params.append(date_from)
 
         if date_to:
-            query += " AND period_end <= ?"
+            where += " AND period_end <= ?"
             params.append(date_to)
 
         if product_group and product_group != "Все группы":
-            query += " AND product_group = ?"
+            where += " AND product_group = ?"
             params.append(product_group)
 
         if doc_type:
-            query += " AND doc_type = ?"
+            where += " AND doc_type = ?"
             params.append(doc_type)
 
-        query += " ORDER BY period_start DESC, company"
-        return pd.read_sql_query(query, self.conn, params=params)
+        if batch_ids is not None:
+            where += f" AND import_batch_id IN ({', '.join('?' * len(batch_ids))})"
+            params.extend(batch_ids)
 
-#&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&
-#
-# ==================== ГЛАВНОЕ ОКНО ====================
-#
-#&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&
-class MainWindow(QMainWindow):
+        match = self.search_query(search)
+        if match is not None:
+            where += self._search_condition(match)
 
-    DOC_TYPE_NAMES = {
-    'purchase_book': 'Книга покупок',
-    'sales_book': 'Книга продаж',
-    'osv_19': 'ОСВ 19',
-    'osv_41': 'ОСВ 41',
-    'osv_41_summary': 'ОСВ 41 (итоги)',
-    'osv_44_summary': 'ОСВ 44 (итоги)',
-    'osv_60': 'ОСВ 60',
-    'osv_60_summary': 'ОСВ 60 (итоги)'  # ← добавить
-    }
+        return where, params
 
-    def __init__(self):
-        super().__init__()
-        self.db = DatabaseManager()
-        self.current_df = None
-        self.settings = QSettings("DeerTuund", "BuhTuundOtchet")
-        
-        # Пути из настроек
-        self.load_folder = self.settings.value("load_folder", "")
-        self.save_folder = self.settings.value("save_folder", "")
-        self.db_load_folder = self.settings.value("db_load_folder", "")
-        self.db_save_folder = self.settings.value("db_save_folder", "")
-        
-        self.init_ui()
-        self.load_last_database()
-        self.load_last_folder()         # загружаем последнюю папку
+    def _projection(self, columns):
+        """
+        Список SELECT для columns: None - все колонки, имя набора из COLUMN_SETS
+        или список колонок reports
+        """
+        if columns is None:
+            return '*'
+        if isinstance(columns, str):
+            if columns not in self.COLUMN_SETS:
+                raise ValueError(f"Неизвестный набор колонок: {columns}")
+            columns = self.COLUMN_SETS[columns]
+            if columns is None:
+                columns = [c for c in self.table_columns if c not in self.INTERNAL_COLUMNS]
+        unknown = [c for c in columns if c not in self.table_columns]
+        if unknown:
+            raise ValueError(f"Нет колонок в таблице reports: {', '.join(unknown)}")
+        return ', '.join(columns)
+
+    def get_filtered_data(self, company=None, date_from=None, date_to=None, product_group=None, doc_type=None,
+                          columns=None, batch_ids=None, search=None):
+        where, params = self._build_filter_query(company, date_from, date_to, product_group, doc_type, batch_ids, search)
+        query = f"SELECT {self._projection(columns)} FROM reports {where} ORDER BY period_start DESC, company"
+        return pd.read_sql_query(query, self.conn, params=params)
 
-    # ==================== НАСТРОЙКИ ====================
-    def load_settings(self):
-        self.load_folder = self.settings.value("load_folder", "")
-        self.save_folder = self.settings.value("save_folder", "")
-        self.db_load_folder = self.settings.value("db_load_folder", "")
-        self.db_save_folder = self.settings.value("db_save_folder", "")
+    def explain_filtered_data(self, company=None, date_from=None, date_to=None, product_group=None, doc_type=None,
+                              search=None, order=None, after=None):
+        """
+        Диагностика: EXPLAIN QUERY PLAN для того же SQL, что строит get_filtered_data,
+        а с order (и after) - для страницы get_data_page в этом порядке.
+        Возвращает (строки плана, есть ли полный просмотр таблицы без индекса)
+        """
+        filters = dict(company=company, date_from=date_from, date_to=date_to, product_group=product_group,
+                       doc_type=doc_type, search=search)
+        if order is not None:
+            query, params = self._data_page_query('table', order, after, 500, **filters)
+        else:
+            where, params = self._build_filter_query(**filters)
+            query = f"SELECT * FROM reports {where} ORDER BY period_start DESC, company"
+        plan = [row[3] for row in self.conn.execute(f"EXPLAIN QUERY PLAN {query}", params)]
+        full_scan = any(line.startswith('SCAN reports') and 'USING' not in line for line in plan)
+        for line in plan:
+            print(f"QUERY PLAN: {line}")
+        return plan, full_scan
+
+    # ==================== ПОСТРАНИЧНОЕ ЧТЕНИЕ ====================
+    def _sort_expr(self, column):
+        """Выражение сортировки без NULL, чтобы keyset-сравнения работали и по пустым ячейкам"""
+        if column == 'id':
+            return 'id'
+        default = self.REPORT_COLUMNS.get(column, '')
+        return f"IFNULL({column}, {default!r})"
+
+    def count_filtered_data(self, company=None, date_from=None, date_to=None, product_group=None, doc_type=None,
+                            search=None):
+        where, params = self._build_filter_query(company, date_from, date_to, product_group, doc_type, search=search)
+        return self.conn.execute(f"SELECT COUNT(*) FROM reports {where}", params).fetchone()[0]
+
+    def get_data_page(self, columns, order, after=None, limit=500,
+                      company=None, date_from=None, date_to=None, product_group=None, doc_type=None, search=None):
+        """
+        Страница строк reports по keyset: order - список (колонка, по убыванию), последним идет id,
+        after - ключ последней строки предыдущей страницы.
+        К каждой строке в конце добавляются значения ключа сортировки
+        """
+        query, params = self._data_page_query(columns, order, after, limit, company, date_from, date_to,
+                                              product_group, doc_type, search)
+        return self.conn.execute(query, params).fetchall()
+
+    def _data_page_query(self, columns, order, after, limit,
+                         company=None, date_from=None, date_to=None, product_group=None, doc_type=None, search=None):
+        """SQL и параметры страницы get_data_page. Сравнения BINARY, чтобы ORDER BY шел по индексу"""
+        where, params = self._build_filter_query(company, date_from, date_to, product_group, doc_type, search=search)
+        exprs = [(self._sort_expr(col), desc) for col, desc in order]
+        if date_from and order[0][0] == 'period_start':
+            # То же условие по выражению индекса порядка: с ним фильтр по компании и датам
+            # идет диапазоном по индексу порядка, а не сортировкой всей выборки
+            where += f" AND {exprs[0][0]} >= ?"
+            params.append(date_from)
 
-    def save_settings(self):
-        self.settings.setValue("load_folder", self.load_folder)
-        self.settings.setValue("save_folder", self.save_folder)
-        self.settings.setValue("db_load_folder", self.db_load_folder)
-        self.settings.setValue("db_save_folder", self.db_save_folder)
+        if after is not None:
+            # (k0, k1, ..., id) после ключа: k0 < ? OR (k0 = ? AND (k1 > ? OR ...)).
+            # Отдельное условие по k0 дает поиск по индексу вместо просмотра с начала
+            condition, cond_params = None, []
+            for (expr, desc), value in reversed(list(zip(exprs, after))):
+                op = '<' if desc else '>'
+                if condition is None:
+                    condition, cond_params = f"{expr} {op} ?", [value]
+                else:
+                    condition = f"({expr} {op} ? OR ({expr} = ? AND {condition}))"
+                    cond_params = [value, value] + cond_params
+            first_expr, first_desc = exprs[0]
+            where += f" AND {first_expr} {'<=' if first_desc else '>='} ? AND {condition}"
+            params += [after[0]] + cond_params
+
+        select = ', '.join([self._projection(columns)] + [expr for expr, _ in exprs])
+        order_by = ', '.join(f"{expr}{' DESC' if desc else ''}" for expr, desc in exprs)
+        query = f"SELECT {select} FROM reports {where} ORDER BY {order_by} LIMIT ?"
+        return query, params + [limit]
+
+    # ==================== СОРТИРОВКА ТАБЛИЦЫ ====================
+    # Сортировка по щелчку на заголовке строится не в SQL: текст сравнивается без учета
+    # регистра и с ё = е, а такое сопоставление в SQLite - вызов Python на каждое сравнение.
+    # Читаются только id и значения колонки, ключ считается один раз на различное значение,
+    # результат - перестановка id, страницы по ней читаются через get_rows_by_id
+    SORT_CHUNK = 100000
+
+    @staticmethod
+    def collation_key(text):
+        """Ключ сравнения текста: без учета регистра, ё = е"""
+        return text.casefold().replace('ё', 'е')
+
+    def get_sort_order(self, column, labels=None,
+                       company=None, date_from=None, date_to=None, product_group=None, doc_type=None, search=None):
+        """
+        id строк фильтра по возрастанию колонки (numpy int64) и число непустых среди них.
+        Числа - по значению, текст - по collation_key, labels - подписи значений для сравнения
+        вместо них (тип документа по-русски). Пустые значения в конце, равные - по id
+        """
+        where, params = self._build_filter_query(company, date_from, date_to, product_group, doc_type, search=search)
+        numeric = column == 'id' or not isinstance(self.REPORT_COLUMNS.get(column, ''), str)
+        cursor = self.conn.execute(f"SELECT id, {column} FROM reports {where}", params)
+
+        ids, keys = [], []
+        uniques = {}    # значение текста -> номер, общий для всех порций
+        while True:
+            rows = cursor.fetchmany(self.SORT_CHUNK)
+            if not rows:
+                break
+            chunk_ids, values = zip(*rows)
+            ids.append(np.array(chunk_ids, dtype=np.int64))
+            if numeric:
+                keys.append(pd.to_numeric(pd.Series(values, dtype=object), errors='coerce').to_numpy(float))
+            else:
+                codes, chunk_uniques = pd.factorize(pd.Series(values, dtype=object))
+                # Последний элемент -1 оставляет пустые (код -1) пустыми
+                mapping = np.array([uniques.setdefault(value, len(uniques)) for value in chunk_uniques] + [-1])
+                keys.append(mapping[codes])
+        if not ids:
+            return np.empty(0, dtype=np.int64), 0
+        ids = np.concatenate(ids)
+        keys = np.concatenate(keys)
+
+        if numeric:
+            missing = np.isnan(keys)
+        else:
+            # Ранг значения - место его ключа среди различных ключей; '' считается пустым
+            labels = labels or {}
+            texts = [self.collation_key(str(labels.get(value, value))) for value in uniques]
+            key_codes, key_uniques = pd.factorize(np.array(texts + [''], dtype=object))
+            ranks = np.empty(len(key_uniques), dtype=float)
+            ranks[np.argsort(key_uniques, kind='stable')] = np.arange(len(key_uniques))
+            ranks[key_codes[-1]] = np.nan
+            text_ranks = np.append(ranks[key_codes[:-1]], np.nan)
+            keys = text_ranks[keys]
+            missing = np.isnan(keys)
+
+        keys[missing] = np.inf
+        return ids[np.lexsort((ids, keys))], int(len(ids) - missing.sum())
+
+    @staticmethod
+    def reverse_sort_order(ids, filled):
+        """Порядок по убыванию из порядка get_sort_order: непустые и пустые разворачиваются отдельно"""
+        return np.concatenate((ids[:filled][::-1], ids[filled:][::-1]))
+
+    def get_rows_by_id(self, columns, ids):
+        """Строки reports с данными id в том же порядке; удаленные после построения порядка пропускаются"""
+        ids = [int(row_id) for row_id in ids]
+        if not ids:
+            return []
+        query = f"SELECT id, {self._projection(columns)} FROM reports WHERE id IN ({', '.join('?' * len(ids))})"
+        rows = {row[0]: row[1:] for row in self.conn.execute(query, ids)}
+        return [rows[row_id] for row_id in ids if row_id in rows]
+
+    def get_top_nomenclature(self, limit=5, company=None, date_from=None, date_to=None, product_group=None,
+                             search=None):
+        """ТОП номенклатуры книги продаж по чистой прибыли для текущего фильтра"""
+        where, params = self._build_filter_query(company, date_from, date_to, product_group, 'sales_book',
+                                                 search=search)
+        query = f"""
+            SELECT nomenclature, TOTAL(net_profit) AS net_profit
+            FROM reports {where} AND nomenclature != ''
+            GROUP BY nomenclature
+            ORDER BY net_profit DESC, nomenclature
+            LIMIT ?
+        """
+        return pd.read_sql_query(query, self.conn, params=params + [limit])
+
+    def get_distinct_values(self, column, company=None, date_from=None, date_to=None, product_group=None,
+                            batch_ids=None, search=None):
+        """Различные непустые значения колонки для списков фильтров"""
+        where, params = self._build_filter_query(company, date_from, date_to, product_group, batch_ids=batch_ids,
+                                                 search=search)
+        query = f"SELECT DISTINCT {column} FROM reports {where} AND {column} IS NOT NULL ORDER BY {column}"
+        return [row[0] for row in self.conn.execute(query, params)]
+
+    # ==================== СПИСКИ ФИЛЬТРОВ ====================
+    # Списки фильтров окна строятся по всей БД. Различные значения читаются по индексу
+    # «прыжками» (MIN(колонка) больше предыдущего значения): один поиск в индексе
+    # на значение вместо просмотра всех строк, как в SELECT DISTINCT
+    def _distinct_sql(self, column):
+        return f"""
+            WITH RECURSIVE facet(value) AS (
+                SELECT MIN({column}) FROM reports
+                UNION ALL
+                SELECT (SELECT MIN({column}) FROM reports WHERE {column} > facet.value)
+                FROM facet WHERE facet.value IS NOT NULL
+            )
+        """
 
-    def show_settings(self):
-        dialog = QDialog(self)
-        dialog.setWindowTitle("Настройки")
-        dialog.setModal(True)
-        layout = QVBoxLayout(dialog)
+    def get_facets(self):
+        """
+        Значения списков фильтров: {'company': [...], 'period': ['ММ.ГГГГ', ...], 'product_group': [...]}.
+        Запоминаются до изменения данных: импорт этим или другим соединением (PRAGMA data_version),
+        очистка; другая БД - другой DatabaseManager
+        """
+        version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+        if self._facets is None or self._facets[0] != version:
+            facets = {}
+            for name, column in (('company', 'company'), ('product_group', 'product_group')):
+                query = f"{self._distinct_sql(column)} SELECT value FROM facet WHERE value IS NOT NULL"
+                facets[name] = [row[0] for row in self.conn.execute(query)]
+            # Период 'ММ.ГГГГ' только из правильных дат 'ГГГГ-ММ-ДД'
+            query = (f"{self._distinct_sql('period_start')} "
+                     "SELECT DISTINCT strftime('%m.%Y', value) FROM facet "
+                     "WHERE strftime('%Y-%m-%d', value) = value ORDER BY 1")
+            facets['period'] = [row[0] for row in self.conn.execute(query)]
+            self._facets = (version, facets)
+        return self._facets[1]
+
+# ==================== МОДЕЛЬ ТАБЛИЦЫ ====================
+class ReportsTableModel(QAbstractTableModel):
+    """
+    Таблица reports, читаемая из SQLite страницами по мере прокрутки.
+    В памяти держится только несколько последних страниц. Порядок по умолчанию читается
+    по индексу (keyset), сортировка по колонке - по перестановке id из get_sort_order,
+    которая запоминается для колонки до смены выборки (убывание - ее разворот)
+    """
+
+    PAGE_SIZE = 500
+    CACHE_PAGES = 8
+    CACHE_ORDERS = 4    # перестановок в памяти (3 млн строк - 24 МБ каждая)
+
+    COLUMNS = DatabaseManager.COLUMN_SETS['table']
+
+    HEADERS = {
+        'id': 'ID',
+        'company': 'Компания',
+        'period_start': 'Период с',
+        'period_end': 'Период по',
+        'doc_type': 'Тип',
+        'account': 'Счет',
+        'product_group': 'Группа',
+        'seller': 'Продавец',
+        'buyer': 'Покупатель',
+        'nomenclature': 'Номенклатура',
+        'article': 'Артикул',
+        'document_number': '№ сч/ф',
+        'document_date': 'Дата сч/ф',
+        'operation_code': 'Код опер.',
+        'acceptance_date': 'Дата принятия',
+        'payment_document': 'Плат. док.',
+        'purchase_amount_with_vat': 'Сумма покупки с НДС',
+        'sales_amount_without_vat': 'Сумма продажи без НДС',
+        'sales_amount_with_vat': 'Сумма продажи с НДС',
+        'revenue': 'Выручка',
+        'cost_price': 'Себестоимость',
+        'gross_profit': 'Валовая прибыль',
+        'sales_expenses': 'Расходы на продажу',
+        'other_income_expenses': 'Прочие доходы/расходы',
+        'net_profit': 'Чистая прибыль',
+        'vat_deductible': 'НДС покупки',
+        'vat_to_budget': 'НДС продажи',
+        'quantity': 'Кол-во',
+        'osv_begin_balance_debit': 'Сальдо нач. Дебет',
+        'osv_begin_balance_credit': 'Сальдо нач. Кредит',
+        'osv_turnover_debit': 'Обороты Дебет',
+        'osv_turnover_credit': 'Обороты Кредит',
+        'osv_end_balance_debit': 'Сальдо кон. Дебет',
+        'osv_end_balance_credit': 'Сальдо кон. Кредит',
+        'import_date': 'Дата импорта'
+    }
 
-        # Папка загрузки данных
-        load_layout = QHBoxLayout()
-        load_layout.addWidget(QLabel("Папка загрузки данных:"))
-        self.load_folder_edit = QLineEdit(self.load_folder)
-        load_layout.addWidget(self.load_folder_edit)
-        load_btn = QPushButton("Обзор...")
-        load_btn.clicked.connect(lambda: self._choose_folder(self.load_folder_edit, "load_folder"))
-        load_layout.addWidget(load_btn)
-        layout.addLayout(load_layout)
+    MONEY_COLUMNS = {
+        'purchase_amount_with_vat', 'sales_amount_without_vat', 'sales_amount_with_vat',
+        'revenue', 'cost_price', 'gross_profit', 'sales_expenses',
+        'other_income_expenses', 'net_profit', 'vat_deductible', 'vat_to_budget'
+    }
 
-        # Папка сохранения отчетов
-        save_layout = QHBoxLayout()
-        save_layout.addWidget(QLabel("Папка сохранения отчетов:"))
-        self.save_folder_edit = QLineEdit(self.save_folder)
-        save_layout.addWidget(self.save_folder_edit)
-        save_btn = QPushButton("Обзор...")
-        save_btn.clicked.connect(lambda: self._choose_folder(self.save_folder_edit, "save_folder"))
-        save_layout.addWidget(save_btn)
-        layout.addLayout(save_layout)
+    # Порядок по умолчанию - как ORDER BY в get_filtered_data
+    DEFAULT_ORDER = [('period_start', True), ('company', False), ('id', False)]
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.db = None
+        self.filters = {}
+        self.order = list(self.DEFAULT_ORDER)
+        self._total = 0
+        self._loaded_rows = 0
+        self._pages = OrderedDict()
+        self._page_keys = [None]
+        self._order_ids = None          # перестановка id текущей сортировки по колонке
+        self._orders = OrderedDict()    # колонка -> (id по возрастанию, число непустых)
+
+    def set_query(self, db, filters=None, total=None):
+        """
+        Новый источник строк: БД и фильтры в формате get_filtered_data.
+        total - уже известное количество строк (после импорта: прежнее + добавленные), без COUNT(*)
+        """
+        self.beginResetModel()
+        self.db = db
+        self.filters = dict(filters or {})
+        self._orders.clear()
+        self._load(total)
+        self.endResetModel()
+
+    def _load(self, total=None):
+        """Первая страница в текущем порядке"""
+        self._pages.clear()
+        self._page_keys = [None]
+        if self.order == self.DEFAULT_ORDER:
+            self._order_ids = None
+            self._total = self.db.count_filtered_data(**self.filters) if total is None else total
+        else:
+            column, desc = self.order[0]
+            if column in self._orders:
+                self._orders.move_to_end(column)
+            else:
+                labels = self.db.DOC_TYPE_NAMES if column == 'doc_type' else None
+                self._orders[column] = self.db.get_sort_order(column, labels, **self.filters)
+                while len(self._orders) > self.CACHE_ORDERS:
+                    self._orders.popitem(last=False)
+            ids, filled = self._orders[column]
+            self._order_ids = self.db.reverse_sort_order(ids, filled) if desc else ids
+            self._total = len(self._order_ids)
+        self._loaded_rows = len(self._page(0)) if self._total else 0
+
+    def total_rows(self):
+        return self._total
+
+    def column_values(self, column):
+        """Значения колонки в прочитанных страницах (для оценки ширины без чтения всей выборки)"""
+        return [row[column] for number in sorted(self._pages) for row in self._pages[number]]
+
+    def _page(self, number):
+        """Страница из кэша или из БД; ключ ее последней строки открывает следующую страницу"""
+        if number in self._pages:
+            self._pages.move_to_end(number)
+            return self._pages[number]
+
+        if self._order_ids is not None:
+            start = number * self.PAGE_SIZE
+            rows = self.db.get_rows_by_id('table', self._order_ids[start:start + self.PAGE_SIZE])
+        else:
+            rows = self.db.get_data_page('table', self.order, after=self._page_keys[number],
+                                         limit=self.PAGE_SIZE, **self.filters)
+            if number + 1 == len(self._page_keys) and len(rows) == self.PAGE_SIZE:
+                self._page_keys.append(rows[-1][len(self.COLUMNS):])
 
-        # Папка загрузки БД
-        db_load_layout = QHBoxLayout()
-        db_load_layout.addWidget(QLabel("Папка загрузки БД:"))
-        self.db_load_folder_edit = QLineEdit(self.db_load_folder)
-        db_load_layout.addWidget(self.db_load_folder_edit)
-        db_load_btn = QPushButton("Обзор...")
-        db_load_btn.clicked.connect(lambda: self._choose_folder(self.db_load_folder_edit, "db_load_folder"))
-        db_load_layout.addWidget(db_load_btn)
-        layout.addLayout(db_load_layout)
+        self._pages[number] = rows
+        while len(self._pages) > self.CACHE_PAGES:
+            self._pages.popitem(last=False)
+        return rows
 
-        # Папка сохранения БД
-        db_save_layout = QHBoxLayout()
-        db_save_layout.addWidget(QLabel("Папка сохранения БД:"))
-        self.db_save_folder_edit = QLineEdit(self.db_save_folder)
-        db_save_layout.addWidget(self.db_save_folder_edit)
-        db_save_btn = QPushButton("Обзор...")
-        db_save_btn.clicked.connect(lambda: self._choose_folder(self.db_save_folder_edit, "db_save_folder"))
-        db_save_layout.addWidget(db_save_btn)
-        layout.addLayout(db_save_layout)
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self._loaded_rows
 
-        btn_box = QDialogButtonBox(QDialogButtonBox.StandardButton.Ok | QDialogButtonBox.StandardButton.Cancel)
-        btn_box.accepted.connect(lambda: self._save_settings_from_dialog(dialog))
-        btn_box.rejected.connect(dialog.reject)
-        layout.addWidget(btn_box)
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.COLUMNS)
 
-        dialog.exec()
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and self._loaded_rows < self._total
 
-    def _choose_folder(self, line_edit, setting_key):
-        folder = QFileDialog.getExistingDirectory(self, "Выберите папку")
-        if folder:
-            line_edit.setText(folder)
-            setattr(self, setting_key, folder)
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid() or self._loaded_rows >= self._total:
+            return
+        rows = self._page(self._loaded_rows // self.PAGE_SIZE)
+        if not rows:
+            # Строки удалены после подсчета - дальше читать нечего
+            self._total = self._loaded_rows
+            return
+        self.beginInsertRows(QModelIndex(), self._loaded_rows, self._loaded_rows + len(rows) - 1)
+        self._loaded_rows += len(rows)
+        self.endInsertRows()
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role != Qt.ItemDataRole.DisplayRole:
+            return None
+        if orientation == Qt.Orientation.Horizontal:
+            column = self.COLUMNS[section]
+            return self.HEADERS.get(column, column)
+        return str(section + 1)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        rows = self._page(index.row() // self.PAGE_SIZE)
+        offset = index.row() % self.PAGE_SIZE
+        if offset >= len(rows):
+            return None
+        value = rows[offset][index.column()]
+
+        if role == Qt.ItemDataRole.UserRole + 1:
+            return value
+        if role != Qt.ItemDataRole.DisplayRole:
+            return None
+        return self.format_value(self.COLUMNS[index.column()], value)
+
+    @classmethod
+    def format_value(cls, column, value):
+        """Текст ячейки: тип документа по-русски, суммы в рублях, количество целым"""
+        if value is None:
+            return ''
+        if column == 'doc_type':
+            return DatabaseManager.DOC_TYPE_NAMES.get(str(value), str(value))
+        if column in cls.MONEY_COLUMNS and isinstance(value, (int, float)):
+            return f"{value:,.2f} ₽".replace(",", " ")
+        if column == 'quantity' and isinstance(value, (int, float)):
+            return str(int(value))
+        return str(value)
+
+    def sort(self, column, order=Qt.SortOrder.AscendingOrder):
+        """Сортировка по колонке; column < 0 возвращает порядок по умолчанию"""
+        if column < 0:
+            self.order = list(self.DEFAULT_ORDER)
+        else:
+            self.order = [(self.COLUMNS[column], order == Qt.SortOrder.DescendingOrder)]
+        if self.db is not None:
+            self.beginResetModel()
+            self._load()
+            self.endResetModel()
+
+# ==================== ШИРИНА КОЛОНОК ====================
+class ColumnWidthEstimator:
+    """
+    Ширина колонок по ограниченной выборке значений, а не по каждой ячейке:
+    заголовок, первые и последние строки и самые длинные значения, которые
+    находятся векторным подсчетом длины по массиву колонки.
+    Ширины запоминаются по проекции (что показано: выборка, набор колонок) и колонке
+    """
+
+    HEAD_ROWS = 50
+    TAIL_ROWS = 10
+    LONGEST_ROWS = 20
+    # Длинные значения ищутся не более чем в стольких строках, взятых с равным шагом
+    SCAN_ROWS = 50000
+
+    def __init__(self, measure, formatter=None, scan_rows=SCAN_ROWS):
+        self.measure = measure      # текст -> ширина (пиксели, символы)
+        self.formatter = formatter  # (колонка, значение) -> текст; None - str() без пустых
+        self.scan_rows = scan_rows  # None - длина считается по всем строкам
+        self._widths = {}           # проекция -> {колонка: ширина}
+
+    def forget(self, projection=None):
+        """Сброс ширин одной проекции или всех (после изменения данных)"""
+        if projection is None:
+            self._widths.clear()
+        else:
+            self._widths.pop(projection, None)
+
+    def width(self, projection, column, values, header=''):
+        """Ширина колонки column по массиву значений; projection=None - без кэша"""
+        cached = self._widths.get(projection, {}) if projection is not None else {}
+        if column not in cached:
+            rows = self.sample_rows(values)
+            sample = values.iloc[rows].tolist() if isinstance(values, pd.Series) else [values[row] for row in rows]
+            texts = [str(header)] + [self._text(column, value) for value in sample]
+            cached[column] = max(self.measure(text) for text in texts)
+            if projection is not None:
+                self._widths.setdefault(projection, {})[column] = cached[column]
+        return cached[column]
+
+    def _text(self, column, value):
+        if self.formatter is not None:
+            return self.formatter(column, value)
+        if value is None or (isinstance(value, float) and np.isnan(value)):
+            return ''
+        return str(value)
+
+    def sample_rows(self, values):
+        """Номера строк выборки: начало, конец и кандидаты в самые длинные значения"""
+        count = len(values)
+        rows = set(range(min(self.HEAD_ROWS, count))) | set(range(max(count - self.TAIL_ROWS, 0), count))
+        if count > len(rows):
+            step = max(1, count // self.scan_rows) if self.scan_rows else 1
+            lengths = self.text_lengths(values[::step])
+            longest = min(self.LONGEST_ROWS, len(lengths))
+            candidates = np.argpartition(lengths, len(lengths) - longest)[len(lengths) - longest:]
+            rows.update((candidates * step).tolist())
+        return sorted(rows)
+
+    @staticmethod
+    def text_lengths(values):
+        """
+        Оценка длины текста каждого значения без форматирования: длина строк,
+        для чисел - число цифр целой части и знак
+        """
+        series = pd.Series(values)
+        if pd.api.types.is_numeric_dtype(series.dtype) and not pd.api.types.is_bool_dtype(series.dtype):
+            numbers = series.to_numpy(dtype=float, na_value=np.nan)
+            return np.nan_to_num(np.log10(np.abs(numbers) + 1) + (numbers < 0))
 
-    def _save_settings_from_dialog(self, dialog):
-        self.load_folder = self.load_folder_edit.text()
-        self.save_folder = self.save_folder_edit.text()
-        self.db_load_folder = self.db_load_folder_edit.text()
-        self.db_save_folder = self.db_save_folder_edit.text()
-        self.save_settings()
-        dialog.accept()
-    #==================================================================================
-    # ==================== ЗАГРУЗКА ПОСЛЕДНЕЙ БД ====================
-    def load_last_database(self):
-        """Загружает последнюю использованную базу данных при старте"""
-        last_db = self.settings.value("last_database", "")
-        
-        # Если последняя БД не существует или была удалена
-        if not last_db or not os.path.exists(last_db):
-            # Создаем новую БД по умолчанию
-            self.db = DatabaseManager()
-            self.current_df = pd.DataFrame()
-            self.display_data(self.current_df)
-            self.update_summary()
-            self.update_charts()
-            self.update_filter_combos()
-            print("Создана новая база данных по умолчанию")
-            return
-        
         try:
-            self.db.conn.close()
-            self.db = DatabaseManager(db_path=last_db)
-            self.current_df = self.db.get_all_data()
-            self.display_data(self.current_df)
-            self.update_summary()
-            self.update_charts()
-            self.update_filter_combos()
-            print(f"Загружена последняя БД: {last_db}")
-        except Exception as e:
-            print(f"Не удалось загрузить последнюю БД: {e}")
-            # В случае ошибки создаем новую БД
-            self.db = DatabaseManager()
-            self.current_df = pd.DataFrame()
-            self.display_data(self.current_df)
-            self.update_summary()
-            self.update_charts()
-            self.update_filter_combos()
+            lengths = series.str.len().to_numpy(dtype=float, na_value=np.nan)
+        except AttributeError:
+            # В колонке нет строк
+            lengths = np.full(len(series), np.nan)
+        others = np.isnan(lengths) & series.notna().to_numpy()
+        if others.any():
+            numbers = pd.to_numeric(series[others], errors='coerce').to_numpy(dtype=float, na_value=np.nan)
+            lengths[others] = np.log10(np.abs(numbers) + 1) + (numbers < 0)
+        return np.nan_to_num(lengths)
+
+
+# ==================== ЧТЕНИЕ EXCEL ====================
+class LoadedWorkbook:
+    """
+    Первый лист файла Excel, прочитанный один раз: все ячейки строками, пустые - '',
+    пробелы по краям обрезаны. Общий для распознавания типа и парсера.
+    .xlsx читается потоком openpyxl (read_only): распознавание берет только первые строки,
+    книги покупок/продаж идут по строкам через iter_rows(), целиком лист собирается
+    в DataFrame (frame) только для парсеров, которым он нужен
+    """
+
+    PREVIEW_ROWS = 30
+    STREAM_EXTENSIONS = ('.xlsx', '.xlsm')
+    # Раз в столько прочитанных строк вызывается on_rows
+    PROGRESS_ROWS = 5000
+
+    # Значения, которые read_excel(dtype=str) превращает в пустые ячейки:
+    # na_values по умолчанию и ошибки формул Excel
+    NA_STRINGS = {
+        '', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN',
+        '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null',
+        '#NULL!', '#DIV/0!', '#VALUE!', '#REF!', '#NAME?', '#NUM!'
+    }
 
-    # ====================================================================================
-    # """Загружает последнюю использованную папку в дерево файлов"""
-    def load_last_folder(self):
-        """Загружает последнюю использованную папку в дерево файлов"""
-        last_folder = self.settings.value("last_folder", "")
-        if last_folder and os.path.exists(last_folder):
-            self.load_folder_tree(last_folder)
+    def __init__(self, file_path, on_rows=None):
+        self.file_path = file_path
+        # on_rows(прочитано строк) - ход чтения; исключение из него прерывает чтение листа
+        self.on_rows = on_rows
+        self._frame = None
+        self._head = None       # первые строки потока, прочитанные для распознавания
+        self._rows = None       # продолжение того же потока
+        self.streamable = file_path.lower().endswith(self.STREAM_EXTENSIONS)
+
+    def _cell_text(self, value):
+        """Текст ячейки как у read_excel(dtype=str) + fillna('') + strip"""
+        if value is None:
+            return ''
+        if isinstance(value, float) and math.isfinite(value) and value.is_integer():
+            # Как в pandas: целое число из Excel (2.0) пишется без дробной части;
+            # inf и nan остаются текстом ('nan' - пустая ячейка по NA_STRINGS)
+            text = str(int(value))
+        else:
+            text = str(value)
+        if text in self.NA_STRINGS:
+            return ''
+        return text.strip()
 
-    # ==========================================================================================
-    # ==================== """Сохраняет настройки при закрытии программы""" ====================
-    def closeEvent(self, event):
-        """Сохраняет настройки и удаляет временные файлы при закрытии программы"""
-        
-        # Сохраняем путь к текущей базе данных
-        cursor = self.db.conn.execute("PRAGMA database_list")
-        row = cursor.fetchone()
-        if row and row[2]:
-            self.settings.setValue("last_database", row[2])
-        
-        # Сохраняем последнюю открытую папку
-        root = self.tree_widget.topLevelItem(0)
-        if root:
-            folder_path = root.data(0, Qt.ItemDataRole.UserRole)
-            if folder_path and os.path.isdir(folder_path):
-                self.settings.setValue("last_folder", folder_path)
-        
-        # ===== УДАЛЯЕМ ВСЕ ВРЕМЕННЫЕ ФАЙЛЫ ГРАФИКОВ =====
+    def _stream_rows(self):
+        """Строки первого листа по одной: openpyxl read_only, values_only"""
         try:
-            import glob
-            # Находим все файлы temp_chart_*.png
-            for temp_file in glob.glob("temp_chart_*.png"):
-                try:
-                    if os.path.exists(temp_file):
-                        os.remove(temp_file)
-                        print(f"Удален временный файл: {temp_file}")
-                except:
-                    pass
+            workbook = openpyxl.load_workbook(self.file_path, read_only=True, data_only=True, keep_links=False)
         except Exception as e:
-            print(f"Ошибка при удалении временных файлов: {e}")
-        
-        event.accept()
+            print(f"Не удалось прочитать файл {self.file_path}: {e}")
+            raise ValueError(f"Не удалось прочитать файл: {e}")
+        try:
+            sheet = workbook.worksheets[0]
+            sheet.reset_dimensions()
+            for count, values in enumerate(sheet.iter_rows(values_only=True), 1):
+                if self.on_rows is not None and count % self.PROGRESS_ROWS == 0:
+                    self.on_rows(count)
+                values = list(values)
+                while values and (values[-1] is None or values[-1] == ''):
+                    values.pop()
+                yield [self._cell_text(value) for value in values]
+        finally:
+            workbook.close()
+
+    @classmethod
+    def from_frame(cls, frame, file_path=''):
+        """Лист, уже собранный в DataFrame строк, - для разбора без чтения файла (замеры)"""
+        book = cls(file_path)
+        book._frame = frame
+        return book
+
+    def _read_head(self):
+        if self._head is None:
+            self._rows = self._stream_rows()
+            self._head = list(itertools.islice(self._rows, self.PREVIEW_ROWS))
+        return self._head
+
+    @property
+    def frame(self):
+        if self._frame is None:
+            if not self.streamable:
+                try:
+                    df = pd.read_excel(self.file_path, header=None, dtype=str)
+                except Exception as e:
+                    print(f"Не удалось прочитать файл {self.file_path}: {e}")
+                    raise ValueError(f"Не удалось прочитать файл: {e}")
+                self._frame = df.fillna('').astype(str).apply(lambda col: col.str.strip())
+                if self.on_rows is not None:
+                    self.on_rows(len(self._frame))
+            else:
+                if self._rows is None:
+                    self._read_head()
+                rows = self._head + list(self._rows)
+                self._rows = iter(())
+                # Как read_excel: пустые строки в конце листа отбрасываются,
+                # короткие строки дополняются пустыми ячейками до ширины листа
+                while rows and not rows[-1]:
+                    rows.pop()
+                width = max((len(row) for row in rows), default=0)
+                self._frame = pd.DataFrame([row + [''] * (width - len(row)) for row in rows],
+                                           columns=range(width), dtype=object)
+        return self._frame
+
+    def iter_rows(self):
+        """
+        Строки листа списками строк. Для .xlsx - продолжение того же потока,
+        что читало распознавание, без загрузки листа в память
+        """
+        if self._frame is not None or not self.streamable:
+            return iter(self.frame.values.tolist())
+        if self._rows is None:
+            self._read_head()
+        head, rows = self._head, self._rows
+        # Поток отдается один раз; повторное чтение листа - через frame
+        self._head, self._rows = None, None
+        return itertools.chain(head, rows)
+
+    def preview_text(self):
+        """Текст первых строк в нижнем регистре для распознавания типа отчета"""
+        if self.streamable and self._frame is None:
+            preview = self._read_head()
+        else:
+            preview = self.frame.head(self.PREVIEW_ROWS).values.tolist()
+        text = ' '.join(' '.join(row) for row in preview).lower()
+        return re.sub(r'\s+', ' ', text)
+
+# ==================== ПАРСЕРЫ ====================
+class ImportCancelled(Exception):
+    """Разбор файла прерван по запросу пользователя"""
+
+
+class ReportParser:
+    """
+    Распознавание и разбор выгрузок 1С в DataFrame.
+    Не зависит от Qt и БД, поэтому разбор можно выполнять в отдельных процессах
+    """
+
+    def __init__(self, progress_callback=None, cancel_requested=None):
+        # Для фонового импорта: progress_callback(прочитано строк) сообщает ход чтения листа,
+        # cancel_requested() == True прерывает разбор исключением ImportCancelled
+        self.progress_callback = progress_callback
+        self.cancel_requested = cancel_requested
+
+    def _on_rows(self, count):
+        """Точка проверки при чтении листа: отмена и ход разбора"""
+        if self.cancel_requested is not None and self.cancel_requested():
+            raise ImportCancelled("Импорт отменен")
+        if self.progress_callback is not None:
+            self.progress_callback(count)
+
+    # ========== РАСПОЗНАВАНИЕ ТИПА ОТЧЕТА ==========
+    # Реестр отчетов: название, метод разбора, приоритет, признаки заголовка (titles)
+    # и ожидаемые подписи шапки (markers) - подстроки текста первых строк листа в нижнем регистре.
+    # Отчет подходит, если найден хотя бы один его признак заголовка; из подошедших побеждает
+    # больше найденных признаков заголовка и подписей шапки вместе, при равном счете - больший приоритет.
+    # Новый отчет 1С - новая запись здесь и его метод разбора
+    REPORT_DETECTORS = {
+        'purchase_book': {
+            'name': 'книга покупок', 'parser': '_parse_purchase_book', 'priority': 100,
+            'titles': ['книга покупок'],
+            'markers': ['покупатель', 'продавец', 'счет-фактур', 'код вида операции',
+                        'наименование продавца', 'дата принятия на учет'],
+        },
+        'sales_book': {
+            'name': 'книга продаж', 'parser': '_parse_sales_book', 'priority': 90,
+            'titles': ['книга продаж'],
+            'markers': ['продавец', 'покупатель', 'счет-фактур', 'код вида операции',
+                        'наименование покупателя', 'стоимость продаж'],
+        },
+        'osv_19': {
+            'name': 'ОСВ 19', 'parser': '_parse_osv_19_detailed', 'priority': 80,
+            'titles': ['оборотно-сальдовая ведомость по счету 19', 'анализ счета 19'],
+            'markers': ['сальдо на начало', 'обороты за период', 'сальдо на конец'],
+        },
+        'osv_41': {
+            'name': 'ОСВ 41', 'parser': '_parse_osv_41_detailed', 'priority': 70,
+            'titles': ['оборотно-сальдовая ведомость по счету 41'],
+            'markers': ['сальдо на начало', 'обороты за период', 'сальдо на конец', 'номенклатура'],
+        },
+        'osv_44': {
+            'name': 'ОСВ 44', 'parser': '_parse_osv_44_detailed', 'priority': 65,
+            'titles': ['оборотно-сальдовая ведомость по счету 44'],
+            'markers': ['сальдо на начало', 'обороты за период', 'сальдо на конец'],
+        },
+        'osv_60': {
+            'name': 'ОСВ 60', 'parser': '_parse_osv_60_detailed', 'priority': 60,
+            'titles': ['оборотно-сальдовая ведомость по счету 60'],
+            'markers': ['сальдо на начало', 'обороты за период', 'сальдо на конец', 'контрагент'],
+        },
+        'osv_62': {
+            'name': 'ОСВ 62', 'parser': '_parse_osv_62_detailed', 'priority': 55,
+            'titles': ['оборотно-сальдовая ведомость по счету 62'],
+            'markers': ['сальдо на начало', 'обороты за период', 'сальдо на конец', 'контрагент'],
+        },
+        'osv_68': {
+            'name': 'ОСВ 68', 'parser': '_parse_osv_68_detailed', 'priority': 50,
+            'titles': ['оборотно-сальдовая ведомость по счету 68'],
+            'markers': ['сальдо на начало', 'обороты за период', 'сальдо на конец'],
+        },
+        'osv_90': {
+            'name': 'ОСВ 90', 'parser': '_parse_osv_90_detailed', 'priority': 45,
+            'titles': ['оборотно-сальдовая ведомость по счету 90'],
+            'markers': ['сальдо на начало', 'обороты за период', 'сальдо на конец'],
+        },
+        'osv_91': {
+            'name': 'ОСВ 91', 'parser': '_parse_osv_91_detailed', 'priority': 40,
+            'titles': ['оборотно-сальдовая ведомость по счету 91'],
+            'markers': ['сальдо на начало', 'обороты за период', 'сальдо на конец'],
+        },
+        'sales_report': {
+            'name': 'отчет по продажам', 'parser': '_parse_sales_report_detailed', 'priority': 30,
+            'titles': ['отчет по продажам'],
+            'markers': ['номенклатура', 'выручка', 'себестоимость', 'валовая прибыль'],
+        },
+    }
 
-    # ==================== ИНИЦИАЛИЗАЦИЯ ИНТЕРФЕЙСА ====================
-    def init_ui(self):
-        self.setWindowTitle("BuhTuundOtchet")
-        self.setGeometry(100, 100, 1400, 800)
-        self.setStyleSheet("""
-            QMainWindow {
-                background-color: #f5f5f5;
-            }
-            QMenuBar {
-                background-color: #2c3e50;
-                color: white;
-                font-weight: bold;
-            }
-            QMenuBar::item {
-                background-color: #2c3e50;
-                color: white;
-                padding: 5px 10px;
-            }
-            QMenuBar::item:selected {
-                background-color: #3498db;
-            }
-            QMenu {
-                background-color: #ecf0f1;
-                border: 1px solid #bdc3c7;
-            }
-            QMenu::item:selected {
-                background-color: #3498db;
-                color: white;
-            }
-            QToolBar {
-                background-color: #34495e;
-                spacing: 5px;
-                padding: 5px;
-            }
-            QToolButton {
-                background-color: #3498db;
-                color: white;
-                border: none;
-                border-radius: 4px;
-                padding: 8px 12px;
-                font-weight: bold;
-            }
-            QToolButton:hover {
-                background-color: #2980b9;
-            }
-            QTableView {
-                background-color: white;
-                alternate-background-color: #f8f9fa;
-                selection-background-color: #3498db;
-                gridline-color: #dee2e6;
-                font-size: 11pt;
-            }
-            QHeaderView::section {
-                background-color: #34495e;
-                color: white;
-                padding: 8px;
-                border: none;
-                font-weight: bold;
-            }
-            QComboBox, QLineEdit {
-                padding: 6px;
-                border: 1px solid #bdc3c7;
-                border-radius: 4px;
-                background-color: white;
-            }
-            QLabel {
-                font-weight: bold;
-                color: #2c3e50;
-            }
-        """)
+    _detector_regex = None
+    _detector_phrases = None
 
-        self.create_menus()
+    @classmethod
+    def _detector_pattern(cls):
+        """
+        Одно регулярное выражение на все признаки реестра и список (тип, вид признака)
+        для каждой его группы. Просмотр вперед находит признаки, начинающиеся в любой позиции,
+        в том числе пересекающиеся
+        """
+        if cls._detector_regex is None:
+            phrases = {}
+            for report_type, detector in cls.REPORT_DETECTORS.items():
+                for kind in ('titles', 'markers'):
+                    for phrase in detector[kind]:
+                        phrases.setdefault(phrase, []).append((report_type, kind))
+            ordered = sorted(phrases, key=lambda phrase: (-len(phrase), phrase))
+            cls._detector_regex = re.compile(
+                '(?=(?:' + '|'.join(f'({re.escape(phrase)})' for phrase in ordered) + '))')
+            # В одной позиции сообщается только первая совпавшая группа - признаки,
+            # которые являются началом более длинного признака, засчитываются вместе с ним
+            cls._detector_phrases = [[signature for other in ordered if phrase.startswith(other)
+                                      for signature in phrases[other]] for phrase in ordered]
+        return cls._detector_regex, cls._detector_phrases
+
+    def detect_report_type(self, preview_text):
+        """
+        Тип отчета по тексту первых строк листа (LoadedWorkbook.preview_text) без запуска парсера.
+        Возвращает ключ REPORT_DETECTORS или None, если не подошел ни один отчет
+        """
+        pattern, phrases = self._detector_pattern()
+        found = {match.lastindex for match in pattern.finditer(preview_text)}
+
+        titles = set()
+        score = {}
+        for group in found:
+            for report_type, kind in phrases[group - 1]:
+                if kind == 'titles':
+                    titles.add(report_type)
+                score[report_type] = score.get(report_type, 0) + 1
+        if not titles:
+            return None
+        # Найденные признаки, затем приоритет; ключ типа - чтобы выбор не зависел от порядка множества
+        return max(titles, key=lambda report_type: (score[report_type],
+                                                    self.REPORT_DETECTORS[report_type]['priority'], report_type))
+
+    def detect_file(self, file_path):
+        """Тип отчета файла по первым строкам листа, без разбора (None - не распознан)"""
+        return self.detect_report_type(LoadedWorkbook(file_path).preview_text())
+
+    def parse_file(self, file_path):
+        """
+        Распознает тип файла по первым 30 строкам и разбирает его в DataFrame.
+        Для временных файлов Excel (~$...) возвращает None
+        """
+        print(f"Обработка файла: {os.path.basename(file_path)}")
 
-        # Центральный виджет - ОБЯЗАТЕЛЬНО!!!
-        central_widget = QWidget()
-        self.setCentralWidget(central_widget)
-        main_layout = QVBoxLayout(central_widget)
+        if os.path.basename(file_path).startswith('~$'):
+            print("Пропуск временного файла")
+            return None
 
-        # Панель фильтров
-        filter_layout = QHBoxLayout()
-        
-        self.company_combo = QComboBox()
-        self.company_combo.addItems(["Все компании"])
-        
-        self.period_combo = QComboBox()
-        self.period_combo.addItems(["Все периоды"])
-        
-        self.group_combo = QComboBox()
-        self.group_combo.addItems(["Все группы"])
-        
-        filter_layout.addWidget(QLabel("Компания:"))
-        filter_layout.addWidget(self.company_combo)
-        filter_layout.addWidget(QLabel("Период:"))
-        filter_layout.addWidget(self.period_combo)
-        filter_layout.addWidget(QLabel("Товарная группа:"))
-        filter_layout.addWidget(self.group_combo)
-        
-        self.apply_filter_btn = QPushButton("Применить фильтр")
-        self.apply_filter_btn.clicked.connect(self.apply_filters)
-        self.apply_filter_btn.setStyleSheet("""
-            QPushButton {
-                background-color: #27ae60;
-                color: white;
-                font-weight: bold;
-                padding: 8px 16px;
-                border-radius: 4px;
-            }
-            QPushButton:hover {
-                background-color: #219653;
-            }
-        """)
-        filter_layout.addWidget(self.apply_filter_btn)
-        
-        # ДОБАВЛЯЕМ ФИЛЬТРЫ В MAIN_LAYOUT
-        main_layout.addLayout(filter_layout)
+        if file_path.lower().endswith('.xls') and not file_path.lower().endswith('.xlsx'):
+            try:
+                import xlrd
+            except ImportError:
+                raise ImportError("Для чтения файлов .xls установите xlrd: pip install xlrd")
 
-        # СОЗДАЁМ СПЛИТТЕР - ОН БУДЕТ РАЗДЕЛЯТЬ ЛЕВУЮ И ПРАВУЮ ПАНЕЛИ
-        self.splitter = QSplitter(Qt.Orientation.Horizontal)
+        book = LoadedWorkbook(file_path, on_rows=self._on_rows)
+        preview_text = book.preview_text()
 
-        # Левая панель с деревом
-        self.left_panel = QWidget()
-        left_layout = QVBoxLayout(self.left_panel)
-        left_layout.setContentsMargins(2, 2, 2, 2)
+        print(f"preview_text (первые 200): {preview_text[:200]}")
 
-        self.select_root_btn = QPushButton("Выбрать папку...")
-        self.select_root_btn.clicked.connect(self.choose_root_folder)
-        left_layout.addWidget(self.select_root_btn)
+        report_type = self.detect_report_type(preview_text)
+        if report_type is None:
+            raise ValueError("Не удалось распознать тип отчета по первым строкам файла")
 
-        self.tree_widget = QTreeWidget()
-        self.tree_widget.setHeaderHidden(True)
-        self.tree_widget.setSelectionMode(QAbstractItemView.SelectionMode.NoSelection)
-        left_layout.addWidget(self.tree_widget)
+        detector = self.REPORT_DETECTORS[report_type]
+        print(f"-> Распознан отчет: {detector['name']}")
+        parser = getattr(self, detector['parser'], None)
+        if parser is None:
+            raise ValueError(f"Разбор отчета '{detector['name']}' пока не поддерживается")
+        return parser(book)
 
-        self.tree_widget.itemChanged.connect(self._handle_item_changed)
-        self.tree_widget.itemChanged.connect(self._update_process_button_state)
+   
+    def _extract_company_by_keyword(self, df, keyword):
+        for i in range(min(15, len(df))):
+            row = df.iloc[i].tolist()
+            for j, cell in enumerate(row):
+                if keyword.lower() in cell.lower():
+                    for k in range(j+1, len(row)):
+                        if row[k].strip():
+                            return row[k].strip()
+                    break
+        return "Неизвестная компания"
 
-        self.splitter.addWidget(self.left_panel)
+    def _extract_base_number(self, cell):
+        import re
+        if not isinstance(cell, str):
+            cell = str(cell)
+        match = re.match(r'^(\d+)', cell.strip())
+        return int(match.group(1)) if match else None
 
-        # Правая панель с вкладками
-        right_panel = QWidget()
-        right_layout = QVBoxLayout(right_panel)
+    def _header_indices_loose(self, row, min_required=5):
+        """Номер колонки -> индекс, если строка - строка с номерами 1, 2, 3... (иначе None)"""
+        expected = 1
+        indices = {}
+        for col_idx, cell in enumerate(row):
+            base = self._extract_base_number(cell)
+            if base is not None:
+                if base == expected:
+                    indices[base] = col_idx
+                    expected += 1
+        if expected - 1 >= min_required:
+            for col_idx, cell in enumerate(row):
+                base = self._extract_base_number(cell)
+                if base is not None and base not in indices:
+                    indices[base] = col_idx
+            return indices
+        return None
 
-        self.tab_widget = QTabWidget()
-        self.tab_widget.setStyleSheet("""
-            QTabWidget::pane {
-                border: 1px solid #bdc3c7;
-                background-color: white;
-            }
-            QTabBar::tab {
-                background-color: #ecf0f1;
-                padding: 10px 20px;
-                margin-right: 2px;
-                border-top-left-radius: 4px;
-                border-top-right-radius: 4px;
-            }
-            QTabBar::tab:selected {
-                background-color: #3498db;
-                color: white;
-                font-weight: bold;
-            }
-        """)
+    def _find_header_row_loose(self, df, min_required=5):
+        for i in range(len(df)):
+            indices = self._header_indices_loose(df.iloc[i].tolist(), min_required)
+            if indices is not None:
+                return i, indices
+        return None, None
 
-        # Вкладка с таблицей
-        self.table_tab = QWidget()
-        table_layout = QVBoxLayout(self.table_tab)
+    def _find_header_row_fallback(self, df, min_count=5):
+        best_row = None
+        best_indices = {}
+        max_count = 0
+        for i in range(len(df)):
+            row = df.iloc[i].tolist()
+            indices = {}
+            for col_idx, cell in enumerate(row):
+                base = self._extract_base_number(cell)
+                if base is not None and base not in indices:
+                    indices[base] = col_idx
+            if len(indices) >= min_count and len(indices) > max_count:
+                max_count = len(indices)
+                best_row = i
+                best_indices = indices
+        if best_row is not None:
+            return best_row, best_indices
+        return None, None
 
-        self.table_view = QTableView()
-        self.table_model = QStandardItemModel()
-        self.table_view.setModel(self.table_model)
-        self.table_view.setAlternatingRowColors(True)
-        self.table_view.setSortingEnabled(True)
+    def _clean_number(self, value):
+        if value is None:
+            return 0.0
+        if isinstance(value, (int, float)):
+            return float(value)
+        if isinstance(value, bytes):
+            try:
+                s = value.decode('utf-8')
+            except:
+                s = str(value)
+        else:
+            s = str(value)
+        s = s.strip().replace(' ', '').replace(',', '.').replace('−', '-').replace('—', '-')
+        import re
+        s = re.sub(r'[^\d.-]', '', s)
+        try:
+            return float(s) if s else 0.0
+        except:
+            return 0.0
 
-        headers = [
-            "ID", "Компания", "Период с", "Период по", "Тип", "Группа",
-            "Продавец", "Покупатель", "Номенклатура",
-            "№ сч/ф", "Дата сч/ф", "Код опер.", "Дата принятия", "Плат. док.",
-            "Сумма покупки с НДС", "Сумма продажи без НДС", "Сумма продажи с НДС",
-            "Выручка", "Себестоимость", "Валовая прибыль",
-            "Расходы на продажу", "Прочие доходы/расходы", "Чистая прибыль",
-            "НДС покупки", "НДС продажи", "Кол-во", "Дата импорта"
-        ]
-        self.table_model.setHorizontalHeaderLabels(headers)
+    # Что остается после очистки: все кроме цифр, точки и минуса (перевод строки - разделитель ячеек).
+    # Только цифры ASCII: np.fromstring других не читает
+    NUMBER_JUNK = re.compile(r'[^0-9.\n-]+')
+    # Строки, которые float() не примет ('', '-', '1.2.3', '5-'), - их _clean_number превращает в 0
+    NUMBER_INVALID = re.compile(r'^(?!-?(?:[0-9]+\.?[0-9]*|\.[0-9]+)$).*$', re.MULTILINE)
+    # Цифры других письменностей ('١٢٣'): float() в _clean_number их понимает, поэтому
+    # колонка с ними разбирается поэлементно
+    NON_ASCII_DIGIT = re.compile(r'(?![0-9])\d')
 
-        table_layout.addWidget(self.table_view)
+    def clean_number_array(self, values):
+        """
+        _clean_number для целой колонки: те же замены пробелов, запятых, минусов и тире,
+        но одним проходом по склеенному тексту колонки. Возвращает numpy-массив float
+        """
+        values = list(values)
+        if not values:
+            return np.zeros(0)
+        if set(map(type, values)) == {str}:
+            text = '\n'.join(values)
+            # Перевод строки внутри ячейки сломал бы разбиение - такие колонки поэлементно
+            if text.count('\n') == len(values) - 1 and not self.NON_ASCII_DIGIT.search(text):
+                text = text.replace(',', '.').replace('−', '-').replace('—', '-')
+                text = self.NUMBER_INVALID.sub('0', self.NUMBER_JUNK.sub('', text))
+                return np.fromstring(text.replace('\n', ' '), sep=' ')
+        # Числа, None и строки вперемешку - поэлементно
+        return np.array([self._clean_number(v) for v in values], dtype=float)
+
+    def clean_number_columns(self, df, columns):
+        """
+        Числа из колонок columns листа df разом.
+        Возвращает {колонка: список float}; нет колонки - нули
+        """
+        result = {}
+        for col in columns:
+            if col in df.columns:
+                result[col] = self.clean_number_array(df[col]).tolist()
+            else:
+                result[col] = [0.0] * len(df)
+        return result
 
-        # Панель итогов
-        summary_layout = QHBoxLayout()
+    def _month_name_to_number(self, month_name):
+        month_names = {
+            'янв': '01', 'фев': '02', 'мар': '03', 'апр': '04', 'май': '05', 'июн': '06',
+            'июл': '07', 'авг': '08', 'сен': '09', 'окт': '10', 'ноя': '11', 'дек': '12'
+        }
+        for key, num in month_names.items():
+            if key in month_name.lower():
+                return num
+        return '01'
+    
+    
+    #==========================================================================
+    # ========== ПАРСЕР ОСВ60 ==========
+
+    def _parse_osv_60_detailed(self, book):
+        """
+        Парсинг оборотно-сальдовой ведомости по счету 60 (Расчеты с поставщиками)
         
-        self.revenue_with_vat_label = QLabel("Выручка с НДС: 0 ₽")
-        self.expenses_with_vat_label = QLabel("Затраты с НДС: 0 ₽")
-        self.gross_profit_with_vat_label = QLabel("Валовая прибыль: 0 ₽")
-        self.profit_without_vat_label = QLabel("Прибыль без НДС: 0 ₽")
-        self.vat_to_budget_net_label = QLabel("НДС в бюджет: 0 ₽")
-        self.profit_tax_label = QLabel("Налог на прибыль: 0 ₽")
+        Интерпретация данных:
+        - Дебетовое сальдо = авансы выданные (поставщики должны нам)
+        - Кредитовое сальдо = наш долг перед поставщиками
+        - Обороты по дебету = оплата поставщикам
+        - Обороты по кредиту = поступление товаров/услуг
+        """
+        import re
+        from datetime import datetime
 
-        for label in [self.revenue_with_vat_label, self.expenses_with_vat_label,
-                    self.gross_profit_with_vat_label, self.profit_without_vat_label,
-                    self.vat_to_budget_net_label, self.profit_tax_label]:
-            label.setStyleSheet("""
-                QLabel {
-                    background-color: #ecf0f1;
-                    padding: 8px 12px;
-                    border-radius: 4px;
-                    font-weight: bold;
-                    color: #2c3e50;
-                    border: 1px solid #bdc3c7;
-                }
-            """)
+        print(f"Парсер ОСВ 60: начало обработки {book.file_path}")
+        df = book.frame
+        print(f"Прочитано строк: {len(df)}")
 
-        summary_layout.addWidget(self.revenue_with_vat_label)
-        summary_layout.addWidget(self.expenses_with_vat_label)
-        summary_layout.addWidget(self.gross_profit_with_vat_label)
-        summary_layout.addWidget(self.profit_without_vat_label)
-        summary_layout.addWidget(self.vat_to_budget_net_label)
-        summary_layout.addWidget(self.profit_tax_label)
-        summary_layout.addStretch()
+        # --- 1. Компания ---
+        company = "Неизвестная компания"
+        if len(df) > 0 and df.iloc[0, 0] and df.iloc[0, 0] != 'nan':
+            company = df.iloc[0, 0].strip()
+        print(f"ОСВ 60: компания = {company}")
 
-        table_layout.addLayout(summary_layout)
-        
-        #-----------------------------------------------------------------------
-        # Вкладка с графиками - КАЖДЫЙ ГРАФИК НА ОТДЕЛЬНОЙ СТРОКЕ
-        self.charts_tab = QWidget()
-        charts_layout = QVBoxLayout(self.charts_tab)
+        # --- 2. Период ---
+        period_start = "2025-01-01"
+        period_end = "2025-12-31"
+        if len(df) > 1:
+            year_match = re.search(r'(\d{4})', df.iloc[1, 0])
+            if year_match:
+                year = year_match.group(1)
+                period_start = f"{year}-01-01"
+                period_end = f"{year}-12-31"
+                print(f"ОСВ 60: год {year}")
 
-        # Создаём область с прокруткой
-        scroll_area = QScrollArea()
-        scroll_area.setWidgetResizable(True)
-        scroll_area.setHorizontalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAsNeeded)
-        scroll_area.setVerticalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAsNeeded)
+        # --- 3. Находим начало данных (после строки с заголовками) ---
+        data_start = None
+        for i in range(len(df)):
+            if df.iloc[i, 0].strip() == '60':
+                data_start = i
+                print(f"ОСВ 60: данные начинаются со строки {data_start}")
+                break
 
-        # Контейнер для всех графиков
-        charts_container = QWidget()
-        charts_container_layout = QVBoxLayout(charts_container)
-        charts_container_layout.setSpacing(30)  # Большие отступы между графиками
-        charts_container_layout.setContentsMargins(10, 10, 10, 10)
+        if data_start is None:
+            raise ValueError("Не найдена строка с '60' в ОСВ 60")
 
-        # Первый график - отдельно
-        self.figure1, self.ax1 = plt.subplots(figsize=(10, 8))  # Увеличенный размер
-        self.figure1.patch.set_facecolor('#f5f5f5')
-        self.canvas1 = FigureCanvas(self.figure1)
-        self.canvas1.setMinimumHeight(500)
-        charts_container_layout.addWidget(QLabel("График 1. Распределение прибыли по товарным группам"))
-        charts_container_layout.addWidget(self.canvas1)
-        charts_container_layout.addSpacing(20)
+        records = ReportRecords()
+        import_date = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        total_begin_debit = 0
+        total_begin_credit = 0
+        total_debit_turnover = 0
+        total_credit_turnover = 0
+        total_end_debit = 0
+        total_end_credit = 0
 
-        # Второй график - отдельно
-        self.figure2, self.ax2 = plt.subplots(figsize=(10, 8))
-        self.figure2.patch.set_facecolor('#f5f5f5')
-        self.canvas2 = FigureCanvas(self.figure2)
-        self.canvas2.setMinimumHeight(500)
-        charts_container_layout.addWidget(QLabel("График 2. ТОП-5 товаров по прибыльности"))
-        charts_container_layout.addWidget(self.canvas2)
-        charts_container_layout.addSpacing(20)
+        # Суммы колонок 1-6 переводим в числа сразу для всего листа
+        numbers = self.clean_number_columns(df, range(1, 7))
 
-        # Третий график - отдельно
-        self.figure3, self.ax3 = plt.subplots(figsize=(10, 8))
-        self.figure3.patch.set_facecolor('#f5f5f5')
-        self.canvas3 = FigureCanvas(self.figure3)
-        self.canvas3.setMinimumHeight(500)
-        charts_container_layout.addWidget(QLabel("График 3. Закупки с НДС по кварталам"))
-        charts_container_layout.addWidget(self.canvas3)
-        charts_container_layout.addSpacing(20)
+        # --- 4. Сбор данных ---
+        for i in range(data_start, len(df)):
+            row = df.iloc[i].tolist()
+            first_cell = str(row[0]).strip().lower() if row[0] else ''
 
-        # Четвертый график - отдельно
-        self.figure4, self.ax4 = plt.subplots(figsize=(10, 8))
-        self.figure4.patch.set_facecolor('#f5f5f5')
-        self.canvas4 = FigureCanvas(self.figure4)
-        self.canvas4.setMinimumHeight(500)
-        charts_container_layout.addWidget(QLabel("График 4. Выручка с НДС по кварталам"))
-        charts_container_layout.addWidget(self.canvas4)
-        charts_container_layout.addSpacing(20)
+            if 'итого' in first_cell:
+                print(f"ОСВ 60: итог на строке {i}")
+                # Получаем итоговые значения из строки "Итого"
+                total_begin_debit = numbers[1][i]
+                total_begin_credit = numbers[2][i]
+                total_debit_turnover = numbers[3][i]
+                total_credit_turnover = numbers[4][i]
+                total_end_debit = numbers[5][i]
+                total_end_credit = numbers[6][i]
+                
+                # Добавляем итоговую запись
+                records.add_row(
+                    company=company,
+                    period_start=period_start,
+                    period_end=period_end,
+                    account='60',
+                    product_group='ОСВ 60',
+                    doc_type='osv_60_summary',
+                    seller='ИТОГО по счету 60',
+                    purchase_amount_with_vat=total_credit_turnover,  # Поступление товаров/услуг
+                    osv_begin_balance_debit=total_begin_debit,
+                    osv_begin_balance_credit=total_begin_credit,
+                    osv_turnover_debit=total_debit_turnover,    # Оплата поставщикам
+                    osv_turnover_credit=total_credit_turnover,  # Поступление товаров/услуг
+                    osv_end_balance_debit=total_end_debit,
+                    osv_end_balance_credit=total_end_credit,
+                    import_date=import_date,
+                )
+                break
 
-        # Пятый график - отдельно
-        self.figure5, self.ax5 = plt.subplots(figsize=(10, 8))
-        self.figure5.patch.set_facecolor('#f5f5f5')
-        self.canvas5 = FigureCanvas(self.figure5)
-        self.canvas5.setMinimumHeight(500)
-        charts_container_layout.addWidget(QLabel("График 5. НДС в бюджет по кварталам"))
-        charts_container_layout.addWidget(self.canvas5)
-        charts_container_layout.addSpacing(20)
+            # Если это строка счета 60 (итоги по счету)
+            if first_cell.replace('.', '').isdigit() and first_cell == '60':
+                begin_debit = numbers[1][i]
+                begin_credit = numbers[2][i]
+                debit_turnover = numbers[3][i]
+                credit_turnover = numbers[4][i]
+                end_debit = numbers[5][i]
+                end_credit = numbers[6][i]
+                
+                records.add_row(
+                    company=company,
+                    period_start=period_start,
+                    period_end=period_end,
+                    account='60',
+                    product_group='ОСВ 60',
+                    doc_type='osv_60',
+                    nomenclature='Счет 60 (общие итоги)',
+                    purchase_amount_with_vat=credit_turnover,
+                    osv_begin_balance_debit=begin_debit,
+                    osv_begin_balance_credit=begin_credit,
+                    osv_turnover_debit=debit_turnover,
+                    osv_turnover_credit=credit_turnover,
+                    osv_end_balance_debit=end_debit,
+                    osv_end_balance_credit=end_credit,
+                    import_date=import_date,
+                )
+                continue
 
-        # Шестой график - отдельно
-        self.figure6, self.ax6 = plt.subplots(figsize=(10, 8))
-        self.figure6.patch.set_facecolor('#f5f5f5')
-        self.canvas6 = FigureCanvas(self.figure6)
-        self.canvas6.setMinimumHeight(500)
-        charts_container_layout.addWidget(QLabel("График 6. НДС по выручке по кварталам"))
-        charts_container_layout.addWidget(self.canvas6)
-        charts_container_layout.addSpacing(20)
+            # Если это контрагент
+            if first_cell and not first_cell[0].isdigit() and 'итого' not in first_cell:
+                counterparty = row[0].strip()
+                debit_turnover = numbers[3][i]
+                credit_turnover = numbers[4][i]
+                end_debit = numbers[5][i]
+                end_credit = numbers[6][i]
+                
+                if debit_turnover != 0 or credit_turnover != 0 or end_debit != 0 or end_credit != 0:
+                    records.add_row(
+                        company=company,
+                        period_start=period_start,
+                        period_end=period_end,
+                        account='60',
+                        product_group='ОСВ 60',
+                        doc_type='osv_60',
+                        seller=counterparty,  # Поставщик
+                        purchase_amount_with_vat=credit_turnover,
+                        osv_turnover_debit=debit_turnover,
+                        osv_turnover_credit=credit_turnover,
+                        osv_end_balance_debit=end_debit,
+                        osv_end_balance_credit=end_credit,
+                        import_date=import_date,
+                    )
+
+        if not len(records):
+            raise ValueError("Не найдено записей в ОСВ 60")
 
-        # Седьмой график - отдельно
-        self.figure7, self.ax7 = plt.subplots(figsize=(10, 8))
-        self.figure7.patch.set_facecolor('#f5f5f5')
-        self.canvas7 = FigureCanvas(self.figure7)
-        self.canvas7.setMinimumHeight(500)
-        charts_container_layout.addWidget(QLabel("График 7. НДС по затратам по кварталам"))
-        charts_container_layout.addWidget(self.canvas7)
-        charts_container_layout.addSpacing(20)
+        print(f"ОСВ 60: найдено записей — {len(records)}")
+        return records
 
-        # Восьмой график - отдельно
-        self.figure8, self.ax8 = plt.subplots(figsize=(10, 8))
-        self.figure8.patch.set_facecolor('#f5f5f5')
-        self.canvas8 = FigureCanvas(self.figure8)
-        self.canvas8.setMinimumHeight(500)
-        charts_container_layout.addWidget(QLabel("График 8. Валовая прибыль по кварталам"))
-        charts_container_layout.addWidget(self.canvas8)
-        charts_container_layout.addSpacing(20)
 
-        # Девятый график - отдельно
-        self.figure9, self.ax9 = plt.subplots(figsize=(10, 8))
-        self.figure9.patch.set_facecolor('#f5f5f5')
-        self.canvas9 = FigureCanvas(self.figure9)
-        self.canvas9.setMinimumHeight(500)
-        charts_container_layout.addWidget(QLabel("График 9. Затраты по кварталам (все налоги и закупки)"))
-        charts_container_layout.addWidget(self.canvas9)
-
-        # Кнопка обновления
-        charts_btn_layout = QHBoxLayout()
-        self.update_charts_btn = QPushButton("Обновить графики")
-        self.update_charts_btn.clicked.connect(self.update_charts)
-        self.update_charts_btn.setStyleSheet(self.apply_filter_btn.styleSheet())
-        charts_container_layout.addLayout(charts_btn_layout)
+    #==========================================================================
+    # ========== ПАРСЕР ОСВ44 ==========
+    
+    def _parse_osv_44_detailed(self, book):
+        """
+        Парсинг оборотно-сальдовой ведомости по счету 44 (Расходы на продажу)
+        """
+        import re
+        from datetime import datetime
 
-        charts_container_layout.addStretch()
-        scroll_area.setWidget(charts_container)
-        charts_layout.addWidget(scroll_area)
+        print(f"Парсер ОСВ 44: начало обработки {book.file_path}")
+        df = book.frame
+        print(f"Прочитано строк: {len(df)}")
 
-        self.tab_widget.addTab(self.table_tab, "📊 Таблица данных")
-        self.tab_widget.addTab(self.charts_tab, "📈 Графики и анализ")
+        # --- 1. Компания ---
+        company = "Неизвестная компания"
+        if len(df) > 0 and df.iloc[0, 0] and df.iloc[0, 0] != 'nan':
+            company = df.iloc[0, 0].strip()
+        print(f"ОСВ 44: компания = {company}")
 
-        right_layout.addWidget(self.tab_widget)
-        self.splitter.addWidget(right_panel)
-        self.splitter.setSizes([250, self.width() - 250])
+        # --- 2. Период ---
+        period_start = "2025-01-01"
+        period_end = "2025-12-31"
+        if len(df) > 1:
+            year_match = re.search(r'(\d{4})', df.iloc[1, 0])
+            if year_match:
+                year = year_match.group(1)
+                period_start = f"{year}-01-01"
+                period_end = f"{year}-12-31"
+                print(f"ОСВ 44: год {year}")
 
-        # !!! ВАЖНО - ДОБАВЛЯЕМ СПЛИТТЕР В MAIN_LAYOUT !!!
-        main_layout.addWidget(self.splitter)
+        # --- 3. Находим начало данных (после строки "Период") ---
+        data_start = None
+        for i in range(len(df)):
+            if 'период' in df.iloc[i, 0].lower():
+                data_start = i + 1
+                print(f"ОСВ 44: данные начинаются со строки {data_start}")
+                break
 
-        # Инициализация данными
-        self.current_df = pd.DataFrame()
-        self.display_data(self.current_df)
-        self.update_summary()
-        self.update_charts()
-        self.update_filter_combos()
+        if data_start is None:
+            raise ValueError("Не найдена строка с 'Период' в ОСВ 44")
 
-    #================================================================================
-    # Создание меню
-    def create_menus(self):
-        menubar = self.menuBar()
+        records = ReportRecords()
+        import_date = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
 
-        # КНОПКА ОБРАБОТАТЬ - ПЕРВАЯ В СТРОКЕ МЕНЮ
-        self.process_selected_btn = QPushButton("ОБРАБОТАТЬ")
-        self.process_selected_btn.setEnabled(False)
-        self.process_selected_btn.setStyleSheet("""
-            QPushButton {
-                background-color: #ff4444;
-                color: white;
-                font-weight: bold;
-                font-size: 14px;
-                padding: 5px 15px;
-                border-radius: 4px;
-                margin: 2px 5px;
-            }
-            QPushButton:hover {
-                background-color: #ff6666;
-            }
-            QPushButton:disabled {
-                background-color: #cccccc;
-                color: #666666;
-            }
-        """)
-        self.process_selected_btn.clicked.connect(self.process_selected_files)
-        menubar.setCornerWidget(self.process_selected_btn, Qt.Corner.TopLeftCorner)
+        # Обороты (колонки 3 и 4) переводим в числа сразу для всего листа
+        numbers = self.clean_number_columns(df, [3, 4])
 
-        # Меню "База данных"
-        db_menu = menubar.addMenu("База данных")
-        load_db_action = QAction("Загрузить БД", self)
-        load_db_action.triggered.connect(self.load_database)
-        db_menu.addAction(load_db_action)
+        # --- 4. Собираем все строки до "Итого" ---
+        for i in range(data_start, len(df)):
+            row = df.iloc[i].tolist()
+            first_cell = str(row[0]).strip().lower() if row[0] else ''
 
-        save_db_action = QAction("Сохранить БД", self)
-        save_db_action.triggered.connect(self.save_database)
-        db_menu.addAction(save_db_action)
+            if 'итого' in first_cell:
+                print(f"ОСВ 44: итог на строке {i}")
+                # Получаем итоговые значения
+                total_debit_turnover = numbers[3][i]  # Дебет (обороты)
+                total_credit_turnover = numbers[4][i] # Кредит (обороты)
+                
+                # Добавляем итоговую запись - ТОЛЬКО В НУЖНЫЕ ПОЛЯ!
+                records.add_row(
+                    company=company,
+                    period_start=period_start,
+                    period_end=period_end,
+                    account='44',  # ← ТОЛЬКО номер счета
+                    product_group='ОСВ 44',
+                    doc_type='osv_44_summary',
+                    cost_price=total_debit_turnover,  # Расходы на продажу
+                    sales_expenses=total_debit_turnover,  # Расходы на продажу
+                    osv_turnover_debit=total_debit_turnover,
+                    osv_turnover_credit=total_credit_turnover,
+                    import_date=import_date,
+                )
+                break
+            
+            # Если есть статьи затрат с ненулевыми оборотами - сохраняем их
+            if first_cell and not first_cell[0].isdigit() and 'итого' not in first_cell:
+                article = first_cell
+                debit_turnover = numbers[3][i]
+                credit_turnover = numbers[4][i]
+                
+                if debit_turnover != 0 or credit_turnover != 0:
+                    records.add_row(
+                        company=company,
+                        period_start=period_start,
+                        period_end=period_end,
+                        account='44',
+                        product_group='ОСВ 44',
+                        doc_type='osv_44',
+                        nomenclature=article,  # Здесь название статьи уместно
+                        cost_price=debit_turnover,
+                        sales_expenses=debit_turnover,
+                        osv_turnover_debit=debit_turnover,
+                        osv_turnover_credit=credit_turnover,
+                        import_date=import_date,
+                    )
+
+        if not len(records):
+            # Если нет данных, создаем запись с нулями для итога
+            records.add_row(
+                company=company,
+                period_start=period_start,
+                period_end=period_end,
+                account='44',
+                product_group='ОСВ 44',
+                doc_type='osv_44_summary',
+                import_date=import_date,
+            )
 
-        save_as_action = QAction("Сохранить БД как...", self)
-        save_as_action.triggered.connect(self.save_database_as)
-        db_menu.addAction(save_as_action)
+        print(f"ОСВ 44: найдено записей — {len(records)}")
+        return records
 
-        clear_db_action = QAction("Очистить БД", self)
-        clear_db_action.triggered.connect(self.clear_database)
-        db_menu.addAction(clear_db_action)
+    #==========================================================================
+    # ========== ПАРСЕР ОСВ41 ==========
 
-        export_db_action = QAction("Экспорт БД в Excel", self)
-        export_db_action.triggered.connect(self.export_to_excel)
-        db_menu.addAction(export_db_action)
+    # Типы строк ОСВ 41 по первой ячейке
+    OSV41_OTHER, OSV41_TURNOVER, OSV41_NOMENCLATURE, OSV41_ACCOUNT, OSV41_TOTAL = range(5)
 
-        import_template_action = QAction("Импорт из шаблона", self)
-        import_template_action.triggered.connect(self.import_from_template)
-        db_menu.addAction(import_template_action)
+    def _osv41_row_kinds(self, first):
+        """
+        Тип каждой строки листа разом; first - первая колонка, strip().lower().
+        Проверки в порядке старого разбора: итог, счет (41, 41.01), номенклатура
+        (начинается с цифры, длиннее 10 символов), 'обороты за', прочее
+        """
+        length = np.char.str_len(first)
+        kinds = np.full(len(first), self.OSV41_OTHER, dtype=np.int8)
+        kinds[np.char.find(first, 'обороты за') >= 0] = self.OSV41_TURNOVER
+        kinds[np.char.isdigit(first.astype('<U1')) & (length > 10)] = self.OSV41_NOMENCLATURE
+        kinds[np.char.isdigit(np.char.replace(first, '.', '')) & (length < 10)] = self.OSV41_ACCOUNT
+        kinds[np.char.find(first, 'итого') >= 0] = self.OSV41_TOTAL
+        return kinds
+
+    def _osv41_visited_rows(self, empty, kinds, data_start):
+        """
+        Строки, которые читает разбор ОСВ 41: от data_start шаг 2 (значение + 'Кол.'),
+        пустые строки пропускаются по одной, 'Итого' завершает.
+        Возвращает (номера строк, номер строки 'Итого' или None)
+        """
+        n = len(empty)
+        # next_filled[p] - первая непустая строка не раньше p; за концом листа - n
+        positions = np.where(empty, n, np.arange(n))
+        next_filled = np.append(np.minimum.accumulate(positions[::-1])[::-1], [n, n]).tolist()
+        kinds = kinds.tolist()
+        visited = []
+        i = next_filled[data_start]
+        while i < n:
+            if kinds[i] == self.OSV41_TOTAL:
+                return np.array(visited, dtype=np.int64), i
+            visited.append(i)
+            i = next_filled[i + 2]
+        return np.array(visited, dtype=np.int64), None
+
+    def _parse_osv_41_detailed(self, book):
+        """
+        Парсинг оборотно-сальдовой ведомости по счету 41 (Товары).
+        Типы строк размечаются масками по всей первой колонке, счет и номенклатура
+        протягиваются на строки оборотов по номерам групп, приходы и расходы
+        собираются колонками
+        """
+        print(f"Парсер ОСВ 41: начало обработки {book.file_path}")
+        df = book.frame
+        print(f"Прочитано строк: {len(df)}")
 
-        # Меню "Отчеты"
-        report_menu = menubar.addMenu("Отчеты")
-        quick_report_action = QAction("Быстрый отчет", self)
-        quick_report_action.triggered.connect(self.generate_quick_report)
-        report_menu.addAction(quick_report_action)
+        company = "Неизвестная компания"
+        if len(df) > 0 and df.iloc[0, 0] and df.iloc[0, 0] != 'nan':
+            company = df.iloc[0, 0].strip()
+        print(f"ОСВ 41: компания = {company}")
 
-        report_menu.addSeparator()
+        period_start = "2025-01-01"
+        period_end = "2025-12-31"
+        if len(df) > 1:
+            year_match = re.search(r'(\d{4})', df.iloc[1, 0])
+            if year_match:
+                year = year_match.group(1)
+                period_start = f"{year}-01-01"
+                period_end = f"{year}-12-31"
+                print(f"ОСВ 41: год {year}")
 
-        pdf_action = QAction("Экспорт в PDF", self)
-        pdf_action.triggered.connect(self.export_to_pdf)
-        report_menu.addAction(pdf_action)
+        n = len(df)
+        first_raw = np.array(df[0].tolist() if n else [], dtype=str)
+        first_text = np.char.strip(first_raw)
+        first = np.char.lower(first_text)
+        article = np.char.strip(np.array(df[1].tolist() if 1 in df.columns else [''] * n, dtype=str))
 
-        word_action = QAction("Экспорт в Word", self)
-        word_action.triggered.connect(self.export_to_word)
-        report_menu.addAction(word_action)
+        # Находим начало данных
+        starts = np.flatnonzero(first_text == '41')
+        if not len(starts):
+            raise ValueError("Не найдена строка с '41' в ОСВ 41")
+        data_start = int(starts[0])
+        print(f"ОСВ 41: данные начинаются со строки {data_start}")
+
+        kinds = self._osv41_row_kinds(first)
+        empty = (first_raw == '') | (first_raw == 'nan')
+        visited, total_at = self._osv41_visited_rows(empty, kinds, data_start)
+        if total_at is not None:
+            print(f"ОСВ 41: итог на строке {total_at}")
+
+        # Номер группы: последняя строка счета и номенклатуры перед каждой прочитанной строкой
+        visited_kinds = kinds[visited]
+        order = np.arange(len(visited))
+        account_group = np.maximum.accumulate(np.where(visited_kinds == self.OSV41_ACCOUNT, order, -1))
+        nomenclature_group = np.maximum.accumulate(np.where(visited_kinds == self.OSV41_NOMENCLATURE, order, -1))
+
+        # Обороты, за которыми есть строка 'Кол.' с суммами
+        turnover = np.flatnonzero((visited_kinds == self.OSV41_TURNOVER) & (visited + 1 < n))
+        rows = visited[turnover]
+        print(f"ОСВ 41: счетов {int((visited_kinds == self.OSV41_ACCOUNT).sum())}, "
+              f"номенклатур {int((visited_kinds == self.OSV41_NOMENCLATURE).sum())}, оборотов {len(rows)}")
+
+        # Суммы оборотов и итогов переводим в числа сразу для всего листа
+        numbers = self.clean_number_columns(df, [3, 5, 6, 7])
+        import_date = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+        records = ReportRecords()
+        if len(rows):
+            account_rows = visited[account_group[turnover]]
+            nomenclature_rows = visited[nomenclature_group[turnover]]
+
+            # 'код Наименование' -> 'Наименование'; без пробела - ячейка целиком
+            _, separator, name = np.moveaxis(np.char.partition(first_raw[nomenclature_rows], ' '), -1, 0)
+            nomenclature = np.where(separator != '', name, first_raw[nomenclature_rows])
+
+            # Дебет и кредит оборота - в колонках 5 и 6 следующей строки (Кол.)
+            debit = np.array(numbers[5])[rows + 1]
+            credit = np.array(numbers[6])[rows + 1]
+            orphan = (account_group[turnover] < 0) | (nomenclature_group[turnover] < 0)
+            if (orphan & ((debit > 0) | (credit > 0))).any():
+                raise ValueError("ОСВ 41: обороты до строки счета или номенклатуры")
+            op_date = pd.Series(first[rows], dtype=object).str.extract(
+                r'(\d{2}\.\d{2}\.\d{2,4})', expand=False).fillna('').to_numpy()
+
+            # Приход (дебет) и расход (кредит) каждого оборота, приход первым
+            incoming = np.flatnonzero(debit > 0)
+            outgoing = np.flatnonzero(credit > 0)
+            movement = np.concatenate([incoming, outgoing])
+            is_credit = np.concatenate([np.zeros(len(incoming), dtype=bool), np.ones(len(outgoing), dtype=bool)])
+            order = np.lexsort((is_credit, movement))
+            movement, is_credit = movement[order], is_credit[order]
+            amount = np.where(is_credit, credit[movement], debit[movement])
+
+            if len(movement):
+                records.add(
+                    len(movement),
+                    company=company,
+                    period_start=period_start,
+                    period_end=period_end,
+                    account=first_text[account_rows][movement],
+                    product_group='ОСВ 41',
+                    doc_type='osv_41',
+                    nomenclature=nomenclature[movement],
+                    article=article[nomenclature_rows][movement],
+                    document_date=op_date[movement],
+                    payment_document=first_raw[rows][movement],
+                    cost_price=np.where(is_credit, amount, 0.0),
+                    purchase_amount_with_vat=np.where(is_credit, 0.0, amount),
+                    quantity=amount,
+                    osv_turnover_debit=np.where(is_credit, 0.0, amount),
+                    osv_turnover_credit=np.where(is_credit, amount, 0.0),
+                    import_date=import_date,
+                )
 
-        # Меню "Настройки"
-        settings_menu = menubar.addMenu("Настройки")
-        settings_action = QAction("Настройки программы", self)
-        settings_action.triggered.connect(self.show_settings)
-        settings_menu.addAction(settings_action)
+        # ===== ДОБАВЛЯЕМ ИТОГОВУЮ ЗАПИСЬ =====
+        # Первая строка с "Итого" после начала данных - отдельной записью
+        totals = np.flatnonzero(np.char.find(np.char.lower(first_raw[data_start:]), 'итого') >= 0)
+        if len(totals):
+            j = data_start + int(totals[0])
+            print(f"НАЙДЕНА ИТОГОВАЯ СТРОКА: {first_raw[j]}")
+
+            # Колонка 3: сальдо на начало (дебет), 5 и 6: обороты дебет и кредит, 7: сальдо на конец (дебет)
+            begin_balance = numbers[3][j]
+            debit_turnover = numbers[5][j]
+            credit_turnover = numbers[6][j]
+            end_balance = numbers[7][j]
+
+            print(f"  ИТОГО: нач={begin_balance}, обороты д/к={debit_turnover}/{credit_turnover}, кон={end_balance}")
+
+            records.add_row(
+                company=company,
+                period_start=period_start,
+                period_end=period_end,
+                account='41_ИТОГО',
+                product_group='ОСВ 41',
+                doc_type='osv_41_summary',
+                nomenclature='ИТОГО по счету 41',
+                payment_document='Итоговые данные',
+                purchase_amount_with_vat=debit_turnover,
+                osv_begin_balance=begin_balance,
+                osv_end_balance=end_balance,
+                osv_turnover_debit=debit_turnover,
+                osv_turnover_credit=credit_turnover,
+                import_date=import_date,
+            )
 
-        # Меню "О программе"
-        about_menu = menubar.addMenu("Помощь")
-        about_action = QAction("О программе", self)
-        about_action.triggered.connect(self.show_about)
-        about_menu.addAction(about_action)
-       
-    #=======================================================
-    #  Метод активации кнопки Обработать
-    def _update_process_button_state(self):
-        files = self.get_checked_files()
-        self.process_selected_btn.setEnabled(len(files) > 0)
+        if not len(records):
+            raise ValueError("Не найдено записей в ОСВ 41")
 
+        print(f"ОСВ 41: найдено записей — {len(records)}")
+        return records
 
-       # ==================== РАБОТА С ДЕРЕВОМ ФАЙЛОВ ====================
-    def choose_root_folder(self):
-        folder = QFileDialog.getExistingDirectory(self, "Выберите папку загрузки", self.load_folder)
-        if folder:
-            self.settings.setValue("input_folder", folder)
-            self.load_folder = folder
-            self.load_folder_tree(folder)
+    #==========================================================================
+    # ========== ПАРСЕР ОСВ19 ==========
+    def _parse_osv_19_detailed(self, book):
+        """
+        Парсинг оборотно-сальдовой ведомости по счету 19
+        """
+        import pandas as pd
+        import re
+        from datetime import datetime
 
-    # ================================================================================
-    # """Загружает дерево файлов из папки и сохраняет путь в настройки"""
-    def load_folder_tree(self, folder_path):
-        """Загружает дерево файлов из папки и сохраняет путь в настройки"""
-        self.tree_widget.clear()
-        root_item = QTreeWidgetItem([os.path.basename(folder_path)])
-        root_item.setData(0, Qt.ItemDataRole.UserRole, folder_path)
-        root_item.setFlags(root_item.flags() | Qt.ItemFlag.ItemIsUserCheckable)
-        root_item.setCheckState(0, Qt.CheckState.Unchecked)
-        self.tree_widget.addTopLevelItem(root_item)
-        self._add_folder_contents(folder_path, root_item)
-        root_item.setExpanded(True)
-        # Сохраняем путь к папке
-        self.settings.setValue("last_folder", folder_path)
-    
-    # ================================================================================
-    def _add_folder_contents(self, path, parent_item):
-        try:
-            for item in sorted(os.listdir(path)):
-                full_path = os.path.join(path, item)
-                if os.path.isdir(full_path):
-                    child = QTreeWidgetItem([item])
-                    child.setData(0, Qt.ItemDataRole.UserRole, full_path)
-                    child.setFlags(child.flags() | Qt.ItemFlag.ItemIsUserCheckable)
-                    child.setCheckState(0, Qt.CheckState.Unchecked)
-                    parent_item.addChild(child)
-                    self._add_folder_contents(full_path, child)
-                elif item.lower().endswith(('.xlsx', '.xls')):
-                    child = QTreeWidgetItem([item])
-                    child.setData(0, Qt.ItemDataRole.UserRole, full_path)
-                    child.setFlags(child.flags() | Qt.ItemFlag.ItemIsUserCheckable)
-                    child.setCheckState(0, Qt.CheckState.Unchecked)
-                    parent_item.addChild(child)
-        except Exception as e:
-            print(f"Ошибка чтения папки {path}: {e}")
+        print(f"Парсер ОСВ 19: начало обработки {book.file_path}")
+        
+        # Лист уже прочитан и очищен в LoadedWorkbook
+        df = book.frame
+        # 👇 ДОБАВЛЯЕМ СЮДА
+        def fix_account_dates(val):
+            if pd.isna(val) or val == '' or val == 'nan':
+                return ''
+            s = str(val).strip()
+            if '-' in s and ' ' in s and len(s.split()) >= 2:
+                date_part = s.split()[0]
+                if '-' in date_part:
+                    parts = date_part.split('-')
+                    if len(parts) == 3:
+                        year, month, day = parts
+                        return f"{day}.{month}"
+            return s
 
-    def get_checked_files(self, item=None, files=None):
-        if files is None:
-            files = []
-            root = self.tree_widget.topLevelItem(0)
-            if root is None:
-                return files
-            self.get_checked_files(root, files)
-            return files
+        df[0] = df[0].apply(fix_account_dates)
+        # 👆
 
-        if item.checkState(0) == Qt.CheckState.Checked:
-            file_path = item.data(0, Qt.ItemDataRole.UserRole)
-            if file_path and os.path.isfile(file_path) and not os.path.basename(file_path).startswith('~$'):
-                files.append(file_path)
-        elif item.checkState(0) == Qt.CheckState.Checked and os.path.isdir(item.data(0, Qt.ItemDataRole.UserRole)):
-            folder = item.data(0, Qt.ItemDataRole.UserRole)
-            for root, dirs, files_in_folder in os.walk(folder):
-                for f in files_in_folder:
-                    if f.lower().endswith(('.xlsx', '.xls')) and not f.startswith('~$'):
-                        files.append(os.path.join(root, f))
-            return
+        print(f"Прочитано строк: {len(df)}")
 
-        for i in range(item.childCount()):
-            self.get_checked_files(item.child(i), files)
+        # --- 1. Компания ---
+        company = "Неизвестная компания"
+        if len(df) > 0 and df.iloc[0, 0] and df.iloc[0, 0] != 'nan':
+            company = df.iloc[0, 0].strip()
+        print(f"ОСВ 19: компания = {company}")
 
-    def process_selected_files(self):
-        files = self.get_checked_files()
-        if not files:
-            QMessageBox.information(self, "Ничего не выбрано", "Не выбрано ни одного файла для обработки.")
-            return
-        self.process_files(files)
+        # --- 2. Период ---
+        period_start = "2025-01-01"
+        period_end = "2025-12-31"
+        if len(df) > 1:
+            year_match = re.search(r'(\d{4})', df.iloc[1, 0])
+            if year_match:
+                year = year_match.group(1)
+                period_start = f"{year}-01-01"
+                period_end = f"{year}-12-31"
+                print(f"ОСВ 19: год {year}")
 
-    def _handle_item_changed(self, item, column):
-        self.tree_widget.blockSignals(True)
-        state = item.checkState(0)
-        self._set_children_checkstate(item, state)
-        self.tree_widget.blockSignals(False)
+        # --- 3. Находим начало данных ---
+        data_start = None
+        for i in range(len(df)):
+            if df.iloc[i, 0].strip() == '19':
+                data_start = i
+                print(f"ОСВ 19: данные начинаются со строки {i}")
+                break
+        
+        if data_start is None:
+            raise ValueError("Не найдена строка с '19' в ОСВ 19")
 
-    def _set_children_checkstate(self, item, state):
-        for i in range(item.childCount()):
-            child = item.child(i)
-            child.setCheckState(0, state)
-            self._set_children_checkstate(child, state)
-    #================================================================================
-    # ==================== РАБОТА С БАЗОЙ ДАННЫХ ====================
-    def clear_database(self):
-        reply = QMessageBox.question(self, "Подтверждение",
-                                    "Вы действительно хотите удалить все данные из базы?",
-                                    QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No)
-        if reply == QMessageBox.StandardButton.Yes:
-            cursor = self.db.conn.cursor()
-            cursor.execute("DELETE FROM reports")
-            cursor.execute("DELETE FROM sqlite_sequence WHERE name='reports'")
-            self.db.conn.commit()
-            self.current_df = pd.DataFrame()
-            self.display_data(self.current_df)
-            self.update_summary()
-            self.update_charts()
-            self.update_filter_combos()
+                
+        # --- 4. Индексы колонок ---
+        debit_turnover_col = 3
+        credit_turnover_col = 4
+
+        # --- 5. Сбор записей ---
+        records = ReportRecords()
+        current_account = None
+        numbers = self.clean_number_columns(df, [debit_turnover_col, credit_turnover_col])
+
+        for i in range(data_start, len(df)):
+            row = df.iloc[i].tolist()
+            if len(row) == 0:
+                continue
+                
+            first_cell = str(row[0]).strip().lower() if row[0] else ''
             
-            # При очистке базы удаляем запись о последней БД (будет создана новая при закрытии)
-            self.settings.remove("last_database")
+            if 'итого' in first_cell:
+                print(f"ОСВ 19: итог на строке {i}")
+                break
             
-            QMessageBox.information(self, "Готово", "База данных очищена")
-
-    # ===============================================================================
-    # """Загружает базу данных из выбранного файла .db."""
-    def load_database(self):
-        """Загружает базу данных из выбранного файла .db."""
-        start_dir = self.db_load_folder if self.db_load_folder else ""
-        file_path, _ = QFileDialog.getOpenFileName(
-            self,
-            "Выберите файл базы данных",
-            start_dir,
-            "SQLite DB (*.db)"
-        )
-        if not file_path:
-            return
+            if not first_cell or first_cell == 'nan':
+                continue
+            
+            incoming_vat = numbers[debit_turnover_col][i]
+            deducted_vat = numbers[credit_turnover_col][i]
+            
+            if incoming_vat == 0 and deducted_vat == 0:
+                continue
+            
+            if first_cell[0].isdigit():
+                account = row[0].strip()
+                current_account = account
+            else:
+                account = current_account
+            
+            records.add_row(
+                company=company,
+                period_start=period_start,
+                period_end=period_end,
+                account=account,
+                product_group='ОСВ 19',
+                doc_type='osv_19',
+                seller=row[0].strip() if not first_cell[0].isdigit() else '',
+                vat_deductible=deducted_vat,
+                quantity=1,
+            )
 
-        try:
-            self.db.conn.close()
-            self.db = DatabaseManager(db_path=file_path)
-            self.current_df = self.db.get_all_data()
-            self.display_data(self.current_df)
-            self.update_summary()
-            self.update_charts()
-            self.update_filter_combos()
-            # Сохраняем путь как последнюю БД
-            self.settings.setValue("last_database", file_path)
-            QMessageBox.information(self, "Успех", f"База данных загружена из {file_path}")
-        except Exception as e:
-            QMessageBox.critical(self, "Ошибка", f"Не удалось загрузить базу данных:\n{str(e)}")
+        if not len(records):
+            raise ValueError("Не найдено записей в ОСВ 19")
 
-    def save_database(self):
-        QMessageBox.information(self, "Сохранение", "Все изменения уже сохранены в текущей базе данных.")
+        print(f"ОСВ 19: найдено записей — {len(records)}")
+        return records
 
-    #===================================================================
-    # ====================== Сохранить БД как.... ==========================
-    def save_database_as(self):
-        cursor = self.db.conn.execute("PRAGMA database_list")
-        row = cursor.fetchone()
-        if row is None or not row[2]:
-            QMessageBox.warning(self, "Предупреждение", "Не удалось определить путь к текущей базе данных")
-            return
-        current_db_path = row[2]
 
-        start_dir = self.db_save_folder if self.db_save_folder else ""
-        file_path, _ = QFileDialog.getSaveFileName(
-            self,
-            "Сохранить базу данных как",
-            os.path.join(start_dir, "database.db"),
-            "SQLite DB (*.db)"
-        )
-        if not file_path:
-            return
+    #==========================================================================
+    # ========== КНИГА ПОКУПОК ==========
+    def _parse_purchase_book(self, book):
+        records = ReportRecords()
+        for count, keep, columns in self._iter_purchase_book(book):
+            records.add(count, keep=keep, **columns)
+        if not len(records):
+            raise ValueError("Не найдено записей в книге покупок")
 
-        try:
-            shutil.copy2(current_db_path, file_path)
-            # Сохраняем путь как последнюю БД
-            self.settings.setValue("last_database", file_path)
-            QMessageBox.information(self, "Успех", f"База данных сохранена как {file_path}")
-        except Exception as e:
-            QMessageBox.critical(self, "Ошибка", f"Не удалось сохранить базу данных:\n{str(e)}")
+        print(f"Книга покупок: найдено записей — {len(records)}")
+        return records
 
-    # ==================== ИМПОРТ ИЗ ШАБЛОНА ====================
-    def import_from_template(self):
-        file_path, _ = QFileDialog.getOpenFileName(
-            self,
-            "Выберите файл для импорта",
-            self.load_folder,
-            "Excel/CSV Files (*.xlsx *.xls *.csv)"
-        )
-        if not file_path:
-            return
+    def _iter_purchase_book(self, book):
+        """
+        Записи книги покупок по мере чтения строк листа: куски (строк, маска строк с суммами,
+        колонки для ReportRecords.add)
+        """
+        company, period_start, period_end, header_row_idx, num_to_idx, _, rows = \
+            self._read_book_layout(book, 'покупатель', 'книге покупок')
 
-        try:
-            if file_path.endswith('.csv'):
-                df = pd.read_csv(file_path, encoding='utf-8-sig')
-            else:
-                df = pd.read_excel(file_path)
+        print(f"Книга покупок: компания = {company}")
+        print(f"Книга покупок: строка с номерами на индексе {header_row_idx}")
+        print(f"Соответствие базовых номеров колонкам: {num_to_idx}")
 
-            if self._map_columns_and_import(df):
-                QMessageBox.information(self, "Успех", "Данные импортированы")
-                self.current_df = self.db.get_all_data()
-                self.display_data(self.current_df)
-                self.update_summary()
-                self.update_charts()
-                self.update_filter_combos()
-        except Exception as e:
-            QMessageBox.critical(self, "Ошибка", f"Не удалось импортировать файл:\n{str(e)}")
+        required_nums = [2, 3, 8, 9, 14, 15]
+        for num in required_nums:
+            if num not in num_to_idx:
+                raise ValueError(f"Не найден номер колонки {num}")
 
-    def _map_columns_and_import(self, df):
-        cursor = self.db.conn.execute("PRAGMA table_info(reports)")
-        db_columns = [col[1] for col in cursor.fetchall() if col[1] not in ['id', 'import_date']]
+        op_col = num_to_idx[2]
+        doc_col = num_to_idx[3]
+        accept_col = num_to_idx[8]
+        seller_col = num_to_idx[9]
+        amount_col = num_to_idx[14]
+        vat_col = num_to_idx[15]
+
+        current_seller = None
+        for chunk in self._row_chunks(rows):
+            grid = self._rows_grid(chunk)
+            invoices, sellers, current_seller, stop = self._classify_book_rows(
+                grid, seller_col, 'всего по продавцу', current_seller)
+            invoice_rows = grid[invoices]
+            amount = self.clean_number_array(self._grid_column(invoice_rows, amount_col))
+            vat = self.clean_number_array(self._grid_column(invoice_rows, vat_col))
+            keep = (amount != 0) | (vat != 0)
+
+            doc_number, doc_date = self._split_documents(self._grid_column(invoice_rows, doc_col))
+            columns = {
+                'company': company,
+                'period_start': period_start,
+                'period_end': period_end,
+                'doc_type': 'purchase_book',
+                'product_group': 'Покупки',
+                'seller': sellers,
+                'buyer': '',
+                'document_number': doc_number,
+                'document_date': doc_date,
+                'operation_code': self._grid_column(invoice_rows, op_col).tolist(),
+                'acceptance_date': self._grid_column(invoice_rows, accept_col).tolist(),
+                'purchase_amount_with_vat': amount,
+                'sales_amount_with_vat': 0.0,
+                'sales_amount_without_vat': 0.0,
+                'vat_deductible': vat,
+                'vat_to_budget': 0.0,
+                'nomenclature': '',
+                'revenue': 0.0,
+                'cost_price': 0.0,
+                'gross_profit': 0.0,
+                'sales_expenses': 0.0,
+                'other_income_expenses': 0.0,
+                'net_profit': 0.0,
+                'payment_document': '',
+                'quantity': 1
+            }
+            yield len(invoice_rows), keep, columns
+            if stop is not None:
+                return
 
-        dialog = QDialog(self)
-        dialog.setWindowTitle("Сопоставление колонок")
-        dialog.setMinimumWidth(600)
-        layout = QVBoxLayout(dialog)
+    # ========== КНИГА ПРОДАЖ ==========
+    def _parse_sales_book(self, book):
+        print(f"Парсер продаж: начало обработки {book.file_path}")
+        records = ReportRecords()
+        for count, keep, columns in self._iter_sales_book(book):
+            records.add(count, keep=keep, **columns)
+        if not len(records):
+            raise ValueError("Не найдено записей в книге продаж")
 
-        layout.addWidget(QLabel("Сопоставьте колонки из файла с полями базы данных:"))
+        print(f"Книга продаж: найдено записей — {len(records)}")
+        return records
 
-        mapping_table = QTableWidget(len(df.columns), 2)
-        mapping_table.setHorizontalHeaderLabels(["Колонка в файле", "Поле в БД"])
+    def _iter_sales_book(self, book):
+        """Записи книги продаж по мере чтения строк листа, куски как в _iter_purchase_book"""
+        company, period_start, period_end, header_row_idx, num_to_idx, header_row, rows = \
+            self._read_book_layout(book, 'продавец', 'книге продаж')
 
-        combo_boxes = []
-        for i, col in enumerate(df.columns):
-            mapping_table.setItem(i, 0, QTableWidgetItem(str(col)))
-            combo = QComboBox()
-            combo.addItems(db_columns)
-            combo_boxes.append(combo)
-            mapping_table.setCellWidget(i, 1, combo)
+        print(f"Книга продаж: компания = {company}")
+        print(f"Период: {period_start} - {period_end}")
+        print(f"Книга продаж: строка с номерами на индексе {header_row_idx}")
+        print(f"Соответствие базовых номеров колонкам: {num_to_idx}")
 
-        layout.addWidget(mapping_table)
+        required_nums = [2, 3, 7, 8, 11, 13, 14, 17]
+        for num in required_nums:
+            if num not in num_to_idx:
+                raise ValueError(f"Не найден базовый номер колонки {num}")
 
-        btn_box = QDialogButtonBox(QDialogButtonBox.StandardButton.Ok | QDialogButtonBox.StandardButton.Cancel)
-        btn_box.accepted.connect(dialog.accept)
-        btn_box.rejected.connect(dialog.reject)
-        layout.addWidget(btn_box)
+        op_col = num_to_idx[2]
+        doc_col = num_to_idx[3]
+        buyer_col = num_to_idx[7]
+        inn_col = num_to_idx[8]
+        payment_col = num_to_idx[11]
+        amount_without_vat_col = num_to_idx[14]
+        vat_col = num_to_idx[17]
 
-        if dialog.exec() != QDialog.DialogCode.Accepted:
-            return False
+        base13_start = num_to_idx[13]
+        amount_with_vat_col = None
+        for offset in range(10):
+            if base13_start + offset >= len(header_row):
+                break
+            cell = header_row[base13_start + offset]
+            clean = re.sub(r'\s+', '', cell.lower())
+            if '13б' in clean:
+                amount_with_vat_col = base13_start + offset
+                break
+        if amount_with_vat_col is None:
+            raise ValueError("Не найдена колонка '13б' (сумма с НДС)")
 
-        mapping = {}
-        for i, combo in enumerate(combo_boxes):
-            target_col = combo.currentText()
-            if target_col:
-                mapping[df.columns[i]] = target_col
+        print(f"Индексы Excel: операция={op_col}, документ={doc_col}, покупатель={buyer_col}, ИНН={inn_col}, оплата={payment_col}, сумма без НДС={amount_without_vat_col}, НДС={vat_col}, сумма с НДС={amount_with_vat_col}")
 
-        if not mapping:
-            QMessageBox.warning(self, "Предупреждение", "Не выбрано ни одного сопоставления")
-            return False
+        current_buyer = None
+        i = header_row_idx
+        for chunk in self._row_chunks(rows):
+            grid = self._rows_grid(chunk)
+            invoices, buyers, current_buyer, stop = self._classify_book_rows(
+                grid, buyer_col, 'всего по покупателю', current_buyer)
+            invoice_rows = grid[invoices]
+            amount_with_vat = self.clean_number_array(self._grid_column(invoice_rows, amount_with_vat_col))
+            amount_without_vat = self.clean_number_array(self._grid_column(invoice_rows, amount_without_vat_col))
+            vat = self.clean_number_array(self._grid_column(invoice_rows, vat_col))
+            keep = (amount_with_vat != 0) | (amount_without_vat != 0) | (vat != 0)
+
+            doc_number, doc_date = self._split_documents(self._grid_column(invoice_rows, doc_col))
+            columns = {
+                'company': company,
+                'period_start': period_start,
+                'period_end': period_end,
+                'doc_type': 'sales_book',
+                'product_group': 'Продажи',
+                'seller': '',
+                'buyer': buyers,
+                'document_number': doc_number,
+                'document_date': doc_date,
+                'operation_code': self._grid_column(invoice_rows, op_col).tolist(),
+                'payment_document': self._grid_column(invoice_rows, payment_col).tolist(),
+                'sales_amount_with_vat': amount_with_vat,
+                'sales_amount_without_vat': amount_without_vat,
+                'vat_to_budget': vat,
+                'vat_deductible': 0.0,
+                'nomenclature': '',
+                'revenue': amount_without_vat,
+                'cost_price': 0.0,
+                'gross_profit': 0.0,
+                'sales_expenses': 0.0,
+                'other_income_expenses': 0.0,
+                'net_profit': 0.0,
+                'purchase_amount_with_vat': 0.0,
+                'acceptance_date': '',
+                'quantity': 1
+            }
+            yield len(invoice_rows), keep, columns
+            if stop is not None:
+                print(f"Достигнута финальная строка 'Всего' на строке {i + stop + 1}")
+                return
+            i += len(chunk)
 
-        df_import = df.rename(columns=mapping)
-        df_import = df_import[[col for col in mapping.values() if col in db_columns]]
+    # ========== ОБЩЕЕ ДЛЯ КНИГ ПОКУПОК И ПРОДАЖ ==========
+    BOOK_HEAD_ROWS = 20
+    ROWS_CHUNK = 10000
 
-        for col in db_columns:
-            if col not in df_import.columns:
-                df_import[col] = '' if 'date' in col or 'name' in col else 0
+    def _read_book_layout(self, book, company_keyword, book_name):
+        """
+        Шапка книги по потоку строк: компания (ячейка после company_keyword в первых 10 строках),
+        период из первых 20 строк и строка с номерами колонок.
+        Возвращает (company, period_start, period_end, header_row_idx, num_to_idx, header_row, rows),
+        rows - итератор строк после заголовка. Строки до заголовка в памяти не копятся
+        """
+        rows = book.iter_rows()
+        head = list(itertools.islice(rows, self.BOOK_HEAD_ROWS))
 
-        self.db.save_data(df_import)
-        return True
-    # ============================================================================
-    # ==================== ОБРАБОТКА ФАЙЛОВ ====================
-    def process_files(self, file_paths):
-        total = len(file_paths)
-        if total == 0:
-            return
+        company = "Неизвестная компания"
+        for row in head[:10]:
+            for j, cell in enumerate(row):
+                if company_keyword in cell.lower():
+                    for k in range(j+1, len(row)):
+                        if row[k].strip():
+                            company = row[k].strip()
+                            break
+                    if company != "Неизвестная компания":
+                        break
+            if company != "Неизвестная компания":
+                break
+
+        header_text = ' '.join(' '.join(row) for row in head).lower()
+        period_match = re.search(r'с\s+(\d{2}\.\d{2}\.\d{4})\s+по\s+(\d{2}\.\d{2}\.\d{4})', header_text, re.IGNORECASE)
+        if not period_match:
+            raise ValueError(f"Не найден период в {book_name}")
+        period_start = datetime.strptime(period_match.group(1), "%d.%m.%Y").strftime("%Y-%m-%d")
+        period_end = datetime.strptime(period_match.group(2), "%d.%m.%Y").strftime("%Y-%m-%d")
+
+        rows = itertools.chain(head, rows)
+        for header_row_idx, header_row in enumerate(rows):
+            num_to_idx = self._header_indices_loose(header_row, min_required=5)
+            if num_to_idx is not None:
+                return company, period_start, period_end, header_row_idx, num_to_idx, header_row, rows
 
-        progress = QProgressDialog("Загрузка файлов...", "Отмена", 0, total, self)
-        progress.setWindowModality(Qt.WindowModality.WindowModal)
+        # Строгой нумерации нет - лучшая строка по всему листу, для этого лист читается целиком
+        df = book.frame
+        header_row_idx, num_to_idx = self._find_header_row_fallback(df, min_count=8)
+        if header_row_idx is None:
+            for debug_i in range(min(20, len(df))):
+                print(f"Строка {debug_i}: {df.iloc[debug_i].tolist()}")
+            raise ValueError("Не найдена строка с номерами колонок")
+        header_row = df.iloc[header_row_idx].tolist()
+        rows = iter(df.iloc[header_row_idx + 1:].values.tolist())
+        return company, period_start, period_end, header_row_idx, num_to_idx, header_row, rows
 
+    # 'номер от дата': ячейку делит первое ' от ' с любыми пробелами и в любом регистре
+    DOCUMENT_SEPARATOR = re.compile(r'\s+от\s+', re.IGNORECASE)
+
+    def _split_documents(self, docs):
+        """
+        Колонка '123 от 01.02.2025' -> (номера, даты), как _split_document для каждой ячейки.
+        Ячейки ровно с одним ' от ' без лишних пробелов делятся np.char.partition,
+        остальные - регулярным выражением
+        """
+        if not len(docs):
+            return [], []
+        docs = np.array(docs, dtype=str)
+        head, separator, tail = np.moveaxis(np.char.partition(docs, ' от '), -1, 0)
+        simple = ((separator != '') & (np.char.count(np.char.lower(docs), 'от') == 1)
+                  & (np.char.rstrip(head) == head) & (np.char.lstrip(tail) == tail))
+        doc_number = np.char.strip(head).astype(object)
+        doc_date = np.char.strip(tail).astype(object)
+        for k in np.flatnonzero(~simple):
+            doc_number[k], doc_date[k] = self._split_document(str(docs[k]))
+        return doc_number.tolist(), doc_date.tolist()
+
+    def _split_document(self, doc_str):
+        """'123 от 01.02.2025' -> ('123', '01.02.2025')"""
+        doc_number = ''
+        doc_date = ''
+        if doc_str:
+            parts = self.DOCUMENT_SEPARATOR.split(doc_str, maxsplit=1)
+            if len(parts) == 2:
+                doc_number = parts[0].strip()
+                doc_date = parts[1].strip()
+            else:
+                doc_number = doc_str
+        return doc_number, doc_date
+
+    def _rows_grid(self, rows):
+        """Кусок строк разной длины -> двумерный массив object, короткие строки дополнены ''"""
+        width = max(map(len, rows), default=0)
+        return np.array([row if len(row) == width else list(row) + [''] * (width - len(row)) for row in rows],
+                        dtype=object).reshape(len(rows), width)
+
+    def _grid_column(self, grid, col):
+        """Колонка col массива строк; за правым краем - пустые строки"""
+        if col < grid.shape[1]:
+            return grid[:, col]
+        return np.full(len(grid), '', dtype=object)
+
+    def _classify_book_rows(self, grid, party_col, subtotal_marker, current_party):
+        """
+        Разбор куска строк книги (массив _rows_grid) масками по первой колонке:
+        пустые строки пропускаются, subtotal_marker ('всего по продавцу') сбрасывает контрагента,
+        'всего' завершает книгу, строка с числом в первой ячейке - счет-фактура,
+        прочая строка с текстом - заголовок контрагента.
+        Контрагент протягивается вперед от заголовков и от колонки party_col самих счетов-фактур.
+        Возвращает (позиции счетов-фактур, их контрагенты, контрагент на конец куска,
+        позиция строки 'всего' или None)
+        """
+        first_raw = np.char.strip(self._grid_column(grid, 0).astype(str))
+        first = np.char.lower(first_raw)
+        party = np.char.strip(self._grid_column(grid, party_col).astype(str))
+
+        filled = first != ''
+        subtotal = filled & (np.char.find(first, subtotal_marker) >= 0)
+        total = filled & ~subtotal & (first == 'всего')
+        numbered = np.char.isdigit(np.char.replace(np.char.replace(first, '.', '', count=1), ',', ''))
+        invoice = filled & ~subtotal & ~total & numbered
+        heading = filled & ~subtotal & ~total & ~invoice & ~np.char.isdigit(first.astype('<U1'))
+
+        stop = None
+        if total.any():
+            stop = int(np.argmax(total))
+            subtotal[stop:] = invoice[stop:] = heading[stop:] = False
+
+        # Новое значение контрагента в строке: '' - сброс, иначе имя; протягиваем последнее
+        named_invoice = invoice & (party != '')
+        events = subtotal | heading | named_invoice
+        values = np.where(heading, first_raw.astype(object), np.where(named_invoice, party.astype(object), ''))
+        last_event = np.maximum.accumulate(np.where(events, np.arange(len(grid)), -1))
+        state = np.where(last_event >= 0, values[last_event], current_party or '')
+
+        # Счет-фактура без контрагента пропускается
+        positions = np.flatnonzero(invoice & (state != ''))
+        if stop is not None:
+            end_party = state[stop]
+        else:
+            end_party = state[-1] if len(grid) else current_party
+        return positions.tolist(), state[positions].tolist(), end_party or None, stop
+
+    def _row_chunks(self, rows):
+        """Строки потока списками по ROWS_CHUNK штук"""
+        while True:
+            chunk = list(itertools.islice(rows, self.ROWS_CHUNK))
+            if not chunk:
+                return
+            yield chunk
+
+# Связь процесса параллельного импорта с ImportWorker: событие отмены и очередь хода разбора
+# (номер файла, прочитано строк). Передаются при запуске процесса (init_import_process)
+_import_cancel = None
+_import_progress = None
+
+
+def init_import_process(cancel, progress):
+    """initializer пула процессов ImportWorker._run_parallel"""
+    global _import_cancel, _import_progress
+    _import_cancel, _import_progress = cancel, progress
+
+
+def parse_file_in_worker(file_path, index=None):
+    """
+    Задача процесса параллельного импорта: только разбор файла, запись в БД - в главном процессе.
+    Ход чтения и проверка отмены - те же, что при последовательном импорте (ReportParser._on_rows)
+    """
+    if _import_progress is None:
+        return ReportParser().parse_file(file_path)
+    parser = ReportParser(progress_callback=lambda count: _import_progress.put((index, count)),
+                          cancel_requested=_import_cancel.is_set)
+    return parser.parse_file(file_path)
+
+
+def generate_osv41_sheet(sku_count):
+    """
+    Лист ОСВ 41 из sku_count номенклатур в виде DataFrame строк, как его дает LoadedWorkbook:
+    у номенклатуры 0-3 оборота, часть сумм нулевые, склады и пустые строки между блоками
+    """
+    rng = np.random.default_rng(41)
+    rows = [["ООО Замер"], ["Оборотно-сальдовая ведомость по счету 41 за 2025 г."],
+            ["Счет", "", "", "Сальдо на начало", "", "Обороты за период"],
+            ["", "", "", "Дебет", "Кредит", "Дебет", "Кредит", "Дебет"],
+            ["41", "", "", "100", "", "500", "400", "200"], ["Кол."],
+            ["41.01", "", "", "100", "", "500", "400", "200"], ["Кол."]]
+    turnovers = rng.integers(0, 4, sku_count)
+    amounts = np.round(rng.uniform(0, 5000, (sku_count, 3, 2)), 2)
+    amounts[rng.random((sku_count, 3, 2)) < 0.3] = 0
+    for k in range(sku_count):
+        rows.append([f"{k:06d} Товар номер {k}", f"ART-{k}"])
+        rows.append(["Кол."])
+        for m in range(turnovers[k]):
+            rows.append([f"Обороты за {m + 10}.0{m + 1}.2025"])
+            debit, credit = amounts[k, m]
+            rows.append(["Кол.", "", "", "", "", f"{debit:,.2f}".replace(",", " ").replace(".", ","), str(credit)])
+        if k % 50 == 0:
+            rows.append(["Основной склад"])
+            rows.append(["Кол."])
+        if k % 97 == 0:
+            rows.append([])
+    rows.append(["Итого", "", "", "1 000,00", "", "2 000,00", "3 000,00", "4 000,00"])
+    return pd.DataFrame([row + [''] * (8 - len(row)) for row in rows], columns=range(8), dtype=object)
+
+
+def benchmark_osv41(sku_count=100000):
+    """
+    Замер разбора ОСВ 41 на сгенерированном листе из sku_count номенклатур:
+    python buh_tuund.py --bench-osv41 [N]. Лист собирается в памяти, чтение Excel не замеряется
+    """
+    frame = generate_osv41_sheet(sku_count)
+    parser = ReportParser()
+    started = time.perf_counter()
+    records = parser._parse_osv_41_detailed(LoadedWorkbook.from_frame(frame, f"ОСВ 41 ({sku_count} номенклатур)"))
+    duration = time.perf_counter() - started
+    print(f"Замер ОСВ 41: номенклатур {sku_count}, строк {len(frame)}, записей {len(records)}, "
+          f"{duration:.2f} с ({len(frame) / duration:.0f} строк/с)")
+    return duration
+
+
+# ==================== ФОНОВЫЙ ИМПОРТ ====================
+class ImportWorker(QThread):
+    """
+    Импорт списка файлов в отдельном потоке: окно не блокируется на разборе и записи.
+    У потока свое соединение с БД; каждый файл записывается своей транзакцией,
+    поэтому при отмене уже загруженные файлы остаются в базе.
+    Отмена проверяется между файлами и внутри разбора, при чтении строк листа, -
+    и в процессах параллельного разбора тоже.
+    Итог batch_finished - словарь: success (загружено файлов), skipped, errors, cancelled,
+    batch_ids (пакеты import_history с новыми строками), rows (записано строк всего),
+    replaced (удалено строк прошлых импортов тех же файлов)
+    """
+
+    file_started = pyqtSignal(int, str)           # номер файла в списке, имя
+    rows_read = pyqtSignal(int)                   # прочитано строк текущего файла
+    file_finished = pyqtSignal(int, str, int)     # номер, имя, записано строк
+    batch_finished = pyqtSignal(dict)             # итог загрузки
+
+    def __init__(self, db_path, file_paths, workers=1, parent=None):
+        super().__init__(parent)
+        self.db_path = db_path
+        self.file_paths = list(file_paths)
+        self.workers = workers
+        self._cancelled = False
+        self._batch_ids = []
+        self._rows = 0
+        self._replaced = 0
+
+    def cancel(self):
+        self._cancelled = True
+
+    def is_cancelled(self):
+        return self._cancelled
+
+    def run(self):
         success_count = 0
+        skipped_files = []
         error_files = []
+        db = None
+        try:
+            db = DatabaseManager(self.db_path)
+            if self.workers > 1 and len(self.file_paths) > 1:
+                success_count = self._run_parallel(db, skipped_files, error_files)
+            else:
+                success_count = self._run_sequential(db, skipped_files, error_files)
+        except Exception as e:
+            error_files.append(f"{os.path.basename(self.db_path)}: {str(e)}")
+        finally:
+            if db is not None:
+                db.conn.close()
+            self.batch_finished.emit({
+                'success': success_count,
+                'skipped': skipped_files,
+                'errors': error_files,
+                'cancelled': self._cancelled,
+                'batch_ids': self._batch_ids,
+                'rows': self._rows,
+                'replaced': self._replaced,
+            })
 
-        for i, file_path in enumerate(file_paths):
-            if progress.wasCanceled():
+    def _save(self, db, df, file_path, fingerprint):
+        """Запись разобранного файла; пакет и счетчики строк запоминаются для итога"""
+        saved = db.save_data(df, filename=file_path, fingerprint=fingerprint)
+        stats = db.last_import_stats
+        self._replaced += stats['replaced']
+        if saved > 0:
+            self._batch_ids.append(stats['batch_id'])
+            self._rows += saved
+        return saved
+
+    def _check_unchanged(self, db, file_path, skipped_files):
+        """Отпечаток файла для записи; None, если файл не менялся с прошлого импорта"""
+        unchanged, fingerprint = db.check_file_fingerprint(file_path)
+        if unchanged:
+            print(f"Файл не изменился с прошлого импорта: {os.path.basename(file_path)}")
+            skipped_files.append(os.path.basename(file_path))
+            return None
+        return fingerprint
+
+    def _run_sequential(self, db, skipped_files, error_files):
+        parser = ReportParser(progress_callback=self.rows_read.emit, cancel_requested=self.is_cancelled)
+        success_count = 0
+        for i, file_path in enumerate(self.file_paths):
+            if self._cancelled:
+                break
+            name = os.path.basename(file_path)
+            self.file_started.emit(i, name)
+            saved = 0
+            try:
+                fingerprint = self._check_unchanged(db, file_path, skipped_files)
+                if fingerprint is not None:
+                    df = parser.parse_file(file_path)
+                    if df is not None:
+                        saved = self._save(db, df, file_path, fingerprint)
+                    if saved > 0:
+                        success_count += 1
+            except ImportCancelled:
                 break
-            progress.setValue(i)
-            progress.setLabelText(f"Обработка: {os.path.basename(file_path)}")
+            except Exception as e:
+                error_files.append(f"{name}: {str(e)}")
+            self.file_finished.emit(i, name, saved)
+        return success_count
 
+    def _run_parallel(self, db, skipped_files, error_files):
+        """
+        Разбор файлов в пуле процессов (workers). Запись в БД идет в этом потоке
+        в порядке списка файлов, поэтому результат не зависит от того, какой процесс
+        закончит раньше. Возвращает количество загруженных файлов
+        """
+        jobs = []
+        for i, file_path in enumerate(self.file_paths):
             try:
-                saved = self._import_excel_file(file_path)
-                if saved > 0:
-                    success_count += 1
+                fingerprint = self._check_unchanged(db, file_path, skipped_files)
             except Exception as e:
                 error_files.append(f"{os.path.basename(file_path)}: {str(e)}")
+                fingerprint = None
+            if fingerprint is None:
+                self.file_finished.emit(i, os.path.basename(file_path), 0)
+                continue
+            jobs.append((i, file_path, fingerprint))
+        if not jobs:
+            return 0
 
-        progress.setValue(total)
-
-        if success_count > 0:
-            self.current_df = self.db.get_all_data()
-            if 'account' in self.current_df.columns:
-                self.current_df['account'] = self.current_df['account'].fillna('')
-            self.display_data(self.current_df)
-            self.update_summary()
-            self.update_charts()
-            self.update_filter_combos()
-            print(f"Загружено записей из БД: {len(self.current_df)}")
+        success_count = 0
+        # spawn: дочерние процессы не наследуют состояние Qt главного окна
+        context = multiprocessing.get_context('spawn')
+        cancel, progress = context.Event(), context.Queue()
+        rows_read = {}  # номер файла -> прочитано строк по последнему сообщению процесса
+        executor = ProcessPoolExecutor(max_workers=min(self.workers, len(jobs)), mp_context=context,
+                                       initializer=init_import_process, initargs=(cancel, progress))
+        try:
+            futures = [executor.submit(parse_file_in_worker, file_path, i) for i, file_path, _ in jobs]
+            for (i, file_path, fingerprint), future in zip(jobs, futures):
+                name = os.path.basename(file_path)
+                self.file_started.emit(i, name)
+                if i in rows_read:
+                    self.rows_read.emit(rows_read[i])
+                # Ждем очередной файл короткими интервалами: ход разбора этого файла
+                # передается в окно, ход остальных запоминается до их очереди
+                while not future.done() and not self._cancelled:
+                    wait([future], timeout=0.05)
+                    self._forward_rows(progress, rows_read, i)
+                if self._cancelled:
+                    break
 
-        msg = f"Успешно загружено: {success_count} из {total}"
-        if error_files:
-            msg += "\n\nОшибки:\n" + "\n".join(error_files[:5])
-            if len(error_files) > 5:
-                msg += f"\n... и ещё {len(error_files)-5} ошибок"
-        QMessageBox.information(self, "Результат загрузки", msg)
+                saved = 0
+                try:
+                    df = future.result()
+                    if df is not None:
+                        saved = self._save(db, df, file_path, fingerprint)
+                    if saved > 0:
+                        success_count += 1
+                except Exception as e:
+                    error_files.append(f"{name}: {str(e)}")
+                self.file_finished.emit(i, name, saved)
+        finally:
+            # При отмене ожидающие задачи снимаются, а запущенные прерываются на ближайшей
+            # проверке чтения строк (ImportCancelled в процессе); их результат не записывается
+            if self._cancelled:
+                cancel.set()
+            executor.shutdown(wait=True, cancel_futures=True)
+            self._forward_rows(progress, rows_read, None)
+
+        return success_count
+
+    def _forward_rows(self, progress, rows_read, current):
+        """Сообщения хода разбора из процессов: число строк файла current - в rows_read"""
+        while True:
+            try:
+                index, count = progress.get_nowait()
+            except Empty:
+                return
+            rows_read[index] = count
+            if index == current:
+                self.rows_read.emit(count)
+
+
+# ==================== НАБЛЮДЕНИЕ ЗА ПАПКОЙ ====================
+class FolderWatchScanner(QThread):
+    """
+    Проверка наблюдаемой папки в отдельном потоке: обход подпапок и os.stat каждого файла
+    (сетевой диск, тысячи файлов) не блокируют окно. Размер и дата файлов хранятся здесь
+    между проверками, в окно отдается только разница: файлы, готовые к загрузке,
+    и список наблюдаемых папок, когда он изменился
+    """
+
+    EXTENSIONS = ('.xlsx', '.xls')
+    # QFileSystemWatcher следит за корнем и подпапками первого уровня, не больше этого числа;
+    # изменения глубже находит опрос FolderWatcher.POLL_MS
+    MAX_WATCHED_DIRS = 64
+
+    scanned = pyqtSignal(str, list, bool)   # папка, готовые файлы, есть файлы в записи
+    dirs_changed = pyqtSignal(str, list)    # папка, папки для QFileSystemWatcher
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._queue = deque()
+        self._lock = threading.Lock()
+        self._running = False
+        self._stopped = False
+        # Состояние читается и меняется только в потоке проверки
+        self._folder = None
+        self._known = {}        # путь -> (размер, mtime) уже отданных файлов
+        self._pending = {}      # путь -> (размер, mtime) при прошлой проверке, запись могла не закончиться
+        self._dirs = []
+
+    def request(self, folder, forget=False):
+        """Ставит проверку папки в очередь; forget - забыть отданные файлы (смена БД)"""
+        with self._lock:
+            if self._stopped:
+                return
+            for i, (queued, queued_forget) in enumerate(self._queue):
+                if queued == folder:
+                    self._queue[i] = (folder, queued_forget or forget)
+                    return
+            self._queue.append((folder, forget))
+            if self._running:
+                return
+            self._running = True
+        # Предыдущий запуск мог только что выйти из run - дожидаемся его
+        self.wait()
+        self.start()
+
+    def stop(self):
+        """Сбрасывает очередь и дожидается текущей проверки"""
+        with self._lock:
+            self._stopped = True
+            self._queue.clear()
+        self.wait()
+
+    def run(self):
+        while True:
+            with self._lock:
+                if not self._queue or self._stopped:
+                    self._running = False
+                    return
+                folder, forget = self._queue.popleft()
+            self._scan(folder, forget)
+
+    def _walk(self, folder):
+        """Файлы Excel папки с (размер, mtime) и наблюдаемые папки: корень и первый уровень"""
+        files = {}
+        dirs = [folder]
+        for root, subdirs, names in os.walk(folder):
+            if self._stopped:
+                break
+            if root == folder:
+                dirs += sorted(os.path.join(root, name) for name in subdirs)[:self.MAX_WATCHED_DIRS - 1]
+            for name in names:
+                if name.startswith('~$') or not name.lower().endswith(self.EXTENSIONS):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                files[path] = (stat.st_size, stat.st_mtime)
+        return files, dirs
+
+    @staticmethod
+    def _write_finished(path):
+        """Файл не открыт в Excel (нет ~$ файла блокировки) и читается"""
+        folder, name = os.path.split(path)
+        if os.path.exists(os.path.join(folder, '~$' + name[2:])) or \
+                os.path.exists(os.path.join(folder, '~$' + name)):
+            return False
+        try:
+            with open(path, 'rb'):
+                return True
+        except OSError:
+            return False
 
-    # ===========================================================
-    #  Импорт эксель файла
-    def _import_excel_file(self, file_path):
-        print(f"Обработка файла: {os.path.basename(file_path)}")
+    def _scan(self, folder, forget):
+        if folder != self._folder or forget:
+            self._folder = folder
+            self._known.clear()
+            self._pending.clear()
+            self._dirs = []
+        if not os.path.isdir(folder):
+            print(f"Папка наблюдения недоступна: {folder}")
+            return
 
-        if os.path.basename(file_path).startswith('~$'):
-            print("Пропуск временного файла")
-            return 0
+        files, dirs = self._walk(folder)
+        if self._stopped:
+            return
+        if dirs != self._dirs:
+            self._dirs = dirs
+            self.dirs_changed.emit(folder, dirs)
 
-        if file_path.lower().endswith('.xls') and not file_path.lower().endswith('.xlsx'):
-            try:
-                import xlrd
-            except ImportError:
-                raise ImportError("Для чтения файлов .xls установите xlrd: pip install xlrd")
+        ready = []
+        for path, signature in files.items():
+            if self._known.get(path) == signature:
+                continue
+            if self._pending.get(path) == signature and self._write_finished(path):
+                del self._pending[path]
+                self._known[path] = signature
+                ready.append(path)
+            else:
+                self._pending[path] = signature
+
+        for path in [p for p in self._known if p not in files]:
+            del self._known[path]
+        for path in [p for p in self._pending if p not in files]:
+            del self._pending[path]
+
+        if ready or self._pending:
+            self.scanned.emit(folder, sorted(ready), bool(self._pending))
+
+
+class FolderWatcher(QObject):
+    """
+    Следит за папкой загрузки и сообщает о новых и измененных файлах Excel (files_ready).
+    Изменения в папках приходят от QFileSystemWatcher, перезапись файла на месте ловит
+    редкий опрос. Файл отдается, когда его размер и дата не меняются между двумя
+    проверками и его можно открыть (запись закончена); временные ~$ файлы пропускаются.
+    Сами проверки выполняет FolderWatchScanner в своем потоке.
+    Повторная загрузка неизмененного файла отсекается отпечатком в ImportWorker
+    """
+
+    DEBOUNCE_MS = 2000      # пауза после последнего события папки до проверки
+    STABLE_MS = 2000        # интервал повторной проверки файла, который еще пишется
+    POLL_MS = 30000         # опрос на случай пропущенных событий (сетевые папки, перезапись)
+
+    files_ready = pyqtSignal(list)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.folder = None
+        self._forget = False    # следующая проверка забывает отданные файлы
+        self._scanner = FolderWatchScanner(self)
+        self._scanner.scanned.connect(self._on_scanned)
+        self._scanner.dirs_changed.connect(self._on_dirs_changed)
+        self._watcher = QFileSystemWatcher(self)
+        self._watcher.directoryChanged.connect(self._schedule_scan)
+        self._scan_timer = QTimer(self)
+        self._scan_timer.setSingleShot(True)
+        self._scan_timer.timeout.connect(self.scan)
+        self._poll_timer = QTimer(self)
+        self._poll_timer.timeout.connect(self.scan)
+
+    def start(self, folder):
+        """Начинает наблюдение; файлы, уже лежащие в папке, тоже проверяются"""
+        self.stop()
+        self.folder = folder
+        self._forget = True
+        self._poll_timer.start(self.POLL_MS)
+        self.scan()
+
+    def stop(self):
+        self._scan_timer.stop()
+        self._poll_timer.stop()
+        dirs = self._watcher.directories()
+        if dirs:
+            self._watcher.removePaths(dirs)
+        self.folder = None
+
+    def shutdown(self):
+        """Останавливает наблюдение и поток проверки (закрытие программы)"""
+        self.stop()
+        self._scanner.stop()
+
+    def reset(self):
+        """Забывает отданные файлы - при смене БД папка проверяется заново"""
+        if self.folder is not None:
+            self._forget = True
+            self._schedule_scan()
+
+    def is_active(self):
+        return self.folder is not None
+
+    def _schedule_scan(self, path=None):
+        # Пачка событий (копирование нескольких файлов) дает одну проверку
+        self._scan_timer.start(self.DEBOUNCE_MS)
+
+    def scan(self):
+        if self.folder is None:
+            return
+        self._scanner.request(self.folder, self._forget)
+        self._forget = False
 
+    def _on_scanned(self, folder, ready, pending):
+        # Ответ на проверку папки, за которой уже не следим, не нужен
+        if folder != self.folder:
+            return
+        if pending:
+            self._scan_timer.start(self.STABLE_MS)
+        if ready:
+            print(f"Новые или измененные файлы в папке: {len(ready)}")
+            self.files_ready.emit(ready)
+
+    def _on_dirs_changed(self, folder, dirs):
+        if folder != self.folder:
+            return
+        watched = set(self._watcher.directories())
+        added = [d for d in dirs if d not in watched]
+        removed = list(watched - set(dirs))
+        if added:
+            self._watcher.addPaths(added)
+        if removed:
+            self._watcher.removePaths(removed)
+
+
+# ==================== СКАНИРОВАНИЕ ПАПОК ДЛЯ ДЕРЕВА ====================
+class FolderScanner(QThread):
+    """
+    Чтение содержимого папок дерева файлов в отдельном потоке: сетевой диск не блокирует окно.
+    Папки обрабатываются по очереди запросов (request). Для каждой сначала сверяется mtime
+    с закэшированным - если папка не менялась, список не читается.
+    Записи отдаются порциями по BATCH, чтобы дерево заполнялось по ходу чтения
+    """
+
+    BATCH = 500
+    EXTENSIONS = ('.xlsx', '.xls')
+
+    entries_found = pyqtSignal(str, list)           # папка, порция [имя, это папка]
+    folder_scanned = pyqtSignal(str, float, bool)   # папка, mtime, содержимое изменилось
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._queue = deque()
+        self._lock = threading.Lock()
+        self._running = False
+        self._stopped = False
+
+    def request(self, folder, cached_mtime=None):
+        """Ставит папку в очередь; cached_mtime - mtime закэшированного списка"""
+        with self._lock:
+            if self._stopped or any(queued == folder for queued, _ in self._queue):
+                return
+            self._queue.append((folder, cached_mtime))
+            if self._running:
+                return
+            self._running = True
+        # Предыдущий запуск мог только что выйти из run - дожидаемся его
+        self.wait()
+        self.start()
+
+    def stop(self):
+        """Сбрасывает очередь и дожидается текущей папки"""
+        with self._lock:
+            self._stopped = True
+            self._queue.clear()
+        self.wait()
+
+    def run(self):
+        while True:
+            with self._lock:
+                if not self._queue or self._stopped:
+                    self._running = False
+                    return
+                folder, cached_mtime = self._queue.popleft()
+            self._scan(folder, cached_mtime)
+
+    def _scan(self, folder, cached_mtime):
         try:
-            df_preview = pd.read_excel(file_path, nrows=30, header=None, dtype=str)
-        except Exception as e:
-            print(f"Ошибка чтения с dtype=str: {e}")
-            try:
-                df_preview = pd.read_excel(file_path, nrows=30, header=None)
-                df_preview = df_preview.astype(str)
-            except Exception as e2:
-                print(f"Не удалось прочитать файл {file_path}: {e2}")
-                raise ValueError(f"Не удалось прочитать файл: {e2}")
+            mtime = os.stat(folder).st_mtime
+            if mtime == cached_mtime:
+                self.folder_scanned.emit(folder, mtime, False)
+                return
+
+            batch = []
+            with os.scandir(folder) as entries:
+                for entry in entries:
+                    if self._stopped:
+                        break
+                    try:
+                        is_dir = entry.is_dir()
+                    except OSError:
+                        continue
+                    if not is_dir and (entry.name.startswith('~$') or
+                                       not entry.name.lower().endswith(self.EXTENSIONS)):
+                        continue
+                    batch.append([entry.name, is_dir])
+                    if len(batch) >= self.BATCH:
+                        self.entries_found.emit(folder, batch)
+                        batch = []
+            if batch:
+                self.entries_found.emit(folder, batch)
+            self.folder_scanned.emit(folder, mtime, not self._stopped)
+        except OSError as e:
+            print(f"Ошибка чтения папки {folder}: {e}")
+            self.folder_scanned.emit(folder, 0.0, False)
 
-        df_preview = df_preview.fillna('')
-        preview_text = ' '.join(df_preview.values.flatten()).lower()
-        preview_text = re.sub(r'\s+', ' ', preview_text)
 
-        print(f"preview_text (первые 200): {preview_text[:200]}")
+#&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&
+#
+# ==================== ГЛАВНОЕ ОКНО ====================
+#
+#&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&&
+class MainWindow(QMainWindow):
 
-        if 'книга покупок' in preview_text:
-            print("-> Распознана книга покупок")
-            df = self._parse_purchase_book(file_path)
-            return self.db.save_data(df)
+    # Процессов для параллельного разбора файлов; 1 - разбор по очереди в главном процессе
+    DEFAULT_IMPORT_WORKERS = max(1, (os.cpu_count() or 1) - 1)
 
-        if 'книга продаж' in preview_text:
-            print("-> Распознана книга продаж")
-            df = self._parse_sales_book(file_path)
-            return self.db.save_data(df)
+    # Роль данных элемента дерева: папка (True) или файл; путь хранится в UserRole
+    TREE_IS_DIR_ROLE = Qt.ItemDataRole.UserRole + 1
+    # Кэш списков папок дерева (в каталоге кэша пользователя)
+    FOLDER_CACHE_FILE = "folder_tree.json"
+    # Поля ячейки к ширине текста, пиксели
+    CELL_PADDING = 8
+    # Пауза в наборе строки поиска перед запросом, мс
+    SEARCH_DELAY_MS = 300
 
-        if 'оборотно-сальдовая ведомость по счету 19' in preview_text or 'анализ счета 19' in preview_text:
-            print("-> Распознан ОСВ 19 - ТЕСТ ПЕЧАТИ")
-            print(">>> ЭТО СООБЩЕНИЕ ДОЛЖНО ПОЯВИТЬСЯ <<<")
-            print(">>> ЕСЛИ ЕГО НЕТ - ЗНАЧИТ print НЕ РАБОТАЕТ <<<")
-            
-            # Принудительно сбрасываем буфер вывода
-            import sys
-            sys.stdout.flush()
-            
-            print("Пытаемся вызвать парсер...")
-            try:
-                df = self._parse_osv_19_detailed(file_path)
-                print("Парсер отработал")
-            except Exception as e:
-                print(f"ОШИБКА: {e}")
-                import traceback
-                traceback.print_exc()
-                df = pd.DataFrame()
-            
-            print(f"Парсер вернул DataFrame с {len(df)} записями")
-            if df.empty:
-                print("DataFrame пустой!")
-            return self.db.save_data(df)
-
-        if 'оборотно-сальдовая ведомость по счету 41' in preview_text:
-            print("-> Распознан ОСВ 41")
-            df = self._parse_osv_41_detailed(file_path)
-            return self.db.save_data(df)
-
-        if 'оборотно-сальдовая ведомость по счету 44' in preview_text:
-            print("-> Распознан ОСВ 44")
-            df = self._parse_osv_44_detailed(file_path)
-            return self.db.save_data(df)
-
-        if 'оборотно-сальдовая ведомость по счету 60' in preview_text:
-            print("-> Распознан ОСВ 60")
-            df = self._parse_osv_60_detailed(file_path)
-            return self.db.save_data(df)
-
-        if 'оборотно-сальдовая ведомость по счету 62' in preview_text:
-            print("-> Распознан ОСВ 62")
-            df = self._parse_osv_62_detailed(file_path)
-            return self.db.save_data(df)
-
-        if 'оборотно-сальдовая ведомость по счету 68' in preview_text:
-            print("-> Распознан ОСВ 68")
-            df = self._parse_osv_68_detailed(file_path)
-            return self.db.save_data(df)
-
-        if 'оборотно-сальдовая ведомость по счету 90' in preview_text:
-            print("-> Распознан ОСВ 90")
-            df = self._parse_osv_90_detailed(file_path)
-            return self.db.save_data(df)
-
-        if 'оборотно-сальдовая ведомость по счету 91' in preview_text:
-            print("-> Распознан ОСВ 91")
-            df = self._parse_osv_91_detailed(file_path)
-            return self.db.save_data(df)
-
-        if 'отчет по продажам' in preview_text:
-            print("-> Распознан отчет по продажам")
-            return self._parse_sales_report_detailed(file_path)
-
-        print("-> Не распознан тип, пробуем legacy импорт")
-        return self._import_legacy(file_path)
-    # ===================================================================================
-    # ==================== ПАРСЕРЫ ====================
-   
-    def _extract_company_by_keyword(self, df, keyword):
-        for i in range(min(15, len(df))):
-            row = df.iloc[i].tolist()
-            for j, cell in enumerate(row):
-                if keyword.lower() in cell.lower():
-                    for k in range(j+1, len(row)):
-                        if row[k].strip():
-                            return row[k].strip()
-                    break
-        return "Неизвестная компания"
+    def __init__(self):
+        super().__init__()
+        self.db = DatabaseManager()
+        self.import_worker = None
+        self.import_progress = None
+        # Автозагрузка: файлы из наблюдаемой папки ждут здесь окончания текущего импорта
+        self.folder_watcher = FolderWatcher(self)
+        self.folder_watcher.files_ready.connect(self._on_watch_files_ready)
+        self.watch_queue = []
+        # Дерево файлов заполняется лениво при раскрытии папок, списки папок читаются
+        # в фоне и кэшируются на диске между запусками
+        self.folder_scanner = FolderScanner(self)
+        self.folder_scanner.entries_found.connect(self._on_folder_entries)
+        self.folder_scanner.folder_scanned.connect(self._on_folder_scanned)
+        self.folder_cache = self._load_folder_cache()
+        self._folder_items = {}         # путь папки -> элемент дерева
+        self._loaded_folders = set()    # папки, содержимое которых запрошено
+        self._scanning_folders = set()  # папки, которые сейчас читаются
+        self._scan_buffers = {}         # прочитанные записи папки до конца чтения
+        self.current_df = None
+        self.current_filters = {}
+        # Что сейчас показано: итоги и исходные данные графиков.
+        # После импорта пересчитывается только то, что изменил новый пакет
+        self.summary_financials = None
+        self.chart_inputs = {}
+        self.chart_paths = {}
+        # Ширины колонок при экспорте в Excel, в символах; файл пишется целиком,
+        # поэтому длинные значения ищутся по всем строкам
+        self.export_widths = ColumnWidthEstimator(len, scan_rows=None)
+        self.settings = QSettings("DeerTuund", "BuhTuundOtchet")
+        
+        # Пути из настроек
+        self.load_folder = self.settings.value("load_folder", "")
+        self.save_folder = self.settings.value("save_folder", "")
+        self.db_load_folder = self.settings.value("db_load_folder", "")
+        self.db_save_folder = self.settings.value("db_save_folder", "")
+        self.import_workers = self.settings.value("import_workers", self.DEFAULT_IMPORT_WORKERS, type=int)
+        
+        self.init_ui()
+        self.load_last_database()
+        self.load_last_folder()         # загружаем последнюю папку
 
-    def _extract_base_number(self, cell):
-        import re
-        if not isinstance(cell, str):
-            cell = str(cell)
-        match = re.match(r'^(\d+)', cell.strip())
-        return int(match.group(1)) if match else None
+    # ==================== НАСТРОЙКИ ====================
+    def load_settings(self):
+        self.load_folder = self.settings.value("load_folder", "")
+        self.save_folder = self.settings.value("save_folder", "")
+        self.db_load_folder = self.settings.value("db_load_folder", "")
+        self.db_save_folder = self.settings.value("db_save_folder", "")
+        self.import_workers = self.settings.value("import_workers", self.DEFAULT_IMPORT_WORKERS, type=int)
 
-    def _find_header_row_loose(self, df, min_required=5):
-        for i in range(len(df)):
-            row = df.iloc[i].tolist()
-            expected = 1
-            indices = {}
-            for col_idx, cell in enumerate(row):
-                base = self._extract_base_number(cell)
-                if base is not None:
-                    if base == expected:
-                        indices[base] = col_idx
-                        expected += 1
-            if expected - 1 >= min_required:
-                for col_idx, cell in enumerate(row):
-                    base = self._extract_base_number(cell)
-                    if base is not None and base not in indices:
-                        indices[base] = col_idx
-                return i, indices
-        return None, None
+    def save_settings(self):
+        self.settings.setValue("load_folder", self.load_folder)
+        self.settings.setValue("save_folder", self.save_folder)
+        self.settings.setValue("db_load_folder", self.db_load_folder)
+        self.settings.setValue("db_save_folder", self.db_save_folder)
+        self.settings.setValue("import_workers", self.import_workers)
 
-    def _find_header_row_fallback(self, df, min_count=5):
-        best_row = None
-        best_indices = {}
-        max_count = 0
-        for i in range(len(df)):
-            row = df.iloc[i].tolist()
-            indices = {}
-            for col_idx, cell in enumerate(row):
-                base = self._extract_base_number(cell)
-                if base is not None and base not in indices:
-                    indices[base] = col_idx
-            if len(indices) >= min_count and len(indices) > max_count:
-                max_count = len(indices)
-                best_row = i
-                best_indices = indices
-        if best_row is not None:
-            return best_row, best_indices
-        return None, None
+    def show_settings(self):
+        dialog = QDialog(self)
+        dialog.setWindowTitle("Настройки")
+        dialog.setModal(True)
+        layout = QVBoxLayout(dialog)
 
-    def _clean_number(self, value):
-        if value is None:
-            return 0.0
-        if isinstance(value, (int, float)):
-            return float(value)
-        if isinstance(value, bytes):
-            try:
-                s = value.decode('utf-8')
-            except:
-                s = str(value)
-        else:
-            s = str(value)
-        s = s.strip().replace(' ', '').replace(',', '.').replace('−', '-').replace('—', '-')
-        import re
-        s = re.sub(r'[^\d.-]', '', s)
-        try:
-            return float(s) if s else 0.0
-        except:
-            return 0.0
+        # Папка загрузки данных
+        load_layout = QHBoxLayout()
+        load_layout.addWidget(QLabel("Папка загрузки данных:"))
+        self.load_folder_edit = QLineEdit(self.load_folder)
+        load_layout.addWidget(self.load_folder_edit)
+        load_btn = QPushButton("Обзор...")
+        load_btn.clicked.connect(lambda: self._choose_folder(self.load_folder_edit, "load_folder"))
+        load_layout.addWidget(load_btn)
+        layout.addLayout(load_layout)
 
-    def _month_name_to_number(self, month_name):
-        month_names = {
-            'янв': '01', 'фев': '02', 'мар': '03', 'апр': '04', 'май': '05', 'июн': '06',
-            'июл': '07', 'авг': '08', 'сен': '09', 'окт': '10', 'ноя': '11', 'дек': '12'
-        }
-        for key, num in month_names.items():
-            if key in month_name.lower():
-                return num
-        return '01'
-    
-    
-    #==========================================================================
-    # ========== ПАРСЕР ОСВ60 ==========
+        # Папка сохранения отчетов
+        save_layout = QHBoxLayout()
+        save_layout.addWidget(QLabel("Папка сохранения отчетов:"))
+        self.save_folder_edit = QLineEdit(self.save_folder)
+        save_layout.addWidget(self.save_folder_edit)
+        save_btn = QPushButton("Обзор...")
+        save_btn.clicked.connect(lambda: self._choose_folder(self.save_folder_edit, "save_folder"))
+        save_layout.addWidget(save_btn)
+        layout.addLayout(save_layout)
 
-    def _parse_osv_60_detailed(self, file_path):
-        """
-        Парсинг оборотно-сальдовой ведомости по счету 60 (Расчеты с поставщиками)
-        
-        Интерпретация данных:
-        - Дебетовое сальдо = авансы выданные (поставщики должны нам)
-        - Кредитовое сальдо = наш долг перед поставщиками
-        - Обороты по дебету = оплата поставщикам
-        - Обороты по кредиту = поступление товаров/услуг
-        """
-        import pandas as pd
-        import re
-        from datetime import datetime
+        # Папка загрузки БД
+        db_load_layout = QHBoxLayout()
+        db_load_layout.addWidget(QLabel("Папка загрузки БД:"))
+        self.db_load_folder_edit = QLineEdit(self.db_load_folder)
+        db_load_layout.addWidget(self.db_load_folder_edit)
+        db_load_btn = QPushButton("Обзор...")
+        db_load_btn.clicked.connect(lambda: self._choose_folder(self.db_load_folder_edit, "db_load_folder"))
+        db_load_layout.addWidget(db_load_btn)
+        layout.addLayout(db_load_layout)
 
-        print(f"Парсер ОСВ 60: начало обработки {file_path}")
-        df = pd.read_excel(file_path, header=None, dtype=str)
-        df = df.fillna('').astype(str).apply(lambda col: col.str.strip())
-        print(f"Прочитано строк: {len(df)}")
+        # Папка сохранения БД
+        db_save_layout = QHBoxLayout()
+        db_save_layout.addWidget(QLabel("Папка сохранения БД:"))
+        self.db_save_folder_edit = QLineEdit(self.db_save_folder)
+        db_save_layout.addWidget(self.db_save_folder_edit)
+        db_save_btn = QPushButton("Обзор...")
+        db_save_btn.clicked.connect(lambda: self._choose_folder(self.db_save_folder_edit, "db_save_folder"))
+        db_save_layout.addWidget(db_save_btn)
+        layout.addLayout(db_save_layout)
 
-        # --- 1. Компания ---
-        company = "Неизвестная компания"
-        if len(df) > 0 and df.iloc[0, 0] and df.iloc[0, 0] != 'nan':
-            company = df.iloc[0, 0].strip()
-        print(f"ОСВ 60: компания = {company}")
+        # Параллельный импорт
+        workers_layout = QHBoxLayout()
+        workers_layout.addWidget(QLabel("Процессов импорта (1 - без параллельного разбора):"))
+        self.import_workers_spin = QSpinBox()
+        self.import_workers_spin.setRange(1, max(1, os.cpu_count() or 1))
+        self.import_workers_spin.setValue(self.import_workers)
+        workers_layout.addWidget(self.import_workers_spin)
+        layout.addLayout(workers_layout)
 
-        # --- 2. Период ---
-        period_start = "2025-01-01"
-        period_end = "2025-12-31"
-        if len(df) > 1:
-            year_match = re.search(r'(\d{4})', df.iloc[1, 0])
-            if year_match:
-                year = year_match.group(1)
-                period_start = f"{year}-01-01"
-                period_end = f"{year}-12-31"
-                print(f"ОСВ 60: год {year}")
+        btn_box = QDialogButtonBox(QDialogButtonBox.StandardButton.Ok | QDialogButtonBox.StandardButton.Cancel)
+        btn_box.accepted.connect(lambda: self._save_settings_from_dialog(dialog))
+        btn_box.rejected.connect(dialog.reject)
+        layout.addWidget(btn_box)
 
-        # --- 3. Находим начало данных (после строки с заголовками) ---
-        data_start = None
-        for i in range(len(df)):
-            if df.iloc[i, 0].strip() == '60':
-                data_start = i
-                print(f"ОСВ 60: данные начинаются со строки {data_start}")
-                break
+        dialog.exec()
 
-        if data_start is None:
-            raise ValueError("Не найдена строка с '60' в ОСВ 60")
+    def _choose_folder(self, line_edit, setting_key):
+        folder = QFileDialog.getExistingDirectory(self, "Выберите папку")
+        if folder:
+            line_edit.setText(folder)
+            setattr(self, setting_key, folder)
 
-        records = []
-        current_account = None
-        total_begin_debit = 0
-        total_begin_credit = 0
-        total_debit_turnover = 0
-        total_credit_turnover = 0
-        total_end_debit = 0
-        total_end_credit = 0
+    def _save_settings_from_dialog(self, dialog):
+        self.load_folder = self.load_folder_edit.text()
+        self.save_folder = self.save_folder_edit.text()
+        self.db_load_folder = self.db_load_folder_edit.text()
+        self.db_save_folder = self.db_save_folder_edit.text()
+        self.import_workers = self.import_workers_spin.value()
+        self.save_settings()
+        dialog.accept()
+    #==================================================================================
+    # ==================== ЗАГРУЗКА ПОСЛЕДНЕЙ БД ====================
+    def load_last_database(self):
+        """Загружает последнюю использованную базу данных при старте"""
+        last_db = self.settings.value("last_database", "")
+        
+        # Если последняя БД не существует или была удалена
+        if not last_db or not os.path.exists(last_db):
+            # Создаем новую БД по умолчанию
+            self.db = DatabaseManager()
+            self._forget_column_widths()
+            self.current_df = None
+            self.current_filters = {}
+            self.show_reports()
+            self.update_summary()
+            self.update_charts()
+            self.update_filter_combos()
+            print("Создана новая база данных по умолчанию")
+            return
+        
+        try:
+            self.db.conn.close()
+            self.db = DatabaseManager(db_path=last_db)
+            self._forget_column_widths()
+            self.current_df = None
+            self.current_filters = {}
+            self.show_reports()
+            self.update_summary()
+            self.update_charts()
+            self.update_filter_combos()
+            print(f"Загружена последняя БД: {last_db}")
+        except Exception as e:
+            print(f"Не удалось загрузить последнюю БД: {e}")
+            # В случае ошибки создаем новую БД
+            self.db = DatabaseManager()
+            self._forget_column_widths()
+            self.current_df = None
+            self.current_filters = {}
+            self.show_reports()
+            self.update_summary()
+            self.update_charts()
+            self.update_filter_combos()
 
-        # --- 4. Сбор данных ---
-        for i in range(data_start, len(df)):
-            row = df.iloc[i].tolist()
-            first_cell = str(row[0]).strip().lower() if row[0] else ''
+    # ====================================================================================
+    # """Загружает последнюю использованную папку в дерево файлов"""
+    def load_last_folder(self):
+        """Загружает последнюю использованную папку в дерево файлов"""
+        last_folder = self.settings.value("last_folder", "")
+        if last_folder and os.path.exists(last_folder):
+            self.load_folder_tree(last_folder)
 
-            if 'итого' in first_cell:
-                print(f"ОСВ 60: итог на строке {i}")
-                # Получаем итоговые значения из строки "Итого"
-                total_begin_debit = self._clean_number(row[1] if len(row) > 1 else 0)
-                total_begin_credit = self._clean_number(row[2] if len(row) > 2 else 0)
-                total_debit_turnover = self._clean_number(row[3] if len(row) > 3 else 0)
-                total_credit_turnover = self._clean_number(row[4] if len(row) > 4 else 0)
-                total_end_debit = self._clean_number(row[5] if len(row) > 5 else 0)
-                total_end_credit = self._clean_number(row[6] if len(row) > 6 else 0)
-                
-                # Добавляем итоговую запись
-                records.append({
-                    'company': company,
-                    'period_start': period_start,
-                    'period_end': period_end,
-                    'account': '60',
-                    'product_group': 'ОСВ 60',
-                    'doc_type': 'osv_60_summary',
-                    'nomenclature': '',
-                    'seller': 'ИТОГО по счету 60',
-                    'buyer': '',
-                    'document_number': '',
-                    'document_date': '',
-                    'operation_code': '',
-                    'acceptance_date': '',
-                    'payment_document': '',
-                    'revenue': 0.0,
-                    'cost_price': 0.0,
-                    'gross_profit': 0.0,
-                    'sales_expenses': 0.0,
-                    'other_income_expenses': 0.0,
-                    'net_profit': 0.0,
-                    'vat_deductible': 0.0,
-                    'vat_to_budget': 0.0,
-                    'purchase_amount_with_vat': total_credit_turnover,  # Поступление товаров/услуг
-                    'sales_amount_with_vat': 0.0,
-                    'sales_amount_without_vat': 0.0,
-                    'quantity': 0,
-                    'osv_begin_balance_debit': total_begin_debit,
-                    'osv_begin_balance_credit': total_begin_credit,
-                    'osv_turnover_debit': total_debit_turnover,    # Оплата поставщикам
-                    'osv_turnover_credit': total_credit_turnover,  # Поступление товаров/услуг
-                    'osv_end_balance_debit': total_end_debit,
-                    'osv_end_balance_credit': total_end_credit,
-                    'import_date': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                })
-                break
+    # ==========================================================================================
+    # ==================== """Сохраняет настройки при закрытии программы""" ====================
+    def closeEvent(self, event):
+        """Сохраняет настройки и удаляет временные файлы при закрытии программы"""
 
-            # Если это строка счета 60 (итоги по счету)
-            if first_cell.replace('.', '').isdigit() and first_cell == '60':
-                current_account = '60'
-                begin_debit = self._clean_number(row[1] if len(row) > 1 else 0)
-                begin_credit = self._clean_number(row[2] if len(row) > 2 else 0)
-                debit_turnover = self._clean_number(row[3] if len(row) > 3 else 0)
-                credit_turnover = self._clean_number(row[4] if len(row) > 4 else 0)
-                end_debit = self._clean_number(row[5] if len(row) > 5 else 0)
-                end_credit = self._clean_number(row[6] if len(row) > 6 else 0)
-                
-                records.append({
-                    'company': company,
-                    'period_start': period_start,
-                    'period_end': period_end,
-                    'account': '60',
-                    'product_group': 'ОСВ 60',
-                    'doc_type': 'osv_60',
-                    'nomenclature': 'Счет 60 (общие итоги)',
-                    'seller': '',
-                    'buyer': '',
-                    'document_number': '',
-                    'document_date': '',
-                    'operation_code': '',
-                    'acceptance_date': '',
-                    'payment_document': '',
-                    'revenue': 0.0,
-                    'cost_price': 0.0,
-                    'gross_profit': 0.0,
-                    'sales_expenses': 0.0,
-                    'other_income_expenses': 0.0,
-                    'net_profit': 0.0,
-                    'vat_deductible': 0.0,
-                    'vat_to_budget': 0.0,
-                    'purchase_amount_with_vat': credit_turnover,
-                    'sales_amount_with_vat': 0.0,
-                    'sales_amount_without_vat': 0.0,
-                    'quantity': 0,
-                    'osv_begin_balance_debit': begin_debit,
-                    'osv_begin_balance_credit': begin_credit,
-                    'osv_turnover_debit': debit_turnover,
-                    'osv_turnover_credit': credit_turnover,
-                    'osv_end_balance_debit': end_debit,
-                    'osv_end_balance_credit': end_credit,
-                    'import_date': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                })
-                continue
+        # Фоновый импорт останавливаем; уже загруженные файлы записаны в БД
+        self.folder_watcher.shutdown()
+        self.folder_scanner.stop()
+        self._save_folder_cache()
+        if self.import_worker is not None and self.import_worker.isRunning():
+            self.import_worker.batch_finished.disconnect()
+            self.import_worker.cancel()
+            self.import_worker.wait()
+        
+        # Сохраняем путь к текущей базе данных
+        cursor = self.db.conn.execute("PRAGMA database_list")
+        row = cursor.fetchone()
+        if row and row[2]:
+            self.settings.setValue("last_database", row[2])
+        
+        # Сохраняем последнюю открытую папку
+        root = self.tree_widget.topLevelItem(0)
+        if root:
+            folder_path = root.data(0, Qt.ItemDataRole.UserRole)
+            if folder_path and os.path.isdir(folder_path):
+                self.settings.setValue("last_folder", folder_path)
+        
+        # ===== УДАЛЯЕМ ВСЕ ВРЕМЕННЫЕ ФАЙЛЫ ГРАФИКОВ =====
+        try:
+            import glob
+            # Находим все файлы temp_chart_*.png
+            for temp_file in glob.glob("temp_chart_*.png"):
+                try:
+                    if os.path.exists(temp_file):
+                        os.remove(temp_file)
+                        print(f"Удален временный файл: {temp_file}")
+                except:
+                    pass
+        except Exception as e:
+            print(f"Ошибка при удалении временных файлов: {e}")
+        
+        event.accept()
+
+    # ==================== ИНИЦИАЛИЗАЦИЯ ИНТЕРФЕЙСА ====================
+    def init_ui(self):
+        self.setWindowTitle("BuhTuundOtchet")
+        self.setGeometry(100, 100, 1400, 800)
+        self.setStyleSheet("""
+            QMainWindow {
+                background-color: #f5f5f5;
+            }
+            QMenuBar {
+                background-color: #2c3e50;
+                color: white;
+                font-weight: bold;
+            }
+            QMenuBar::item {
+                background-color: #2c3e50;
+                color: white;
+                padding: 5px 10px;
+            }
+            QMenuBar::item:selected {
+                background-color: #3498db;
+            }
+            QMenu {
+                background-color: #ecf0f1;
+                border: 1px solid #bdc3c7;
+            }
+            QMenu::item:selected {
+                background-color: #3498db;
+                color: white;
+            }
+            QToolBar {
+                background-color: #34495e;
+                spacing: 5px;
+                padding: 5px;
+            }
+            QToolButton {
+                background-color: #3498db;
+                color: white;
+                border: none;
+                border-radius: 4px;
+                padding: 8px 12px;
+                font-weight: bold;
+            }
+            QToolButton:hover {
+                background-color: #2980b9;
+            }
+            QTableView {
+                background-color: white;
+                alternate-background-color: #f8f9fa;
+                selection-background-color: #3498db;
+                gridline-color: #dee2e6;
+                font-size: 11pt;
+            }
+            QHeaderView::section {
+                background-color: #34495e;
+                color: white;
+                padding: 8px;
+                border: none;
+                font-weight: bold;
+            }
+            QComboBox, QLineEdit {
+                padding: 6px;
+                border: 1px solid #bdc3c7;
+                border-radius: 4px;
+                background-color: white;
+            }
+            QLabel {
+                font-weight: bold;
+                color: #2c3e50;
+            }
+        """)
 
-            # Если это контрагент
-            if first_cell and not first_cell[0].isdigit() and 'итого' not in first_cell:
-                counterparty = row[0].strip()
-                debit_turnover = self._clean_number(row[3] if len(row) > 3 else 0)
-                credit_turnover = self._clean_number(row[4] if len(row) > 4 else 0)
-                end_debit = self._clean_number(row[5] if len(row) > 5 else 0)
-                end_credit = self._clean_number(row[6] if len(row) > 6 else 0)
-                
-                if debit_turnover != 0 or credit_turnover != 0 or end_debit != 0 or end_credit != 0:
-                    records.append({
-                        'company': company,
-                        'period_start': period_start,
-                        'period_end': period_end,
-                        'account': '60',
-                        'product_group': 'ОСВ 60',
-                        'doc_type': 'osv_60',
-                        'nomenclature': '',
-                        'seller': counterparty,  # Поставщик
-                        'buyer': '',
-                        'document_number': '',
-                        'document_date': '',
-                        'operation_code': '',
-                        'acceptance_date': '',
-                        'payment_document': '',
-                        'revenue': 0.0,
-                        'cost_price': 0.0,
-                        'gross_profit': 0.0,
-                        'sales_expenses': 0.0,
-                        'other_income_expenses': 0.0,
-                        'net_profit': 0.0,
-                        'vat_deductible': 0.0,
-                        'vat_to_budget': 0.0,
-                        'purchase_amount_with_vat': credit_turnover,
-                        'sales_amount_with_vat': 0.0,
-                        'sales_amount_without_vat': 0.0,
-                        'quantity': 0,
-                        'osv_begin_balance_debit': 0,
-                        'osv_begin_balance_credit': 0,
-                        'osv_turnover_debit': debit_turnover,
-                        'osv_turnover_credit': credit_turnover,
-                        'osv_end_balance_debit': end_debit,
-                        'osv_end_balance_credit': end_credit,
-                        'import_date': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                    })
-
-        if not records:
-            raise ValueError("Не найдено записей в ОСВ 60")
+        self.create_menus()
 
-        print(f"ОСВ 60: найдено записей — {len(records)}")
-        return pd.DataFrame(records)
+        # Центральный виджет - ОБЯЗАТЕЛЬНО!!!
+        central_widget = QWidget()
+        self.setCentralWidget(central_widget)
+        main_layout = QVBoxLayout(central_widget)
 
+        # Панель фильтров
+        filter_layout = QHBoxLayout()
+        
+        self.company_combo = QComboBox()
+        self.company_combo.addItems(["Все компании"])
+        
+        self.period_combo = QComboBox()
+        self.period_combo.addItems(["Все периоды"])
+        
+        self.group_combo = QComboBox()
+        self.group_combo.addItems(["Все группы"])
+        
+        filter_layout.addWidget(QLabel("Компания:"))
+        filter_layout.addWidget(self.company_combo)
+        filter_layout.addWidget(QLabel("Период:"))
+        filter_layout.addWidget(self.period_combo)
+        filter_layout.addWidget(QLabel("Товарная группа:"))
+        filter_layout.addWidget(self.group_combo)
 
-    #==========================================================================
-    # ========== ПАРСЕР ОСВ44 ==========
-    
-    def _parse_osv_44_detailed(self, file_path):
-        """
-        Парсинг оборотно-сальдовой ведомости по счету 44 (Расходы на продажу)
-        """
-        import pandas as pd
-        import re
-        from datetime import datetime
+        # Поиск по мере ввода (индекс reports_fts); применяется после паузы в наборе
+        self.search_edit = QLineEdit()
+        self.search_edit.setPlaceholderText("Продавец, покупатель, номенклатура, артикул, № сч/ф")
+        self.search_edit.setClearButtonEnabled(True)
+        self.search_edit.setMinimumWidth(260)
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(self.SEARCH_DELAY_MS)
+        self.search_timer.timeout.connect(self.apply_search)
+        self.search_edit.textChanged.connect(self.search_timer.start)
+        self.search_edit.returnPressed.connect(self.apply_search)
+        filter_layout.addWidget(QLabel("Поиск:"))
+        filter_layout.addWidget(self.search_edit)
+        
+        self.apply_filter_btn = QPushButton("Применить фильтр")
+        self.apply_filter_btn.clicked.connect(self.apply_filters)
+        self.apply_filter_btn.setStyleSheet("""
+            QPushButton {
+                background-color: #27ae60;
+                color: white;
+                font-weight: bold;
+                padding: 8px 16px;
+                border-radius: 4px;
+            }
+            QPushButton:hover {
+                background-color: #219653;
+            }
+        """)
+        filter_layout.addWidget(self.apply_filter_btn)
+        
+        # ДОБАВЛЯЕМ ФИЛЬТРЫ В MAIN_LAYOUT
+        main_layout.addLayout(filter_layout)
 
-        print(f"Парсер ОСВ 44: начало обработки {file_path}")
-        df = pd.read_excel(file_path, header=None, dtype=str)
-        df = df.fillna('').astype(str).apply(lambda col: col.str.strip())
-        print(f"Прочитано строк: {len(df)}")
+        # СОЗДАЁМ СПЛИТТЕР - ОН БУДЕТ РАЗДЕЛЯТЬ ЛЕВУЮ И ПРАВУЮ ПАНЕЛИ
+        self.splitter = QSplitter(Qt.Orientation.Horizontal)
 
-        # --- 1. Компания ---
-        company = "Неизвестная компания"
-        if len(df) > 0 and df.iloc[0, 0] and df.iloc[0, 0] != 'nan':
-            company = df.iloc[0, 0].strip()
-        print(f"ОСВ 44: компания = {company}")
+        # Левая панель с деревом
+        self.left_panel = QWidget()
+        left_layout = QVBoxLayout(self.left_panel)
+        left_layout.setContentsMargins(2, 2, 2, 2)
 
-        # --- 2. Период ---
-        period_start = "2025-01-01"
-        period_end = "2025-12-31"
-        if len(df) > 1:
-            year_match = re.search(r'(\d{4})', df.iloc[1, 0])
-            if year_match:
-                year = year_match.group(1)
-                period_start = f"{year}-01-01"
-                period_end = f"{year}-12-31"
-                print(f"ОСВ 44: год {year}")
+        self.select_root_btn = QPushButton("Выбрать папку...")
+        self.select_root_btn.clicked.connect(self.choose_root_folder)
+        left_layout.addWidget(self.select_root_btn)
 
-        # --- 3. Находим начало данных (после строки "Период") ---
-        data_start = None
-        for i in range(len(df)):
-            if 'период' in df.iloc[i, 0].lower():
-                data_start = i + 1
-                print(f"ОСВ 44: данные начинаются со строки {data_start}")
-                break
+        self.watch_folder_check = QCheckBox("Следить за папкой (автозагрузка)")
+        self.watch_folder_check.setToolTip("Новые и измененные файлы папки загружаются в БД автоматически")
+        self.watch_folder_check.setChecked(self.settings.value("watch_folder", False, type=bool))
+        self.watch_folder_check.toggled.connect(self._toggle_folder_watch)
+        left_layout.addWidget(self.watch_folder_check)
 
-        if data_start is None:
-            raise ValueError("Не найдена строка с 'Период' в ОСВ 44")
+        self.tree_widget = QTreeWidget()
+        self.tree_widget.setHeaderHidden(True)
+        self.tree_widget.setSelectionMode(QAbstractItemView.SelectionMode.NoSelection)
+        left_layout.addWidget(self.tree_widget)
 
-        records = []
+        self.tree_widget.itemChanged.connect(self._handle_item_changed)
+        self.tree_widget.itemChanged.connect(self._update_process_button_state)
+        self.tree_widget.itemExpanded.connect(self._load_folder_item)
 
-        # --- 4. Собираем все строки до "Итого" ---
-        for i in range(data_start, len(df)):
-            row = df.iloc[i].tolist()
-            first_cell = str(row[0]).strip().lower() if row[0] else ''
+        self.splitter.addWidget(self.left_panel)
 
-            if 'итого' in first_cell:
-                print(f"ОСВ 44: итог на строке {i}")
-                # Получаем итоговые значения
-                total_debit_turnover = self._clean_number(row[3] if len(row) > 3 else 0)  # Дебет (обороты)
-                total_credit_turnover = self._clean_number(row[4] if len(row) > 4 else 0) # Кредит (обороты)
-                
-                # Добавляем итоговую запись - ТОЛЬКО В НУЖНЫЕ ПОЛЯ!
-                records.append({
-                    'company': company,
-                    'period_start': period_start,
-                    'period_end': period_end,
-                    'account': '44',  # ← ТОЛЬКО номер счета
-                    'product_group': 'ОСВ 44',
-                    'doc_type': 'osv_44_summary',
-                    'nomenclature': '',  # ← ПУСТО!
-                    'article': '',
-                    'seller': '',
-                    'buyer': '',
-                    'document_number': '',
-                    'document_date': '',
-                    'operation_code': '',
-                    'acceptance_date': '',
-                    'payment_document': '',  # ← ПУСТО!
-                    'revenue': 0.0,
-                    'cost_price': total_debit_turnover,  # Расходы на продажу
-                    'gross_profit': 0.0,
-                    'sales_expenses': total_debit_turnover,  # Расходы на продажу
-                    'other_income_expenses': 0.0,
-                    'net_profit': 0.0,
-                    'vat_deductible': 0.0,
-                    'vat_to_budget': 0.0,
-                    'purchase_amount_with_vat': 0.0,
-                    'sales_amount_with_vat': 0.0,
-                    'sales_amount_without_vat': 0.0,
-                    'quantity': 0,
-                    'osv_begin_balance': 0.0,
-                    'osv_end_balance': 0.0,
-                    'osv_turnover_debit': total_debit_turnover,
-                    'osv_turnover_credit': total_credit_turnover,
-                    'import_date': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                })
-                break
-            
-            # Если есть статьи затрат с ненулевыми оборотами - сохраняем их
-            if first_cell and not first_cell[0].isdigit() and 'итого' not in first_cell:
-                article = first_cell
-                debit_turnover = self._clean_number(row[3] if len(row) > 3 else 0)
-                credit_turnover = self._clean_number(row[4] if len(row) > 4 else 0)
-                
-                if debit_turnover != 0 or credit_turnover != 0:
-                    records.append({
-                        'company': company,
-                        'period_start': period_start,
-                        'period_end': period_end,
-                        'account': '44',
-                        'product_group': 'ОСВ 44',
-                        'doc_type': 'osv_44',
-                        'nomenclature': article,  # Здесь название статьи уместно
-                        'article': '',
-                        'seller': '',
-                        'buyer': '',
-                        'document_number': '',
-                        'document_date': '',
-                        'operation_code': '',
-                        'acceptance_date': '',
-                        'payment_document': '',  # ПУСТО!
-                        'revenue': 0.0,
-                        'cost_price': debit_turnover,
-                        'gross_profit': 0.0,
-                        'sales_expenses': debit_turnover,
-                        'other_income_expenses': 0.0,
-                        'net_profit': 0.0,
-                        'vat_deductible': 0.0,
-                        'vat_to_budget': 0.0,
-                        'purchase_amount_with_vat': 0.0,
-                        'sales_amount_with_vat': 0.0,
-                        'sales_amount_without_vat': 0.0,
-                        'quantity': 0,
-                        'osv_begin_balance': 0.0,
-                        'osv_end_balance': 0.0,
-                        'osv_turnover_debit': debit_turnover,
-                        'osv_turnover_credit': credit_turnover,
-                        'import_date': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                    })
-
-        if not records:
-            # Если нет данных, создаем запись с нулями для итога
-            records.append({
-                'company': company,
-                'period_start': period_start,
-                'period_end': period_end,
-                'account': '44',
-                'product_group': 'ОСВ 44',
-                'doc_type': 'osv_44_summary',
-                'nomenclature': '',
-                'article': '',
-                'seller': '',
-                'buyer': '',
-                'document_number': '',
-                'document_date': '',
-                'operation_code': '',
-                'acceptance_date': '',
-                'payment_document': '',
-                'revenue': 0.0,
-                'cost_price': 0.0,
-                'gross_profit': 0.0,
-                'sales_expenses': 0.0,
-                'other_income_expenses': 0.0,
-                'net_profit': 0.0,
-                'vat_deductible': 0.0,
-                'vat_to_budget': 0.0,
-                'purchase_amount_with_vat': 0.0,
-                'sales_amount_with_vat': 0.0,
-                'sales_amount_without_vat': 0.0,
-                'quantity': 0,
-                'osv_begin_balance': 0.0,
-                'osv_end_balance': 0.0,
-                'osv_turnover_debit': 0.0,
-                'osv_turnover_credit': 0.0,
-                'import_date': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            })
+        # Правая панель с вкладками
+        right_panel = QWidget()
+        right_layout = QVBoxLayout(right_panel)
 
-        print(f"ОСВ 44: найдено записей — {len(records)}")
-        return pd.DataFrame(records)
+        self.tab_widget = QTabWidget()
+        self.tab_widget.setStyleSheet("""
+            QTabWidget::pane {
+                border: 1px solid #bdc3c7;
+                background-color: white;
+            }
+            QTabBar::tab {
+                background-color: #ecf0f1;
+                padding: 10px 20px;
+                margin-right: 2px;
+                border-top-left-radius: 4px;
+                border-top-right-radius: 4px;
+            }
+            QTabBar::tab:selected {
+                background-color: #3498db;
+                color: white;
+                font-weight: bold;
+            }
+        """)
 
-    #==========================================================================
-    # ========== ПАРСЕР ОСВ41 ==========
+        # Вкладка с таблицей
+        self.table_tab = QWidget()
+        table_layout = QVBoxLayout(self.table_tab)
 
-    def _parse_osv_41_detailed(self, file_path):
-        """
-        Парсинг оборотно-сальдовой ведомости по счету 41 (Товары)
-        """
-        import pandas as pd
-        import re
-        from datetime import datetime
+        self.table_view = QTableView()
+        self.reports_model = ReportsTableModel(self)
+        self.table_view.setModel(self.reports_model)
+        self.table_view.setAlternatingRowColors(True)
+        self.table_view.setSortingEnabled(True)
+        # Ширины колонок по выборке значений, запоминаются до изменения данных
+        # (шрифт берется при измерении: стиль таблицы применяется позже)
+        self.view_widths = ColumnWidthEstimator(lambda text: self.table_view.fontMetrics().horizontalAdvance(text),
+                                                ReportsTableModel.format_value)
 
-        print(f"Парсер ОСВ 41: начало обработки {file_path}")
-        df = pd.read_excel(file_path, header=None, dtype=str)
-        df = df.fillna('').astype(str).apply(lambda col: col.str.strip())
-        print(f"Прочитано строк: {len(df)}")
+        table_layout.addWidget(self.table_view)
 
-        company = "Неизвестная компания"
-        if len(df) > 0 and df.iloc[0, 0] and df.iloc[0, 0] != 'nan':
-            company = df.iloc[0, 0].strip()
-        print(f"ОСВ 41: компания = {company}")
+        # Панель итогов
+        summary_layout = QHBoxLayout()
+        
+        self.revenue_with_vat_label = QLabel("Выручка с НДС: 0 ₽")
+        self.expenses_with_vat_label = QLabel("Затраты с НДС: 0 ₽")
+        self.gross_profit_with_vat_label = QLabel("Валовая прибыль: 0 ₽")
+        self.profit_without_vat_label = QLabel("Прибыль без НДС: 0 ₽")
+        self.vat_to_budget_net_label = QLabel("НДС в бюджет: 0 ₽")
+        self.profit_tax_label = QLabel("Налог на прибыль: 0 ₽")
 
-        period_start = "2025-01-01"
-        period_end = "2025-12-31"
-        if len(df) > 1:
-            year_match = re.search(r'(\d{4})', df.iloc[1, 0])
-            if year_match:
-                year = year_match.group(1)
-                period_start = f"{year}-01-01"
-                period_end = f"{year}-12-31"
-                print(f"ОСВ 41: год {year}")
+        for label in [self.revenue_with_vat_label, self.expenses_with_vat_label,
+                    self.gross_profit_with_vat_label, self.profit_without_vat_label,
+                    self.vat_to_budget_net_label, self.profit_tax_label]:
+            label.setStyleSheet("""
+                QLabel {
+                    background-color: #ecf0f1;
+                    padding: 8px 12px;
+                    border-radius: 4px;
+                    font-weight: bold;
+                    color: #2c3e50;
+                    border: 1px solid #bdc3c7;
+                }
+            """)
 
-        # Находим начало данных
-        data_start = None
-        for i in range(len(df)):
-            if df.iloc[i, 0].strip() == '41':
-                data_start = i
-                print(f"ОСВ 41: данные начинаются со строки {i}")
-                break
+        summary_layout.addWidget(self.revenue_with_vat_label)
+        summary_layout.addWidget(self.expenses_with_vat_label)
+        summary_layout.addWidget(self.gross_profit_with_vat_label)
+        summary_layout.addWidget(self.profit_without_vat_label)
+        summary_layout.addWidget(self.vat_to_budget_net_label)
+        summary_layout.addWidget(self.profit_tax_label)
+        summary_layout.addStretch()
 
-        if data_start is None:
-            raise ValueError("Не найдена строка с '41' в ОСВ 41")
+        table_layout.addLayout(summary_layout)
+        
+        #-----------------------------------------------------------------------
+        # Вкладка с графиками - КАЖДЫЙ ГРАФИК НА ОТДЕЛЬНОЙ СТРОКЕ
+        self.charts_tab = QWidget()
+        charts_layout = QVBoxLayout(self.charts_tab)
 
-        records = []
-        i = data_start
+        # Создаём область с прокруткой
+        scroll_area = QScrollArea()
+        scroll_area.setWidgetResizable(True)
+        scroll_area.setHorizontalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAsNeeded)
+        scroll_area.setVerticalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAsNeeded)
 
-        while i < len(df):
-            # Пропускаем пустые строки
-            while i < len(df) and (not df.iloc[i, 0] or df.iloc[i, 0] == 'nan'):
-                i += 1
-            if i >= len(df):
-                break
+        # Контейнер для всех графиков
+        charts_container = QWidget()
+        charts_container_layout = QVBoxLayout(charts_container)
+        charts_container_layout.setSpacing(30)  # Большие отступы между графиками
+        charts_container_layout.setContentsMargins(10, 10, 10, 10)
 
-            row = df.iloc[i].tolist()
-            first_cell = str(row[0]).strip().lower() if row[0] else ''
+        # Первый график - отдельно
+        self.figure1, self.ax1 = plt.subplots(figsize=(10, 8))  # Увеличенный размер
+        self.figure1.patch.set_facecolor('#f5f5f5')
+        self.canvas1 = FigureCanvas(self.figure1)
+        self.canvas1.setMinimumHeight(500)
+        charts_container_layout.addWidget(QLabel("График 1. Распределение прибыли по товарным группам"))
+        charts_container_layout.addWidget(self.canvas1)
+        charts_container_layout.addSpacing(20)
 
-            if 'итого' in first_cell:
-                print(f"ОСВ 41: итог на строке {i}")
-                break
+        # Второй график - отдельно
+        self.figure2, self.ax2 = plt.subplots(figsize=(10, 8))
+        self.figure2.patch.set_facecolor('#f5f5f5')
+        self.canvas2 = FigureCanvas(self.figure2)
+        self.canvas2.setMinimumHeight(500)
+        charts_container_layout.addWidget(QLabel("График 2. ТОП-5 товаров по прибыльности"))
+        charts_container_layout.addWidget(self.canvas2)
+        charts_container_layout.addSpacing(20)
 
-            # 1. Счет (41, 41.01)
-            if first_cell.replace('.', '').isdigit() and len(first_cell) < 10:
-                current_account = row[0].strip()
-                print(f"Счет: {current_account}")
-                i += 2
-                continue
+        # Третий график - отдельно
+        self.figure3, self.ax3 = plt.subplots(figsize=(10, 8))
+        self.figure3.patch.set_facecolor('#f5f5f5')
+        self.canvas3 = FigureCanvas(self.figure3)
+        self.canvas3.setMinimumHeight(500)
+        charts_container_layout.addWidget(QLabel("График 3. Закупки с НДС по кварталам"))
+        charts_container_layout.addWidget(self.canvas3)
+        charts_container_layout.addSpacing(20)
 
-            # 2. Номенклатура
-            elif first_cell[0].isdigit() and len(first_cell) > 10:
-                parts = row[0].split(' ', 1)
-                if len(parts) == 2:
-                    current_nomenclature = parts[1]
-                else:
-                    current_nomenclature = row[0]
-                
-                current_article = row[1].strip() if len(row) > 1 else ''
-                print(f"Номенклатура: {current_nomenclature[:50]}..., Артикул: {current_article}")
-                i += 2
-                continue
+        # Четвертый график - отдельно
+        self.figure4, self.ax4 = plt.subplots(figsize=(10, 8))
+        self.figure4.patch.set_facecolor('#f5f5f5')
+        self.canvas4 = FigureCanvas(self.figure4)
+        self.canvas4.setMinimumHeight(500)
+        charts_container_layout.addWidget(QLabel("График 4. Выручка с НДС по кварталам"))
+        charts_container_layout.addWidget(self.canvas4)
+        charts_container_layout.addSpacing(20)
 
-            # 3. Операция (Обороты за ...)
-            if 'обороты за' in first_cell:
-                print(f"НАШЕЛ ОБОРОТЫ: {row[0]}")
-                
-                current_operation = row[0]
-                
-                # Извлекаем дату
-                date_match = re.search(r'(\d{2}\.\d{2}\.\d{2,4})', first_cell)
-                op_date = date_match.group(1) if date_match else ''
+        # Пятый график - отдельно
+        self.figure5, self.ax5 = plt.subplots(figsize=(10, 8))
+        self.figure5.patch.set_facecolor('#f5f5f5')
+        self.canvas5 = FigureCanvas(self.figure5)
+        self.canvas5.setMinimumHeight(500)
+        charts_container_layout.addWidget(QLabel("График 5. НДС в бюджет по кварталам"))
+        charts_container_layout.addWidget(self.canvas5)
+        charts_container_layout.addSpacing(20)
 
-                # Получаем данные из следующей строки (Кол.)
-                if i + 1 < len(df):
-                    next_row = df.iloc[i + 1].tolist()
-                    
-                    # Берем суммы из КОЛОНКИ 5 (дебет) и КОЛОНКИ 6 (кредит)
-                    bu_debit = self._clean_number(next_row[5] if len(next_row) > 5 else 0)   # Дебет в колонке 5
-                    bu_credit = self._clean_number(next_row[6] if len(next_row) > 6 else 0)  # Кредит в колонке 6
-                    
-                    # Количество - тоже из колонок 5 и 6 (там уже лежат цифры)
-                    qty_debit = bu_debit
-                    qty_credit = bu_credit
-                    
-                    print(f"  НАЙДЕНО: Дебет={bu_debit}, Кредит={bu_credit} (колонки 5,6)")
-
-                    # Сохраняем приход (дебет)
-                    if bu_debit > 0:
-                        print(f"  СОХРАНЯЕМ ПРИХОД: {bu_debit}")
-                        records.append({
-                            'company': company,
-                            'period_start': period_start,
-                            'period_end': period_end,
-                            'account': current_account,
-                            'product_group': 'ОСВ 41',
-                            'doc_type': 'osv_41',
-                            'nomenclature': current_nomenclature,
-                            'article': current_article,
-                            'seller': '',
-                            'buyer': '',
-                            'document_number': '',
-                            'document_date': op_date,
-                            'operation_code': '',
-                            'acceptance_date': '',
-                            'payment_document': current_operation,
-                            'revenue': 0.0,
-                            'cost_price': 0.0,
-                            'gross_profit': 0.0,
-                            'sales_expenses': 0.0,
-                            'other_income_expenses': 0.0,
-                            'net_profit': 0.0,
-                            'vat_deductible': 0.0,
-                            'vat_to_budget': 0.0,
-                            'purchase_amount_with_vat': bu_debit,
-                            'sales_amount_with_vat': 0.0,
-                            'sales_amount_without_vat': 0.0,
-                            'quantity': bu_debit,
-                            'osv_begin_balance': 0.0,
-                            'osv_end_balance': 0.0,
-                            'osv_turnover_debit': bu_debit,
-                            'osv_turnover_credit': 0.0,
-                            'import_date': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                        })
-
-                    # Сохраняем расход (кредит)
-                    if bu_credit > 0:
-                        print(f"  СОХРАНЯЕМ РАСХОД: {bu_credit}")
-                        records.append({
-                            'company': company,
-                            'period_start': period_start,
-                            'period_end': period_end,
-                            'account': current_account,
-                            'product_group': 'ОСВ 41',
-                            'doc_type': 'osv_41',
-                            'nomenclature': current_nomenclature,
-                            'article': current_article,
-                            'seller': '',
-                            'buyer': '',
-                            'document_number': '',
-                            'document_date': op_date,
-                            'operation_code': '',
-                            'acceptance_date': '',
-                            'payment_document': current_operation,
-                            'revenue': 0.0,
-                            'cost_price': bu_credit,
-                            'gross_profit': 0.0,
-                            'sales_expenses': 0.0,
-                            'other_income_expenses': 0.0,
-                            'net_profit': 0.0,
-                            'vat_deductible': 0.0,
-                            'vat_to_budget': 0.0,
-                            'purchase_amount_with_vat': 0.0,
-                            'sales_amount_with_vat': 0.0,
-                            'sales_amount_without_vat': 0.0,
-                            'quantity': bu_credit,
-                            'osv_begin_balance': 0.0,
-                            'osv_end_balance': 0.0,
-                            'osv_turnover_debit': 0.0,
-                            'osv_turnover_credit': bu_credit,
-                            'import_date': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                        })
-
-                i += 2
-                continue
+        # Шестой график - отдельно
+        self.figure6, self.ax6 = plt.subplots(figsize=(10, 8))
+        self.figure6.patch.set_facecolor('#f5f5f5')
+        self.canvas6 = FigureCanvas(self.figure6)
+        self.canvas6.setMinimumHeight(500)
+        charts_container_layout.addWidget(QLabel("График 6. НДС по выручке по кварталам"))
+        charts_container_layout.addWidget(self.canvas6)
+        charts_container_layout.addSpacing(20)
 
-            # 4. Основной склад и другие
-            else:
-                print(f"Пропускаем строку {i}: {first_cell[:30]}")
-                i += 2
-                continue
+        # Седьмой график - отдельно
+        self.figure7, self.ax7 = plt.subplots(figsize=(10, 8))
+        self.figure7.patch.set_facecolor('#f5f5f5')
+        self.canvas7 = FigureCanvas(self.figure7)
+        self.canvas7.setMinimumHeight(500)
+        charts_container_layout.addWidget(QLabel("График 7. НДС по затратам по кварталам"))
+        charts_container_layout.addWidget(self.canvas7)
+        charts_container_layout.addSpacing(20)
 
-        # ===== ДОБАВЛЯЕМ ИТОГОВУЮ ЗАПИСЬ =====
-        # Находим строку с "Итого" и добавляем отдельную запись
-        for j in range(data_start, len(df)):
-            if 'итого' in df.iloc[j, 0].lower():
-                total_row = df.iloc[j].tolist()
-                print(f"НАЙДЕНА ИТОГОВАЯ СТРОКА: {total_row[0]}")
-                
-                # Получаем итоговые суммы из строки "Итого"
-                # По вашей разблюдовке:
-                # Колонка 3: Сальдо на начало (Дебет) - 280 998,76
-                # Колонка 5: Обороты дебет - 5 498 429,29
-                # Колонка 6: Обороты кредит - 5 401 062,89
-                # Колонка 7: Сальдо на конец (Дебет) - 378 365,16
-                
-                begin_balance = self._clean_number(total_row[3] if len(total_row) > 3 else 0)
-                debit_turnover = self._clean_number(total_row[5] if len(total_row) > 5 else 0)
-                credit_turnover = self._clean_number(total_row[6] if len(total_row) > 6 else 0)
-                end_balance = self._clean_number(total_row[7] if len(total_row) > 7 else 0)
-                
-                print(f"  ИТОГО: нач={begin_balance}, обороты д/к={debit_turnover}/{credit_turnover}, кон={end_balance}")
-                
-                # Добавляем итоговую запись со всеми полями
-                records.append({
-                    'company': company,
-                    'period_start': period_start,
-                    'period_end': period_end,
-                    'account': '41_ИТОГО',
-                    'product_group': 'ОСВ 41',
-                    'doc_type': 'osv_41_summary',
-                    'nomenclature': 'ИТОГО по счету 41',
-                    'article': '',
-                    'seller': '',
-                    'buyer': '',
-                    'document_number': '',
-                    'document_date': '',
-                    'operation_code': '',
-                    'acceptance_date': '',
-                    'payment_document': 'Итоговые данные',
-                    'revenue': 0.0,
-                    'cost_price': 0.0,
-                    'gross_profit': 0.0,
-                    'sales_expenses': 0.0,
-                    'other_income_expenses': 0.0,
-                    'net_profit': 0.0,
-                    'vat_deductible': 0.0,
-                    'vat_to_budget': 0.0,
-                    'purchase_amount_with_vat': debit_turnover,
-                    'sales_amount_with_vat': 0.0,
-                    'sales_amount_without_vat': 0.0,
-                    'quantity': 0,
-                    'osv_begin_balance': begin_balance,
-                    'osv_end_balance': end_balance,
-                    'osv_turnover_debit': debit_turnover,
-                    'osv_turnover_credit': credit_turnover,
-                    'import_date': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                })
-                break
+        # Восьмой график - отдельно
+        self.figure8, self.ax8 = plt.subplots(figsize=(10, 8))
+        self.figure8.patch.set_facecolor('#f5f5f5')
+        self.canvas8 = FigureCanvas(self.figure8)
+        self.canvas8.setMinimumHeight(500)
+        charts_container_layout.addWidget(QLabel("График 8. Валовая прибыль по кварталам"))
+        charts_container_layout.addWidget(self.canvas8)
+        charts_container_layout.addSpacing(20)
 
-        if not records:
-            raise ValueError("Не найдено записей в ОСВ 41")
+        # Девятый график - отдельно
+        self.figure9, self.ax9 = plt.subplots(figsize=(10, 8))
+        self.figure9.patch.set_facecolor('#f5f5f5')
+        self.canvas9 = FigureCanvas(self.figure9)
+        self.canvas9.setMinimumHeight(500)
+        charts_container_layout.addWidget(QLabel("График 9. Затраты по кварталам (все налоги и закупки)"))
+        charts_container_layout.addWidget(self.canvas9)
 
-        print(f"ОСВ 41: найдено записей — {len(records)}")
-        return pd.DataFrame(records)
+        # Кнопка обновления
+        charts_btn_layout = QHBoxLayout()
+        self.update_charts_btn = QPushButton("Обновить графики")
+        self.update_charts_btn.clicked.connect(self.update_charts)
+        self.update_charts_btn.setStyleSheet(self.apply_filter_btn.styleSheet())
+        charts_container_layout.addLayout(charts_btn_layout)
 
-    #==========================================================================
-    # ========== ПАРСЕР ОСВ19 ==========
-    def _parse_osv_19_detailed(self, file_path):
-        """
-        Парсинг оборотно-сальдовой ведомости по счету 19
-        """
-        import pandas as pd
-        import re
-        from datetime import datetime
+        charts_container_layout.addStretch()
+        scroll_area.setWidget(charts_container)
+        charts_layout.addWidget(scroll_area)
 
-        print(f"Парсер ОСВ 19: начало обработки {file_path}")
-        
-        # Просто читаем, без выебонов
-        df = pd.read_excel(file_path, header=None, dtype=str)
-        
-        # Чистим
-        df = df.fillna('').astype(str).apply(lambda col: col.str.strip())
-        # 👇 ДОБАВЛЯЕМ СЮДА
-        def fix_account_dates(val):
-            if pd.isna(val) or val == '' or val == 'nan':
-                return ''
-            s = str(val).strip()
-            if '-' in s and ' ' in s and len(s.split()) >= 2:
-                date_part = s.split()[0]
-                if '-' in date_part:
-                    parts = date_part.split('-')
-                    if len(parts) == 3:
-                        year, month, day = parts
-                        return f"{day}.{month}"
-            return s
+        self.tab_widget.addTab(self.table_tab, "📊 Таблица данных")
+        self.tab_widget.addTab(self.charts_tab, "📈 Графики и анализ")
 
-        df[0] = df[0].apply(fix_account_dates)
-        # 👆
+        right_layout.addWidget(self.tab_widget)
+        self.splitter.addWidget(right_panel)
+        self.splitter.setSizes([250, self.width() - 250])
 
-        print(f"Прочитано строк: {len(df)}")
+        # !!! ВАЖНО - ДОБАВЛЯЕМ СПЛИТТЕР В MAIN_LAYOUT !!!
+        main_layout.addWidget(self.splitter)
 
-        # --- 1. Компания ---
-        company = "Неизвестная компания"
-        if len(df) > 0 and df.iloc[0, 0] and df.iloc[0, 0] != 'nan':
-            company = df.iloc[0, 0].strip()
-        print(f"ОСВ 19: компания = {company}")
+        # Инициализация данными
+        self.current_df = None
+        self.current_filters = {}
+        self.show_reports()
+        self.update_summary()
+        self.update_charts()
+        self.update_filter_combos()
 
-        # --- 2. Период ---
-        period_start = "2025-01-01"
-        period_end = "2025-12-31"
-        if len(df) > 1:
-            year_match = re.search(r'(\d{4})', df.iloc[1, 0])
-            if year_match:
-                year = year_match.group(1)
-                period_start = f"{year}-01-01"
-                period_end = f"{year}-12-31"
-                print(f"ОСВ 19: год {year}")
+    #================================================================================
+    # Создание меню
+    def create_menus(self):
+        menubar = self.menuBar()
 
-        # --- 3. Находим начало данных ---
-        data_start = None
-        for i in range(len(df)):
-            if df.iloc[i, 0].strip() == '19':
-                data_start = i
-                print(f"ОСВ 19: данные начинаются со строки {i}")
-                break
-        
-        if data_start is None:
-            raise ValueError("Не найдена строка с '19' в ОСВ 19")
+        # КНОПКА ОБРАБОТАТЬ - ПЕРВАЯ В СТРОКЕ МЕНЮ
+        self.process_selected_btn = QPushButton("ОБРАБОТАТЬ")
+        self.process_selected_btn.setEnabled(False)
+        self.process_selected_btn.setStyleSheet("""
+            QPushButton {
+                background-color: #ff4444;
+                color: white;
+                font-weight: bold;
+                font-size: 14px;
+                padding: 5px 15px;
+                border-radius: 4px;
+                margin: 2px 5px;
+            }
+            QPushButton:hover {
+                background-color: #ff6666;
+            }
+            QPushButton:disabled {
+                background-color: #cccccc;
+                color: #666666;
+            }
+        """)
+        self.process_selected_btn.clicked.connect(self.process_selected_files)
+        menubar.setCornerWidget(self.process_selected_btn, Qt.Corner.TopLeftCorner)
 
-                
-        # --- 4. Индексы колонок ---
-        debit_turnover_col = 3
-        credit_turnover_col = 4
+        # Меню "База данных"
+        db_menu = menubar.addMenu("База данных")
+        load_db_action = QAction("Загрузить БД", self)
+        load_db_action.triggered.connect(self.load_database)
+        db_menu.addAction(load_db_action)
 
-        # --- 5. Сбор записей ---
-        records = []
-        current_account = None
+        save_db_action = QAction("Сохранить БД", self)
+        save_db_action.triggered.connect(self.save_database)
+        db_menu.addAction(save_db_action)
 
-        for i in range(data_start, len(df)):
-            row = df.iloc[i].tolist()
-            if len(row) == 0:
-                continue
-                
-            first_cell = str(row[0]).strip().lower() if row[0] else ''
-            
-            if 'итого' in first_cell:
-                print(f"ОСВ 19: итог на строке {i}")
-                break
-            
-            if not first_cell or first_cell == 'nan':
-                continue
-            
-            incoming_vat = self._clean_number(row[debit_turnover_col] if debit_turnover_col < len(row) else 0)
-            deducted_vat = self._clean_number(row[credit_turnover_col] if credit_turnover_col < len(row) else 0)
-            
-            if incoming_vat == 0 and deducted_vat == 0:
-                continue
-            
-            if first_cell[0].isdigit():
-                account = row[0].strip()
-                current_account = account
-            else:
-                account = current_account
-            
-            records.append({
-                'company': company,
-                'period_start': period_start,
-                'period_end': period_end,
-                'account': account,
-                'product_group': 'ОСВ 19',
-                'doc_type': 'osv_19',
-                'nomenclature': '',
-                'seller': row[0].strip() if not first_cell[0].isdigit() else '',
-                'buyer': '',
-                'document_number': '',
-                'document_date': '',
-                'operation_code': '',
-                'acceptance_date': '',
-                'payment_document': '',
-                'revenue': 0.0,
-                'cost_price': 0.0,
-                'gross_profit': 0.0,
-                'sales_expenses': 0.0,
-                'other_income_expenses': 0.0,
-                'net_profit': 0.0,
-                'vat_deductible': deducted_vat,
-                'vat_to_budget': 0.0,
-                'purchase_amount_with_vat': 0.0,
-                'sales_amount_with_vat': 0.0,
-                'sales_amount_without_vat': 0.0,
-                'quantity': 1
-            })
+        save_as_action = QAction("Сохранить БД как...", self)
+        save_as_action.triggered.connect(self.save_database_as)
+        db_menu.addAction(save_as_action)
 
-        if not records:
-            raise ValueError("Не найдено записей в ОСВ 19")
+        clear_db_action = QAction("Очистить БД", self)
+        clear_db_action.triggered.connect(self.clear_database)
+        db_menu.addAction(clear_db_action)
 
-        print(f"ОСВ 19: найдено записей — {len(records)}")
-        return pd.DataFrame(records)
+        export_db_action = QAction("Экспорт БД в Excel", self)
+        export_db_action.triggered.connect(self.export_to_excel)
+        db_menu.addAction(export_db_action)
 
+        import_template_action = QAction("Импорт из шаблона", self)
+        import_template_action.triggered.connect(self.import_from_template)
+        db_menu.addAction(import_template_action)
 
-    #==========================================================================
-    # ========== КНИГА ПОКУПОК ==========
-    def _parse_purchase_book(self, file_path):
-            import pandas as pd
-            import re
-            from datetime import datetime
-
-            df = pd.read_excel(file_path, header=None, dtype=str)
-            df = df.fillna('').astype(str).apply(lambda col: col.str.strip())
-
-            company = "Неизвестная компания"
-            for i in range(min(10, len(df))):
-                row = df.iloc[i].tolist()
-                for j, cell in enumerate(row):
-                    if 'покупатель' in cell.lower():
-                        for k in range(j+1, len(row)):
-                            if row[k].strip():
-                                company = row[k].strip()
-                                break
-                        if company != "Неизвестная компания":
-                            break
-                if company != "Неизвестная компания":
-                    break
-            print(f"Книга покупок: компания = {company}")
-
-            header_text = ' '.join(df.iloc[:20].values.flatten()).lower()
-            period_match = re.search(r'с\s+(\d{2}\.\d{2}\.\d{4})\s+по\s+(\d{2}\.\d{2}\.\d{4})', header_text, re.IGNORECASE)
-            if not period_match:
-                raise ValueError("Не найден период в книге покупок")
-            period_start = datetime.strptime(period_match.group(1), "%d.%m.%Y").strftime("%Y-%m-%d")
-            period_end = datetime.strptime(period_match.group(2), "%d.%m.%Y").strftime("%Y-%m-%d")
-
-            header_row_idx, num_to_idx = self._find_header_row_loose(df, min_required=5)
-            if header_row_idx is None:
-                header_row_idx, num_to_idx = self._find_header_row_fallback(df, min_count=8)
-                if header_row_idx is None:
-                    raise ValueError("Не найдена строка с номерами колонок")
-
-            print(f"Книга покупок: строка с номерами на индексе {header_row_idx}")
-            print(f"Соответствие базовых номеров колонкам: {num_to_idx}")
-
-            required_nums = [2, 3, 8, 9, 14, 15]
-            for num in required_nums:
-                if num not in num_to_idx:
-                    raise ValueError(f"Не найден номер колонки {num}")
-
-            op_col = num_to_idx[2]
-            doc_col = num_to_idx[3]
-            accept_col = num_to_idx[8]
-            seller_col = num_to_idx[9]
-            amount_col = num_to_idx[14]
-            vat_col = num_to_idx[15]
-
-            records = []
-            current_seller = None
-            data_start = header_row_idx + 1
-
-            for i in range(data_start, len(df)):
-                row = df.iloc[i].tolist()
-                first_cell_raw = row[0] if len(row) > 0 else ''
-                first_cell = str(first_cell_raw).strip().lower() if first_cell_raw else ''
-
-                if not first_cell:
-                    continue
+        # Меню "Отчеты"
+        report_menu = menubar.addMenu("Отчеты")
+        quick_report_action = QAction("Быстрый отчет", self)
+        quick_report_action.triggered.connect(self.generate_quick_report)
+        report_menu.addAction(quick_report_action)
 
-                if 'всего по продавцу' in first_cell:
-                    current_seller = None
-                    continue
+        report_menu.addSeparator()
 
-                if first_cell == 'всего' and 'по продавцу' not in first_cell:
-                    break
+        pdf_action = QAction("Экспорт в PDF", self)
+        pdf_action.triggered.connect(self.export_to_pdf)
+        report_menu.addAction(pdf_action)
 
-                if first_cell.replace('.', '', 1).replace(',', '').isdigit():
-                    seller = current_seller
-                    if seller_col < len(row) and row[seller_col] and row[seller_col].strip():
-                        seller = row[seller_col].strip()
-                        current_seller = seller
-                    elif not seller:
-                        continue
+        word_action = QAction("Экспорт в Word", self)
+        word_action.triggered.connect(self.export_to_word)
+        report_menu.addAction(word_action)
 
-                    doc_str = row[doc_col] if doc_col < len(row) else ''
-                    doc_number = ''
-                    doc_date = ''
-                    if doc_str:
-                        parts = re.split(r'\s+от\s+', doc_str, maxsplit=1, flags=re.IGNORECASE)
-                        if len(parts) == 2:
-                            doc_number = parts[0].strip()
-                            doc_date = parts[1].strip()
-                        else:
-                            doc_number = doc_str
+        # Меню "Настройки"
+        settings_menu = menubar.addMenu("Настройки")
+        settings_action = QAction("Настройки программы", self)
+        settings_action.triggered.connect(self.show_settings)
+        settings_menu.addAction(settings_action)
 
-                    operation_code = row[op_col] if op_col < len(row) else ''
-                    acceptance_date = row[accept_col] if accept_col < len(row) else ''
+        # Меню "О программе"
+        about_menu = menubar.addMenu("Помощь")
+        query_plan_action = QAction("Диагностика запроса фильтра", self)
+        query_plan_action.triggered.connect(self.show_query_plan)
+        about_menu.addAction(query_plan_action)
 
-                    amount = self._clean_number(row[amount_col] if amount_col < len(row) else '0')
-                    vat = self._clean_number(row[vat_col] if vat_col < len(row) else '0')
+        about_action = QAction("О программе", self)
+        about_action.triggered.connect(self.show_about)
+        about_menu.addAction(about_action)
+       
+    #=======================================================
+    #  Метод активации кнопки Обработать
+    def _update_process_button_state(self):
+        # Достаточно одного отмеченного элемента: обход папок на диске - только при обработке
+        checked = QTreeWidgetItemIterator(self.tree_widget, QTreeWidgetItemIterator.IteratorFlag.Checked)
+        self.process_selected_btn.setEnabled(checked.value() is not None)
 
-                    if amount == 0 and vat == 0:
-                        continue
 
-                    records.append({
-                        'company': company,
-                        'period_start': period_start,
-                        'period_end': period_end,
-                        'doc_type': 'purchase_book',
-                        'product_group': 'Покупки',
-                        'seller': seller,
-                        'buyer': '',
-                        'document_number': doc_number,
-                        'document_date': doc_date,
-                        'operation_code': operation_code,
-                        'acceptance_date': acceptance_date,
-                        'purchase_amount_with_vat': amount,
-                        'sales_amount_with_vat': 0.0,
-                        'sales_amount_without_vat': 0.0,
-                        'vat_deductible': vat,
-                        'vat_to_budget': 0.0,
-                        'nomenclature': '',
-                        'revenue': 0.0,
-                        'cost_price': 0.0,
-                        'gross_profit': 0.0,
-                        'sales_expenses': 0.0,
-                        'other_income_expenses': 0.0,
-                        'net_profit': 0.0,
-                        'payment_document': '',
-                        'quantity': 1
-                    })
-                else:
-                    if not first_cell[0].isdigit():
-                        current_seller = row[0].strip()
+       # ==================== РАБОТА С ДЕРЕВОМ ФАЙЛОВ ====================
+    def choose_root_folder(self):
+        folder = QFileDialog.getExistingDirectory(self, "Выберите папку загрузки", self.load_folder)
+        if folder:
+            self.settings.setValue("input_folder", folder)
+            self.load_folder = folder
+            self.load_folder_tree(folder)
 
-            if not records:
-                raise ValueError("Не найдено записей в книге покупок")
+    # ================================================================================
+    # """Загружает дерево файлов из папки и сохраняет путь в настройки"""
+    def load_folder_tree(self, folder_path):
+        """
+        Открывает папку в дереве и сохраняет путь в настройки.
+        Сразу показывается только корень: содержимое папок читается при раскрытии
+        """
+        self.tree_widget.clear()
+        self._folder_items.clear()
+        self._loaded_folders.clear()
+        root_item = self._new_tree_item(os.path.basename(folder_path), folder_path, True, Qt.CheckState.Unchecked)
+        self.tree_widget.addTopLevelItem(root_item)
+        root_item.setExpanded(True)
+        self._load_folder_item(root_item)
+        # Сохраняем путь к папке
+        self.settings.setValue("last_folder", folder_path)
+        self._update_folder_watch()
 
-            print(f"Книга покупок: найдено записей — {len(records)}")
-            return pd.DataFrame(records)
+    # ================================================================================
+    def _new_tree_item(self, name, path, is_dir, check_state):
+        item = QTreeWidgetItem([name])
+        item.setData(0, Qt.ItemDataRole.UserRole, path)
+        item.setData(0, self.TREE_IS_DIR_ROLE, is_dir)
+        item.setFlags(item.flags() | Qt.ItemFlag.ItemIsUserCheckable)
+        item.setCheckState(0, check_state)
+        if is_dir:
+            # Стрелка раскрытия до того, как содержимое папки прочитано
+            item.setChildIndicatorPolicy(QTreeWidgetItem.ChildIndicatorPolicy.ShowIndicator)
+            self._folder_items[path] = item
+        return item
+
+    def _load_folder_item(self, item):
+        """Первое раскрытие папки: содержимое из кэша сразу, затем сверка с диском в фоне"""
+        folder = item.data(0, Qt.ItemDataRole.UserRole)
+        if not item.data(0, self.TREE_IS_DIR_ROLE) or folder in self._loaded_folders:
+            return
+        self._loaded_folders.add(folder)
+        cached = self.folder_cache.get(folder)
+        if cached:
+            self._insert_tree_entries(item, cached['entries'])
+        self._scanning_folders.add(folder)
+        self.folder_scanner.request(folder, cached['mtime'] if cached else None)
+
+    def _insert_tree_entries(self, parent, entries):
+        """Добавляет в папку дерева записи [имя, это папка], которых в ней еще нет, по алфавиту"""
+        folder = parent.data(0, Qt.ItemDataRole.UserRole)
+        names = [parent.child(i).text(0) for i in range(parent.childCount())]
+        known = set(names)
+        # Новые элементы наследуют отметку папки
+        state = parent.checkState(0)
+        new_entries = sorted((name, is_dir) for name, is_dir in entries if name not in known)
+        if not names:
+            parent.addChildren([self._new_tree_item(name, os.path.join(folder, name), is_dir, state)
+                                for name, is_dir in new_entries])
+        else:
+            for name, is_dir in new_entries:
+                pos = bisect.bisect_left(names, name)
+                names.insert(pos, name)
+                parent.insertChild(pos, self._new_tree_item(name, os.path.join(folder, name), is_dir, state))
+
+    def _on_folder_entries(self, folder, entries):
+        self._scan_buffers.setdefault(folder, []).extend(entries)
+        item = self._folder_items.get(folder)
+        if item is not None:
+            self._insert_tree_entries(item, entries)
+
+    def _on_folder_scanned(self, folder, mtime, changed):
+        self._scanning_folders.discard(folder)
+        entries = self._scan_buffers.pop(folder, [])
+        item = self._folder_items.get(folder)
+        if changed:
+            self.folder_cache[folder] = {'mtime': mtime, 'entries': entries}
+            if item is not None:
+                # Убираем то, что было в кэше, но уже удалено с диска
+                present = {name for name, _ in entries}
+                for i in reversed(range(item.childCount())):
+                    child = item.child(i)
+                    if child.text(0) not in present:
+                        self._forget_tree_item(child)
+                        item.removeChild(child)
+        if item is not None and item.childCount() == 0:
+            item.setChildIndicatorPolicy(QTreeWidgetItem.ChildIndicatorPolicy.DontShowIndicatorWhenChildless)
+
+    def _forget_tree_item(self, item):
+        path = item.data(0, Qt.ItemDataRole.UserRole)
+        self._folder_items.pop(path, None)
+        self._loaded_folders.discard(path)
+        for i in range(item.childCount()):
+            self._forget_tree_item(item.child(i))
 
-    # ========== КНИГА ПРОДАЖ ==========
-    def _parse_sales_book(self, file_path):
-        import pandas as pd
-        import re
-        from datetime import datetime
+    def _folder_cache_path(self):
+        cache_dir = QStandardPaths.writableLocation(QStandardPaths.StandardLocation.GenericCacheLocation)
+        return os.path.join(cache_dir, "BuhTuundOtchet", self.FOLDER_CACHE_FILE)
 
-        print(f"Парсер продаж: начало обработки {file_path}")
-        df = pd.read_excel(file_path, header=None, dtype=str)
-        df = df.fillna('').astype(str).apply(lambda col: col.str.strip())
-        print(f"Прочитано строк: {len(df)}")
+    def _load_folder_cache(self):
+        """Кэш списков папок с прошлого запуска: {папка: {'mtime', 'entries'}}"""
+        try:
+            with open(self._folder_cache_path(), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
 
-        company = "Неизвестная компания"
-        for i in range(min(10, len(df))):
-            row = df.iloc[i].tolist()
-            for j, cell in enumerate(row):
-                if 'продавец' in cell.lower():
-                    for k in range(j+1, len(row)):
-                        if row[k].strip():
-                            company = row[k].strip()
-                            break
-                    if company != "Неизвестная компания":
-                        break
-            if company != "Неизвестная компания":
-                break
-        print(f"Книга продаж: компания = {company}")
+    def _save_folder_cache(self):
+        path = self._folder_cache_path()
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(self.folder_cache, f, ensure_ascii=False)
+        except OSError as e:
+            print(f"Не удалось сохранить кэш папок: {e}")
 
-        header_text = ' '.join(df.iloc[:20].values.flatten()).lower()
-        period_match = re.search(r'с\s+(\d{2}\.\d{2}\.\d{4})\s+по\s+(\d{2}\.\d{2}\.\d{4})', header_text, re.IGNORECASE)
-        if not period_match:
-            raise ValueError("Не найден период в книге продаж")
-        period_start = datetime.strptime(period_match.group(1), "%d.%m.%Y").strftime("%Y-%m-%d")
-        period_end = datetime.strptime(period_match.group(2), "%d.%m.%Y").strftime("%Y-%m-%d")
-        print(f"Период: {period_start} - {period_end}")
+    def get_checked_files(self, item=None, files=None):
+        if files is None:
+            files = []
+            root = self.tree_widget.topLevelItem(0)
+            if root is None:
+                return files
+            self.get_checked_files(root, files)
+            return files
 
-        header_row_idx, num_to_idx = self._find_header_row_loose(df, min_required=5)
-        if header_row_idx is None:
-            header_row_idx, num_to_idx = self._find_header_row_fallback(df, min_count=8)
-            if header_row_idx is None:
-                for debug_i in range(min(20, len(df))):
-                    print(f"Строка {debug_i}: {df.iloc[debug_i].tolist()}")
-                raise ValueError("Не найдена строка с номерами колонок")
+        path = item.data(0, Qt.ItemDataRole.UserRole)
+        if item.checkState(0) == Qt.CheckState.Checked:
+            if not item.data(0, self.TREE_IS_DIR_ROLE):
+                if path and os.path.isfile(path) and not os.path.basename(path).startswith('~$'):
+                    files.append(path)
+                return files
+            if path not in self._loaded_folders or path in self._scanning_folders:
+                # Содержимое папки в дереве не прочитано (или читается) - берем файлы с диска
+                for root, dirs, files_in_folder in os.walk(path):
+                    dirs.sort()
+                    for f in sorted(files_in_folder):
+                        if f.lower().endswith(('.xlsx', '.xls')) and not f.startswith('~$'):
+                            files.append(os.path.join(root, f))
+                return files
 
-        print(f"Книга продаж: строка с номерами на индексе {header_row_idx}")
-        print(f"Соответствие базовых номеров колонкам: {num_to_idx}")
+        for i in range(item.childCount()):
+            self.get_checked_files(item.child(i), files)
+        return files
 
-        required_nums = [2, 3, 7, 8, 11, 13, 14, 17]
-        for num in required_nums:
-            if num not in num_to_idx:
-                raise ValueError(f"Не найден базовый номер колонки {num}")
+    # ==================== АВТОЗАГРУЗКА ИЗ ПАПКИ ====================
+    def _toggle_folder_watch(self, checked):
+        self.settings.setValue("watch_folder", checked)
+        self._update_folder_watch()
 
-        header_row = df.iloc[header_row_idx].tolist()
+    def _update_folder_watch(self):
+        """Наблюдение за корневой папкой дерева, если включено"""
+        root = self.tree_widget.topLevelItem(0)
+        folder = root.data(0, Qt.ItemDataRole.UserRole) if root else None
+        if self.watch_folder_check.isChecked() and folder and os.path.isdir(folder):
+            if self.folder_watcher.folder != folder:
+                print(f"Наблюдение за папкой: {folder}")
+                self.folder_watcher.start(folder)
+        elif self.folder_watcher.is_active():
+            self.folder_watcher.stop()
+            self.watch_queue = []
+            self.statusBar().showMessage("Наблюдение за папкой выключено", 5000)
+
+    def _on_watch_files_ready(self, files):
+        for file_path in files:
+            if file_path not in self.watch_queue:
+                self.watch_queue.append(file_path)
+        self._start_watch_import()
+
+    def _start_watch_import(self):
+        """Загружает очередь автозагрузки, если сейчас не идет другой импорт"""
+        if not self.watch_queue or self.import_worker is not None:
+            return
+        files, self.watch_queue = self.watch_queue, []
+        self.process_files(files, auto=True)
 
-        op_col = num_to_idx[2]
-        doc_col = num_to_idx[3]
-        buyer_col = num_to_idx[7]
-        inn_col = num_to_idx[8]
-        payment_col = num_to_idx[11]
-        amount_without_vat_col = num_to_idx[14]
-        vat_col = num_to_idx[17]
+    def process_selected_files(self):
+        files = self.get_checked_files()
+        if not files:
+            QMessageBox.information(self, "Ничего не выбрано", "Не выбрано ни одного файла для обработки.")
+            return
+        self.process_files(files)
 
-        base13_start = num_to_idx[13]
-        amount_with_vat_col = None
-        for offset in range(10):
-            if base13_start + offset >= len(header_row):
-                break
-            cell = header_row[base13_start + offset]
-            clean = re.sub(r'\s+', '', cell.lower())
-            if '13б' in clean:
-                amount_with_vat_col = base13_start + offset
-                break
-        if amount_with_vat_col is None:
-            raise ValueError("Не найдена колонка '13б' (сумма с НДС)")
+    def _handle_item_changed(self, item, column):
+        self.tree_widget.blockSignals(True)
+        state = item.checkState(0)
+        self._set_children_checkstate(item, state)
+        self.tree_widget.blockSignals(False)
 
-        print(f"Индексы Excel: операция={op_col}, документ={doc_col}, покупатель={buyer_col}, ИНН={inn_col}, оплата={payment_col}, сумма без НДС={amount_without_vat_col}, НДС={vat_col}, сумма с НДС={amount_with_vat_col}")
+    def _set_children_checkstate(self, item, state):
+        for i in range(item.childCount()):
+            child = item.child(i)
+            child.setCheckState(0, state)
+            self._set_children_checkstate(child, state)
+    #================================================================================
+    # ==================== РАБОТА С БАЗОЙ ДАННЫХ ====================
+    def clear_database(self):
+        if self._import_in_progress():
+            return
+        reply = QMessageBox.question(self, "Подтверждение",
+                                    "Вы действительно хотите удалить все данные из базы?",
+                                    QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No)
+        if reply == QMessageBox.StandardButton.Yes:
+            self.db.clear_all()
+            self._forget_column_widths()
+            self.current_df = pd.DataFrame()
+            self.current_filters = {}
+            self.show_reports()
+            self.update_summary()
+            self.update_charts()
+            self.update_filter_combos()
+            
+            # При очистке базы удаляем запись о последней БД (будет создана новая при закрытии)
+            self.settings.remove("last_database")
+            
+            QMessageBox.information(self, "Готово", "База данных очищена")
 
-        records = []
-        current_buyer = None
-        data_start = header_row_idx + 1
+    # ===============================================================================
+    # """Загружает базу данных из выбранного файла .db."""
+    def load_database(self):
+        """Загружает базу данных из выбранного файла .db."""
+        if self._import_in_progress():
+            return
+        start_dir = self.db_load_folder if self.db_load_folder else ""
+        file_path, _ = QFileDialog.getOpenFileName(
+            self,
+            "Выберите файл базы данных",
+            start_dir,
+            "SQLite DB (*.db)"
+        )
+        if not file_path:
+            return
 
-        for i in range(data_start, len(df)):
-            row = df.iloc[i].tolist()
-            first_cell_raw = row[0] if len(row) > 0 else ''
-            first_cell = str(first_cell_raw).strip().lower() if first_cell_raw else ''
+        try:
+            self.db.conn.close()
+            self.db = DatabaseManager(db_path=file_path)
+            self._forget_column_widths()
+            self.current_df = None
+            self.current_filters = {}
+            self.show_reports()
+            self.update_summary()
+            self.update_charts()
+            self.update_filter_combos()
+            # Наблюдаемая папка сверяется с новой БД: чего в ней нет, будет загружено
+            self.folder_watcher.reset()
+            # Сохраняем путь как последнюю БД
+            self.settings.setValue("last_database", file_path)
+            QMessageBox.information(self, "Успех", f"База данных загружена из {file_path}")
+        except Exception as e:
+            QMessageBox.critical(self, "Ошибка", f"Не удалось загрузить базу данных:\n{str(e)}")
 
-            if not first_cell:
-                continue
+    def save_database(self):
+        QMessageBox.information(self, "Сохранение", "Все изменения уже сохранены в текущей базе данных.")
+
+    #===================================================================
+    # ====================== Сохранить БД как.... ==========================
+    def save_database_as(self):
+        cursor = self.db.conn.execute("PRAGMA database_list")
+        row = cursor.fetchone()
+        if row is None or not row[2]:
+            QMessageBox.warning(self, "Предупреждение", "Не удалось определить путь к текущей базе данных")
+            return
+        current_db_path = row[2]
+
+        start_dir = self.db_save_folder if self.db_save_folder else ""
+        file_path, _ = QFileDialog.getSaveFileName(
+            self,
+            "Сохранить базу данных как",
+            os.path.join(start_dir, "database.db"),
+            "SQLite DB (*.db)"
+        )
+        if not file_path:
+            return
+
+        try:
+            # В режиме WAL часть данных может лежать в файле -wal: переносим их в основной файл
+            self.db.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            shutil.copy2(current_db_path, file_path)
+            # Сохраняем путь как последнюю БД
+            self.settings.setValue("last_database", file_path)
+            QMessageBox.information(self, "Успех", f"База данных сохранена как {file_path}")
+        except Exception as e:
+            QMessageBox.critical(self, "Ошибка", f"Не удалось сохранить базу данных:\n{str(e)}")
+
+    # ==================== ИМПОРТ ИЗ ШАБЛОНА ====================
+    def import_from_template(self):
+        if self._import_in_progress():
+            return
+        file_path, _ = QFileDialog.getOpenFileName(
+            self,
+            "Выберите файл для импорта",
+            self.load_folder,
+            "Excel/CSV Files (*.xlsx *.xls *.csv)"
+        )
+        if not file_path:
+            return
+
+        try:
+            if file_path.endswith('.csv'):
+                df = pd.read_csv(file_path, encoding='utf-8-sig')
+            else:
+                df = pd.read_excel(file_path)
+
+            if self._map_columns_and_import(df):
+                QMessageBox.information(self, "Успех", "Данные импортированы")
+                self._forget_column_widths()
+                self.current_df = None
+                self.current_filters = {}
+                self.show_reports()
+                self.update_summary()
+                self.update_charts()
+                self.update_filter_combos()
+        except Exception as e:
+            QMessageBox.critical(self, "Ошибка", f"Не удалось импортировать файл:\n{str(e)}")
+
+    def _map_columns_and_import(self, df):
+        cursor = self.db.conn.execute("PRAGMA table_info(reports)")
+        db_columns = [col[1] for col in cursor.fetchall() if col[1] not in ['id', 'import_date', 'import_batch_id']]
 
-            if 'всего по покупателю' in first_cell:
-                current_buyer = None
-                continue
+        dialog = QDialog(self)
+        dialog.setWindowTitle("Сопоставление колонок")
+        dialog.setMinimumWidth(600)
+        layout = QVBoxLayout(dialog)
 
-            if first_cell == 'всего' and 'по покупателю' not in first_cell:
-                print(f"Достигнута финальная строка 'Всего' на строке {i}")
-                break
+        layout.addWidget(QLabel("Сопоставьте колонки из файла с полями базы данных:"))
 
-            if first_cell.replace('.', '', 1).replace(',', '').isdigit():
-                buyer = current_buyer
-                if buyer_col < len(row) and row[buyer_col] and row[buyer_col].strip():
-                    buyer = row[buyer_col].strip()
-                    current_buyer = buyer
-                elif not buyer:
-                    continue
+        mapping_table = QTableWidget(len(df.columns), 2)
+        mapping_table.setHorizontalHeaderLabels(["Колонка в файле", "Поле в БД"])
 
-                doc_str = row[doc_col] if doc_col < len(row) else ''
-                doc_number = ''
-                doc_date = ''
-                if doc_str:
-                    parts = re.split(r'\s+от\s+', doc_str, maxsplit=1, flags=re.IGNORECASE)
-                    if len(parts) == 2:
-                        doc_number = parts[0].strip()
-                        doc_date = parts[1].strip()
-                    else:
-                        doc_number = doc_str
+        combo_boxes = []
+        for i, col in enumerate(df.columns):
+            mapping_table.setItem(i, 0, QTableWidgetItem(str(col)))
+            combo = QComboBox()
+            combo.addItems(db_columns)
+            combo_boxes.append(combo)
+            mapping_table.setCellWidget(i, 1, combo)
 
-                operation_code = row[op_col] if op_col < len(row) else ''
-                inn = row[inn_col] if inn_col < len(row) else ''
-                payment_doc = row[payment_col] if payment_col < len(row) else ''
+        layout.addWidget(mapping_table)
 
-                amount_with_vat = self._clean_number(row[amount_with_vat_col] if amount_with_vat_col < len(row) else '0')
-                amount_without_vat = self._clean_number(row[amount_without_vat_col] if amount_without_vat_col < len(row) else '0')
-                vat = self._clean_number(row[vat_col] if vat_col < len(row) else '0')
+        btn_box = QDialogButtonBox(QDialogButtonBox.StandardButton.Ok | QDialogButtonBox.StandardButton.Cancel)
+        btn_box.accepted.connect(dialog.accept)
+        btn_box.rejected.connect(dialog.reject)
+        layout.addWidget(btn_box)
 
-                if amount_with_vat == 0 and amount_without_vat == 0 and vat == 0:
-                    continue
+        if dialog.exec() != QDialog.DialogCode.Accepted:
+            return False
+        # Пока открыты окна, автозагрузка могла запустить фоновый импорт в ту же базу
+        if self._import_in_progress():
+            return False
 
-                records.append({
-                    'company': company,
-                    'period_start': period_start,
-                    'period_end': period_end,
-                    'doc_type': 'sales_book',
-                    'product_group': 'Продажи',
-                    'seller': '',
-                    'buyer': buyer,
-                    'document_number': doc_number,
-                    'document_date': doc_date,
-                    'operation_code': operation_code,
-                    'payment_document': payment_doc,
-                    'sales_amount_with_vat': amount_with_vat,
-                    'sales_amount_without_vat': amount_without_vat,
-                    'vat_to_budget': vat,
-                    'vat_deductible': 0.0,
-                    'nomenclature': '',
-                    'revenue': amount_without_vat,
-                    'cost_price': 0.0,
-                    'gross_profit': 0.0,
-                    'sales_expenses': 0.0,
-                    'other_income_expenses': 0.0,
-                    'net_profit': 0.0,
-                    'purchase_amount_with_vat': 0.0,
-                    'acceptance_date': '',
-                    'quantity': 1
-                })
-            else:
-                if not first_cell[0].isdigit():
-                    current_buyer = row[0].strip()
+        mapping = {}
+        for i, combo in enumerate(combo_boxes):
+            target_col = combo.currentText()
+            if target_col:
+                mapping[df.columns[i]] = target_col
 
-        if not records:
-            raise ValueError("Не найдено записей в книге продаж")
+        if not mapping:
+            QMessageBox.warning(self, "Предупреждение", "Не выбрано ни одного сопоставления")
+            return False
 
-        print(f"Книга продаж: найдено записей — {len(records)}")
-        return pd.DataFrame(records)
+        df_import = df.rename(columns=mapping)
+        df_import = df_import[[col for col in mapping.values() if col in db_columns]]
 
-   
+        for col in db_columns:
+            if col not in df_import.columns:
+                df_import[col] = '' if 'date' in col or 'name' in col else 0
 
-    # ==================== ОТОБРАЖЕНИЕ ДАННЫХ ====================
-    def display_data(self, df):
-        self.table_model.setRowCount(0)
+        self.db.save_data(df_import)
+        return True
+    # ============================================================================
+    # ==================== ОБРАБОТКА ФАЙЛОВ ====================
+    def process_files(self, file_paths, auto=False):
+        """
+        Запускает импорт файлов в фоновом потоке; итоги - в _on_import_finished.
+        auto - автозагрузка из папки: ход и итог в строке состояния, без окон
+        """
+        total = len(file_paths)
+        if total == 0:
+            return
+        if self._import_in_progress():
+            return
 
-        column_order = [
-            'id', 'company', 'period_start', 'period_end', 'doc_type', 'account', 'product_group',
-            'seller', 'buyer', 'nomenclature', 'article',
-            'document_number', 'document_date', 'operation_code', 'acceptance_date', 'payment_document',
-            'purchase_amount_with_vat', 'sales_amount_without_vat', 'sales_amount_with_vat',
-            'revenue', 'cost_price', 'gross_profit',
-            'sales_expenses', 'other_income_expenses', 'net_profit',
-            'vat_deductible', 'vat_to_budget', 'quantity', 
-            'osv_begin_balance_debit', 'osv_begin_balance_credit',      # Сальдо на начало
-            'osv_turnover_debit', 'osv_turnover_credit',                 # Обороты
-            'osv_end_balance_debit', 'osv_end_balance_credit',           # Сальдо на конец
-            'import_date'
-        ]
+        self.import_progress = None
+        if not auto:
+            self.import_progress = QProgressDialog("Загрузка файлов...", "Отмена", 0, total, self)
+            # Окно прогресса не модальное: главное окно остается доступным во время импорта
+            self.import_progress.setWindowModality(Qt.WindowModality.NonModal)
+            self.import_progress.setMinimumDuration(0)
+            self.import_progress.setAutoClose(False)
+            self.import_progress.setAutoReset(False)
+            self.import_progress.setValue(0)
+
+        self.import_worker = ImportWorker(self.db.db_path, file_paths, workers=self.import_workers, parent=self)
+        self.import_worker.file_started.connect(self._on_import_file_started)
+        self.import_worker.rows_read.connect(self._on_import_rows_read)
+        self.import_worker.file_finished.connect(self._on_import_file_finished)
+        self.import_worker.batch_finished.connect(self._on_import_finished)
+        if self.import_progress is not None:
+            self.import_progress.canceled.connect(self.import_worker.cancel)
+        self.import_file_name = ''
+        self.import_worker.start()
+
+    def _import_in_progress(self):
+        """True и сообщение пользователю, если фоновый импорт еще идет"""
+        if self.import_worker is not None and self.import_worker.isRunning():
+            QMessageBox.information(self, "Импорт", "Дождитесь окончания загрузки файлов или отмените ее.")
+            return True
+        return False
+
+    def _show_import_status(self, text):
+        if self.import_progress is not None:
+            self.import_progress.setLabelText(text)
+        else:
+            self.statusBar().showMessage("Автозагрузка. " + text.replace("\n", ", "))
+
+    def _on_import_file_started(self, index, name):
+        self.import_file_name = name
+        self._show_import_status(f"Обработка: {name}")
+
+    def _on_import_rows_read(self, rows):
+        self._show_import_status(f"Обработка: {self.import_file_name}\nПрочитано строк: {rows}")
+
+    def _on_import_file_finished(self, index, name, saved):
+        if self.import_progress is not None:
+            self.import_progress.setValue(index + 1)
+
+    def _on_import_finished(self, result):
+        total = len(self.import_worker.file_paths)
+        auto = self.import_progress is None
+        if not auto:
+            self.import_progress.close()
+            self.import_progress = None
+        self.import_worker.wait()
+        self.import_worker.deleteLater()
+        self.import_worker = None
+
+        success_count = result['success']
+        skipped_files = result['skipped']
+        error_files = result['errors']
+        if result['replaced'] or result['batch_ids']:
+            self._forget_column_widths()
+        if result['replaced']:
+            # Повторный импорт удалил строки прошлых пакетов - дельтой не обойтись
+            self.current_df = None
+            self.current_filters = {}
+            self.show_reports()
+            self.update_summary()
+            self.update_charts()
+            self.update_filter_combos()
+        elif result['batch_ids']:
+            self._refresh_after_import(result['batch_ids'], result['rows'])
+        if success_count > 0:
+            print(f"Записей в БД: {self.reports_model.total_rows()}")
+
+        if auto:
+            # Автозагрузка не прерывает работу окнами: итог в строке состояния, ошибки в журнал
+            for error in error_files:
+                print(f"Автозагрузка, ошибка: {error}")
+            msg = f"Автозагрузка: загружено {success_count} из {total}"
+            if skipped_files:
+                msg += f", без изменений {len(skipped_files)}"
+            if error_files:
+                msg += f", ошибок {len(error_files)}"
+            self.statusBar().showMessage(msg)
+            self._start_watch_import()
+            return
 
-        ru_headers = {
-            'id': 'ID',
-            'company': 'Компания',
-            'period_start': 'Период с',
-            'period_end': 'Период по',
-            'doc_type': 'Тип',
-            'account': 'Счет',
-            'product_group': 'Группа',
-            'seller': 'Продавец',
-            'buyer': 'Покупатель',
-            'nomenclature': 'Номенклатура',
-            'article': 'Артикул',
-            'document_number': '№ сч/ф',
-            'document_date': 'Дата сч/ф',
-            'operation_code': 'Код опер.',
-            'acceptance_date': 'Дата принятия',
-            'payment_document': 'Плат. док.',
-            'purchase_amount_with_vat': 'Сумма покупки с НДС',
-            'sales_amount_without_vat': 'Сумма продажи без НДС',
-            'sales_amount_with_vat': 'Сумма продажи с НДС',
-            'revenue': 'Выручка',
-            'cost_price': 'Себестоимость',
-            'gross_profit': 'Валовая прибыль',
-            'sales_expenses': 'Расходы на продажу',
-            'other_income_expenses': 'Прочие доходы/расходы',
-            'net_profit': 'Чистая прибыль',
-            'vat_deductible': 'НДС покупки',
-            'vat_to_budget': 'НДС продажи',
-            'quantity': 'Кол-во',
-            'osv_begin_balance_debit': 'Сальдо нач. Дебет',
-            'osv_begin_balance_credit': 'Сальдо нач. Кредит',
-            'osv_turnover_debit': 'Обороты Дебет',
-            'osv_turnover_credit': 'Обороты Кредит',
-            'osv_end_balance_debit': 'Сальдо кон. Дебет',
-            'osv_end_balance_credit': 'Сальдо кон. Кредит',
-            'import_date': 'Дата импорта'
-        }
+        msg = f"Успешно загружено: {success_count} из {total}"
+        if result['cancelled']:
+            msg += "\nЗагрузка отменена, уже загруженные файлы сохранены"
+        if skipped_files:
+            msg += f"\nБез изменений с прошлого импорта (пропущено): {len(skipped_files)}"
+        if error_files:
+            msg += "\n\nОшибки:\n" + "\n".join(error_files[:5])
+            if len(error_files) > 5:
+                msg += f"\n... и ещё {len(error_files)-5} ошибок"
+        QMessageBox.information(self, "Результат загрузки", msg)
+        self._start_watch_import()
 
-        # Словарь для перевода типов документов
-        doc_type_names = {
-            'purchase_book': 'Книга покупок',
-            'sales_book': 'Книга продаж',
-            'osv_19': 'ОСВ 19',
-            'osv_41': 'ОСВ 41',
-            'osv_41_summary': 'ОСВ 41 (итоги)',
-            # Добавьте другие типы по мере необходимости
-        }
+    def _refresh_after_import(self, batch_ids, rows):
+        """
+        Обновление окна после импорта только новыми пакетами batch_ids (строки лишь добавлены).
+        Если до импорта был задан фильтр, показанные итоги и строки относятся к другой выборке -
+        тогда они пересчитываются полностью, как раньше
+        """
+        # Фильтр со всеми пустыми значениями (после «Применить» без выбора) - тоже без фильтра
+        unfiltered = not any(value for value in self.current_filters.values())
+        self.current_filters = {}
+
+        # Таблица: первая страница из БД, общее количество - прежнее плюс добавленные строки
+        model_total = None
+        if (unfiltered and not any(value for value in self.reports_model.filters.values())
+                and self.reports_model.db is self.db):
+            model_total = self.reports_model.total_rows() + rows
+        self.show_reports(total=model_total)
+
+        # Строки в памяти (для экспорта) дополняются новыми в порядке get_filtered_data
+        if unfiltered and self.current_df is not None:
+            added = self.db.get_filtered_data(columns='export', batch_ids=batch_ids)
+            frames = [df for df in (self.current_df, added) if not df.empty]
+            self.current_df = pd.concat(frames, ignore_index=True) if frames else added
+            self.current_df = self.current_df.sort_values(
+                ['period_start', 'company'], ascending=[False, True], kind='stable', ignore_index=True)
+        else:
+            self.current_df = None
 
-        headers = [ru_headers.get(col, col) for col in column_order]
-        self.table_model.setHorizontalHeaderLabels(headers)
+        # Итоги линейны по суммам: прежние + итоги нового пакета
+        if unfiltered and self.summary_financials is not None:
+            self.update_summary(DatabaseManager.merge_financials(
+                self.summary_financials, self.db.get_financial_totals(batch_ids=batch_ids)))
+        else:
+            self.update_summary()
 
-        if df is None or df.empty:
-            return
+        # ТОП номенклатуры считается по книге продаж - без новых ее строк он не меняется
+        new_doc_types = self.db.get_distinct_values('doc_type', batch_ids=batch_ids)
+        self.update_charts(reuse_top='sales_book' not in new_doc_types)
 
-        for _, row in df.iterrows():
-            items = []
-            for col in column_order:
-                value = row[col] if col in row.index else ''
-                
-                # 👇 СПЕЦИАЛЬНАЯ ОБРАБОТКА ДЛЯ ТИПА ДОКУМЕНТА
-                if col == 'doc_type':
-                    # Переводим английское название в русское
-                    display_value = doc_type_names.get(str(value), str(value))
-                
-                elif col in ['purchase_amount_with_vat', 'sales_amount_without_vat', 'sales_amount_with_vat',
-                        'revenue', 'cost_price', 'gross_profit', 'sales_expenses',
-                        'other_income_expenses', 'net_profit', 'vat_deductible', 'vat_to_budget']:
-                    if isinstance(value, (int, float)):
-                        display_value = f"{value:,.2f} ₽".replace(",", " ")
-                    else:
-                        display_value = str(value)
-                
-                elif col == 'quantity':
-                    if isinstance(value, (int, float)):
-                        display_value = str(int(value))
-                    else:
-                        display_value = str(value)
-                
-                else:
-                    display_value = str(value)
-                
-                item = QStandardItem(display_value)
-                item.setData(value)
-                items.append(item)
-            
-            self.table_model.appendRow(items)
+        # Списки фильтров: добавляются только значения, которых в них еще нет
+        self._merge_filter_combos()
 
-        self.table_view.resizeColumnsToContents()
+    # ==================== ОТОБРАЖЕНИЕ ДАННЫХ ====================
+    def show_reports(self, total=None):
+        """Показывает строки reports текущего фильтра, подгружая их из БД по мере прокрутки"""
+        # Новая выборка открывается в порядке по умолчанию; сигнал заголовка
+        # заблокирован, чтобы сброс индикатора не запускал второй запрос
+        header = self.table_view.horizontalHeader()
+        header.blockSignals(True)
+        header.setSortIndicator(-1, Qt.SortOrder.AscendingOrder)
+        header.blockSignals(False)
+        self.reports_model.order = list(ReportsTableModel.DEFAULT_ORDER)
+        self.reports_model.set_query(self.db, self.current_filters, total=total)
+        if self.table_view.model() is not self.reports_model:
+            self.table_view.setModel(self.reports_model)
+        self._fit_columns(self.reports_model, ('reports', repr(sorted(self.reports_model.filters.items()))))
+
+    def _ensure_current_df(self):
+        """Детальные строки текущего фильтра в памяти - только для экспорта и отчетов"""
+        if self.current_df is None:
+            self.current_df = self.db.get_filtered_data(columns='export', **self.current_filters)
+        return self.current_df
+
+    def _fit_columns(self, model, projection):
+        """Ширины колонок таблицы по выборке значений (ColumnWidthEstimator) вместо resizeColumnsToContents"""
+        header = self.table_view.horizontalHeader()
+        for column, name in enumerate(model.COLUMNS):
+            width = self.view_widths.width(projection, name, model.column_values(column))
+            header.resizeSection(column, max(width + self.CELL_PADDING, header.sectionSizeHint(column)))
+
+    def _forget_column_widths(self):
+        """Данные в БД изменились - запомненные ширины колонок больше не подходят"""
+        self.view_widths.forget()
+        self.export_widths.forget()
     #=====================================================================
     # ==================== ФИЛЬТРЫ ====================
     def update_filter_combos(self):
@@ -2533,21 +4436,11 @@ class MainWindow(QMainWindow):
         self.period_combo.addItem("Все периоды")
         self.group_combo.addItem("Все группы")
 
-        if self.current_df is not None and not self.current_df.empty:
-            companies = sorted(self.current_df['company'].dropna().unique())
-            self.company_combo.addItems([str(c) for c in companies])
-
-            periods = set()
-            for date_str in self.current_df['period_start'].dropna().unique():
-                try:
-                    dt = datetime.strptime(date_str, "%Y-%m-%d")
-                    periods.add(dt.strftime("%m.%Y"))
-                except:
-                    pass
-            self.period_combo.addItems(sorted(periods))
-
-            groups = sorted(self.current_df['product_group'].dropna().unique())
-            self.group_combo.addItems([str(g) for g in groups])
+        # Значения списков - по всей БД, не по текущему фильтру (кэш DatabaseManager.get_facets)
+        facets = self.db.get_facets()
+        self.company_combo.addItems([str(c) for c in facets['company']])
+        self.period_combo.addItems(facets['period'])
+        self.group_combo.addItems([str(g) for g in facets['product_group']])
 
         index = self.company_combo.findText(current_company)
         if index >= 0:
@@ -2559,6 +4452,26 @@ class MainWindow(QMainWindow):
         if index >= 0:
             self.group_combo.setCurrentIndex(index)
 
+    def _merge_filter_combos(self):
+        """
+        Добавляет в списки фильтров новые значения БД на свои места по порядку,
+        без перестройки списков (после импорта значения только добавляются); выбор не меняется
+        """
+        facets = self.db.get_facets()
+        new_values = [
+            (self.company_combo, [str(c) for c in facets['company']]),
+            (self.period_combo, facets['period']),
+            (self.group_combo, [str(g) for g in facets['product_group']]),
+        ]
+        for combo, values in new_values:
+            # Первый пункт - "Все ...", остальные отсортированы как в get_facets
+            existing = [combo.itemText(i) for i in range(1, combo.count())]
+            known = set(existing)
+            for value in sorted(set(values) - known):
+                pos = bisect.bisect_left(existing, value)
+                existing.insert(pos, value)
+                combo.insertItem(pos + 1, value)
+
     #===================================================================================
     def _period_to_dates(self, period_str):
         import calendar
@@ -2573,7 +4486,8 @@ class MainWindow(QMainWindow):
         except:
             return None, None
 
-    def apply_filters(self):
+    def _filter_args_from_combos(self):
+        """Аргументы фильтра для DatabaseManager по текущим значениям комбобоксов и строке поиска"""
         company = self.company_combo.currentText()
         period = self.period_combo.currentText()
         product_group = self.group_combo.currentText()
@@ -2583,77 +4497,88 @@ class MainWindow(QMainWindow):
         if period != "Все периоды":
             date_from, date_to = self._period_to_dates(period)
 
-        filtered_df = self.db.get_filtered_data(
-            company=company if company != "Все компании" else None,
-            date_from=date_from,
-            date_to=date_to,
-            product_group=product_group if product_group != "Все группы" else None
-        )
+        return {
+            'company': company if company != "Все компании" else None,
+            'date_from': date_from,
+            'date_to': date_to,
+            'product_group': product_group if product_group != "Все группы" else None,
+            'search': self.search_edit.text().strip() or None,
+        }
 
-        if not filtered_df.empty:
-            self.current_df = filtered_df
-            self.display_data(filtered_df)
-            self.update_summary()
-            self.update_charts()
-        else:
-            self.current_df = pd.DataFrame()
-            self.display_data(self.current_df)
-            self.update_summary()
-            self.update_charts()
+    def apply_filters(self):
+        self.search_timer.stop()
+        self.current_filters = self._filter_args_from_combos()
+        # Детальные строки не читаются целиком: таблица подгружает их страницами
+        self.current_df = None
+        self.show_reports()
+        self.update_summary()
+        self.update_charts()
+
+    def apply_search(self):
+        """
+        Поиск по мере ввода: строка поиска добавляется к примененному фильтру,
+        обновляются таблица и итоги. Графики строятся по фильтру списков без поиска
+        """
+        self.search_timer.stop()
+        search = self.search_edit.text().strip() or None
+        if search == self.current_filters.get('search'):
+            return
+        self.current_filters = dict(self.current_filters, search=search)
+        self.current_df = None
+        self.show_reports()
+        self.update_summary()
+
+    def _chart_filters(self):
+        """Фильтр для графиков: текущий без строки поиска"""
+        return {key: value for key, value in self.current_filters.items() if key != 'search'}
 
     # ==================== РАСЧЁТ ФИНАНСОВЫХ ПОКАЗАТЕЛЕЙ ====================
     def calculate_financials(self, df=None):
         if df is None:
             df = self.current_df
-        if df is None or df.empty:
-            return {
-                'revenue_with_vat': 0.0,
-                'revenue_without_vat': 0.0,
-                'expenses_with_vat': 0.0,
-                'expenses_without_vat': 0.0,
-                'gross_profit_with_vat': 0.0,
-                'profit_without_vat': 0.0,
-                'profit_margin': 0.0,
-                'vat_sales': 0.0,
-                'vat_purchases': 0.0,
-                'vat_to_budget_net': 0.0,
-                'profit_tax': 0.0,
-            }
+        if df is None:
+            df = self.db.get_filtered_data(columns='totals', **self.current_filters)
+        if df.empty:
+            return DatabaseManager.build_financials()
 
         sales_df = df[df['doc_type'] == 'sales_book']
-        revenue_with_vat = sales_df['sales_amount_with_vat'].sum() if 'sales_amount_with_vat' in sales_df else 0.0
-        revenue_without_vat = sales_df['sales_amount_without_vat'].sum() if 'sales_amount_without_vat' in sales_df else 0.0
-        vat_sales = sales_df['vat_to_budget'].sum() if 'vat_to_budget' in sales_df else 0.0
-
         purchases_df = df[df['doc_type'] == 'purchase_book']
-        expenses_with_vat = purchases_df['purchase_amount_with_vat'].sum() if 'purchase_amount_with_vat' in purchases_df else 0.0
-        vat_purchases = purchases_df['vat_deductible'].sum() if 'vat_deductible' in purchases_df else 0.0
-        expenses_without_vat = expenses_with_vat - vat_purchases
-
-        gross_profit_with_vat = revenue_with_vat - expenses_with_vat
-        profit_without_vat = revenue_without_vat - expenses_without_vat
-
-        profit_margin = (profit_without_vat / revenue_without_vat * 100) if revenue_without_vat != 0 else 0.0
 
-        vat_to_budget_net = vat_sales - vat_purchases
-        profit_tax = profit_without_vat * 0.25  # 25% налог на прибыль
+        return DatabaseManager.build_financials(
+            revenue_with_vat=sales_df['sales_amount_with_vat'].sum() if 'sales_amount_with_vat' in sales_df else 0.0,
+            revenue_without_vat=sales_df['sales_amount_without_vat'].sum() if 'sales_amount_without_vat' in sales_df else 0.0,
+            vat_sales=sales_df['vat_to_budget'].sum() if 'vat_to_budget' in sales_df else 0.0,
+            expenses_with_vat=purchases_df['purchase_amount_with_vat'].sum() if 'purchase_amount_with_vat' in purchases_df else 0.0,
+            vat_purchases=purchases_df['vat_deductible'].sum() if 'vat_deductible' in purchases_df else 0.0,
+        )
 
-        return {
-            'revenue_with_vat': revenue_with_vat,
-            'revenue_without_vat': revenue_without_vat,
-            'expenses_with_vat': expenses_with_vat,
-            'expenses_without_vat': expenses_without_vat,
-            'gross_profit_with_vat': gross_profit_with_vat,
-            'profit_without_vat': profit_without_vat,
-            'profit_margin': profit_margin,
-            'vat_sales': vat_sales,
-            'vat_purchases': vat_purchases,
-            'vat_to_budget_net': vat_to_budget_net,
-            'profit_tax': profit_tax,
-        }
+    def _financials_from_rollup(self, rollup):
+        """Те же показатели, что calculate_financials, по строкам свертки reports_rollup"""
+        sales = rollup[rollup['doc_type'] == 'sales_book']
+        purchases = rollup[rollup['doc_type'] == 'purchase_book']
+        return DatabaseManager.build_financials(
+            revenue_with_vat=sales['sales_amount_with_vat'].sum(),
+            revenue_without_vat=sales['sales_amount_without_vat'].sum(),
+            vat_sales=sales['vat_to_budget'].sum(),
+            expenses_with_vat=purchases['purchase_amount_with_vat'].sum(),
+            vat_purchases=purchases['vat_deductible'].sum(),
+        )
 
-    def update_summary(self):
-        fin = self.calculate_financials()
+    def _current_financials(self):
+        """
+        Итоги для текущего фильтра без загрузки детальных строк:
+        без фильтра по датам и поиска - из свертки, иначе одним SQL-запросом по reports
+        """
+        if (self.current_filters.get('date_from') or self.current_filters.get('date_to')
+                or self.current_filters.get('search')):
+            return self.db.get_financial_totals(**self.current_filters)
+        return self._financials_from_rollup(self.db.get_rollup(**self.current_filters))
+
+    def update_summary(self, fin=None):
+        """Итоги текущего фильтра; fin - уже посчитанные показатели (после импорта)"""
+        if fin is None:
+            fin = self._current_financials()
+        self.summary_financials = fin
         self.revenue_with_vat_label.setText(f"Выручка с НДС: {fin['revenue_with_vat']:,.0f} ₽".replace(",", " "))
         self.expenses_with_vat_label.setText(f"Затраты с НДС: {fin['expenses_with_vat']:,.0f} ₽".replace(",", " "))
         self.gross_profit_with_vat_label.setText(f"Валовая прибыль: {fin['gross_profit_with_vat']:,.0f} ₽".replace(",", " "))
@@ -2663,9 +4588,16 @@ class MainWindow(QMainWindow):
 
     #===========================================================================================
     # ==================== ГРАФИКИ ====================
-    def update_charts(self):
-        """Создает 9 отдельных графиков и сохраняет их в файлы"""
-        if self.current_df is None or self.current_df.empty:
+    def update_charts(self, reuse_top=False):
+        """
+        Создает 9 отдельных графиков и сохраняет их в файлы.
+        Перерисовываются только графики, исходные данные которых изменились с прошлого раза.
+        reuse_top - не перечитывать ТОП номенклатуры (после импорта без строк книги продаж)
+        """
+        # Суммы для графиков берем из свертки (несколько сотен строк), а не из детальных строк
+        rollup = self.db.get_rollup(**self._chart_filters())
+        if rollup.empty:
+            self.chart_inputs = {}
             # Очищаем все холсты
             for i in range(1, 10):
                 canvas = getattr(self, f'canvas{i}', None)
@@ -2679,50 +4611,70 @@ class MainWindow(QMainWindow):
                         canvas.draw()
             return
 
-        df_clean = self.current_df.fillna(0)
-        
-        # Добавляем кварталы
-        if 'period_start' in df_clean.columns:
-            df_clean['quarter'] = pd.to_datetime(df_clean['period_start']).dt.to_period('Q')
-            df_clean['quarter_str'] = df_clean['quarter'].dt.quarter.astype(str) + 'кв'
+        # Кварталы: '2025-Q1' -> '1кв'
+        quarterly = rollup[rollup['quarter'] != ''].copy()
+        quarterly['quarter_str'] = quarterly['quarter'].str[-1] + 'кв'
 
-        sales_df = df_clean[df_clean['doc_type'] == 'sales_book']
-        purchases_df = df_clean[df_clean['doc_type'] == 'purchase_book']
+        sales_q_df = quarterly[quarterly['doc_type'] == 'sales_book']
+        purchases_q_df = quarterly[quarterly['doc_type'] == 'purchase_book']
 
-        # Словарь для хранения путей к графикам
-        self.chart_paths = {}
+        # ТОП товаров требует номенклатуры - считается отдельным запросом по reports
+        if reuse_top and 2 in self.chart_inputs:
+            top_products = self.chart_inputs[2][0]
+        else:
+            top_products = self.db.get_top_nomenclature(limit=5, **self._chart_filters())
+
+        # Исходные данные каждого графика - небольшие агрегаты; график перерисовывается,
+        # только если они отличаются от нарисованных в прошлый раз
+        purchases_sum = purchases_q_df.groupby('quarter_str')['purchase_amount_with_vat'].sum()
+        sales_sum = sales_q_df.groupby('quarter_str')['sales_amount_with_vat'].sum()
+        inputs = {
+            1: (rollup.groupby('product_group')['net_profit'].sum(),),
+            2: (top_products,),
+            3: (purchases_sum,),
+            4: (sales_sum,),
+            5: (quarterly.groupby('quarter_str')[['vat_to_budget', 'vat_deductible']].sum(),),
+            6: (sales_q_df.groupby('quarter_str')['vat_to_budget'].sum(),),
+            7: (purchases_q_df.groupby('quarter_str')['vat_deductible'].sum(),),
+            8: (sales_sum, purchases_sum),
+            9: (purchases_sum,),
+        }
+        changed = {
+            number for number, data in inputs.items()
+            if number not in self.chart_inputs or len(data) != len(self.chart_inputs[number])
+            or not all(new.equals(old) for new, old in zip(data, self.chart_inputs[number]))
+        }
+        self.chart_inputs = inputs
 
         # ===== ГРАФИК 1. Распределение прибыли =====
-        self.ax1.clear()
-        try:
-            if 'product_group' in df_clean.columns:
-                group_profit = df_clean.groupby('product_group')['net_profit'].sum()
-                if not group_profit.empty and group_profit.sum() != 0:
-                    colors1 = plt.cm.Set3(np.linspace(0, 1, len(group_profit)))
-                    self.ax1.pie(group_profit.values, labels=group_profit.index,
-                                autopct='%1.1f%%', colors=colors1, startangle=90)
-                    self.ax1.set_title('График 1. Распределение прибыли по товарным группам', fontsize=14)
+        if 1 in changed:
+            self.ax1.clear()
+            try:
+                if not rollup.empty:
+                    group_profit = rollup.groupby('product_group')['net_profit'].sum()
+                    if not group_profit.empty and group_profit.sum() != 0:
+                        colors1 = plt.cm.Set3(np.linspace(0, 1, len(group_profit)))
+                        self.ax1.pie(group_profit.values, labels=group_profit.index,
+                                    autopct='%1.1f%%', colors=colors1, startangle=90)
+                        self.ax1.set_title('График 1. Распределение прибыли по товарным группам', fontsize=14)
+                    else:
+                        self.ax1.text(0.5, 0.5, 'Нет данных', ha='center', va='center')
                 else:
                     self.ax1.text(0.5, 0.5, 'Нет данных', ha='center', va='center')
-            else:
-                self.ax1.text(0.5, 0.5, 'Нет данных', ha='center', va='center')
-        except Exception as e:
-            self.ax1.text(0.5, 0.5, f'Ошибка', ha='center', va='center')
+            except Exception as e:
+                self.ax1.text(0.5, 0.5, f'Ошибка', ha='center', va='center')
         
-        self.figure1.tight_layout()
-        path1 = "temp_chart_1.png"
-        self.figure1.savefig(path1, format='png', dpi=150, bbox_inches='tight')
-        self.chart_paths['graph1'] = path1
-        self.canvas1.draw()
+            self.figure1.tight_layout()
+            path1 = "temp_chart_1.png"
+            self.figure1.savefig(path1, format='png', dpi=150, bbox_inches='tight')
+            self.chart_paths['graph1'] = path1
+            self.canvas1.draw()
 
         # ===== ГРАФИК 2. ТОП-5 товаров =====
-        self.ax2.clear()
-        try:
-            if not sales_df.empty and 'nomenclature' in sales_df.columns:
-                product_profit = sales_df.groupby('nomenclature')['net_profit'].sum().reset_index()
-                product_profit = product_profit[product_profit['nomenclature'] != '']
-                if not product_profit.empty:
-                    top_products = product_profit.nlargest(5, 'net_profit')
+        if 2 in changed:
+            self.ax2.clear()
+            try:
+                if not top_products.empty:
                     labels = [str(x)[:20] + '...' if len(str(x)) > 20 else str(x)
                             for x in top_products['nomenclature']]
                     colors = plt.cm.viridis(np.linspace(0.2, 0.8, len(top_products)))
@@ -2737,252 +4689,256 @@ class MainWindow(QMainWindow):
                                         ha='left', va='center', fontsize=9)
                 else:
                     self.ax2.text(0.5, 0.5, 'Нет данных', ha='center', va='center')
-            else:
-                self.ax2.text(0.5, 0.5, 'Нет данных', ha='center', va='center')
-        except Exception as e:
-            self.ax2.text(0.5, 0.5, 'Ошибка', ha='center', va='center')
+            except Exception as e:
+                self.ax2.text(0.5, 0.5, 'Ошибка', ha='center', va='center')
         
-        self.figure2.tight_layout()
-        path2 = "temp_chart_2.png"
-        self.figure2.savefig(path2, format='png', dpi=150, bbox_inches='tight')
-        self.chart_paths['graph2'] = path2
-        self.canvas2.draw()
+            self.figure2.tight_layout()
+            path2 = "temp_chart_2.png"
+            self.figure2.savefig(path2, format='png', dpi=150, bbox_inches='tight')
+            self.chart_paths['graph2'] = path2
+            self.canvas2.draw()
 
         # ===== ГРАФИК 3. Закупки с НДС по кварталам =====
-        self.ax3.clear()
-        try:
-            if not purchases_df.empty and 'quarter_str' in purchases_df.columns:
-                purchases_q = purchases_df.groupby('quarter_str')['purchase_amount_with_vat'].sum().reset_index()
-                if not purchases_q.empty and purchases_q['purchase_amount_with_vat'].sum() != 0:
-                    colors = plt.cm.Oranges(np.linspace(0.3, 0.8, len(purchases_q)))
-                    x_pos = range(len(purchases_q))
-                    bars = self.ax3.bar(x_pos, purchases_q['purchase_amount_with_vat'], color=colors)
-                    self.ax3.set_title('График 3. Закупки с НДС по кварталам', fontsize=14)
-                    self.ax3.set_ylabel('Сумма, ₽')
-                    self.ax3.set_xticks(x_pos)
-                    self.ax3.set_xticklabels(purchases_q['quarter_str'])
-                    self.ax3.grid(True, alpha=0.3, axis='y')
-                    for bar in bars:
-                        height = bar.get_height()
-                        if height > 0:
-                            self.ax3.text(bar.get_x() + bar.get_width()/2., height,
-                                        f'{height:,.0f}'.replace(",", " "),
-                                        ha='center', va='bottom', fontsize=9)
+        if 3 in changed:
+            self.ax3.clear()
+            try:
+                if not purchases_q_df.empty:
+                    purchases_q = purchases_q_df.groupby('quarter_str')['purchase_amount_with_vat'].sum().reset_index()
+                    if not purchases_q.empty and purchases_q['purchase_amount_with_vat'].sum() != 0:
+                        colors = plt.cm.Oranges(np.linspace(0.3, 0.8, len(purchases_q)))
+                        x_pos = range(len(purchases_q))
+                        bars = self.ax3.bar(x_pos, purchases_q['purchase_amount_with_vat'], color=colors)
+                        self.ax3.set_title('График 3. Закупки с НДС по кварталам', fontsize=14)
+                        self.ax3.set_ylabel('Сумма, ₽')
+                        self.ax3.set_xticks(x_pos)
+                        self.ax3.set_xticklabels(purchases_q['quarter_str'])
+                        self.ax3.grid(True, alpha=0.3, axis='y')
+                        for bar in bars:
+                            height = bar.get_height()
+                            if height > 0:
+                                self.ax3.text(bar.get_x() + bar.get_width()/2., height,
+                                            f'{height:,.0f}'.replace(",", " "),
+                                            ha='center', va='bottom', fontsize=9)
+                    else:
+                        self.ax3.text(0.5, 0.5, 'Нет данных', ha='center', va='center')
                 else:
                     self.ax3.text(0.5, 0.5, 'Нет данных', ha='center', va='center')
-            else:
-                self.ax3.text(0.5, 0.5, 'Нет данных', ha='center', va='center')
-        except Exception as e:
-            self.ax3.text(0.5, 0.5, 'Ошибка', ha='center', va='center')
+            except Exception as e:
+                self.ax3.text(0.5, 0.5, 'Ошибка', ha='center', va='center')
         
-        self.figure3.tight_layout()
-        path3 = "temp_chart_3.png"
-        self.figure3.savefig(path3, format='png', dpi=150, bbox_inches='tight')
-        self.chart_paths['graph3'] = path3
-        self.canvas3.draw()
+            self.figure3.tight_layout()
+            path3 = "temp_chart_3.png"
+            self.figure3.savefig(path3, format='png', dpi=150, bbox_inches='tight')
+            self.chart_paths['graph3'] = path3
+            self.canvas3.draw()
 
         # ===== ГРАФИК 4. Выручка с НДС по кварталам =====
-        self.ax4.clear()
-        try:
-            if not sales_df.empty and 'quarter_str' in sales_df.columns:
-                revenue_q = sales_df.groupby('quarter_str')['sales_amount_with_vat'].sum().reset_index()
-                if not revenue_q.empty and revenue_q['sales_amount_with_vat'].sum() != 0:
-                    colors = plt.cm.Blues(np.linspace(0.3, 0.8, len(revenue_q)))
-                    x_pos = range(len(revenue_q))
-                    bars = self.ax4.bar(x_pos, revenue_q['sales_amount_with_vat'], color=colors)
-                    self.ax4.set_title('График 4. Выручка с НДС по кварталам', fontsize=14)
-                    self.ax4.set_ylabel('Сумма, ₽')
-                    self.ax4.set_xticks(x_pos)
-                    self.ax4.set_xticklabels(revenue_q['quarter_str'])
-                    self.ax4.grid(True, alpha=0.3, axis='y')
-                    for bar in bars:
-                        height = bar.get_height()
-                        if height > 0:
-                            self.ax4.text(bar.get_x() + bar.get_width()/2., height,
-                                        f'{height:,.0f}'.replace(",", " "),
-                                        ha='center', va='bottom', fontsize=9)
+        if 4 in changed:
+            self.ax4.clear()
+            try:
+                if not sales_q_df.empty:
+                    revenue_q = sales_q_df.groupby('quarter_str')['sales_amount_with_vat'].sum().reset_index()
+                    if not revenue_q.empty and revenue_q['sales_amount_with_vat'].sum() != 0:
+                        colors = plt.cm.Blues(np.linspace(0.3, 0.8, len(revenue_q)))
+                        x_pos = range(len(revenue_q))
+                        bars = self.ax4.bar(x_pos, revenue_q['sales_amount_with_vat'], color=colors)
+                        self.ax4.set_title('График 4. Выручка с НДС по кварталам', fontsize=14)
+                        self.ax4.set_ylabel('Сумма, ₽')
+                        self.ax4.set_xticks(x_pos)
+                        self.ax4.set_xticklabels(revenue_q['quarter_str'])
+                        self.ax4.grid(True, alpha=0.3, axis='y')
+                        for bar in bars:
+                            height = bar.get_height()
+                            if height > 0:
+                                self.ax4.text(bar.get_x() + bar.get_width()/2., height,
+                                            f'{height:,.0f}'.replace(",", " "),
+                                            ha='center', va='bottom', fontsize=9)
+                    else:
+                        self.ax4.text(0.5, 0.5, 'Нет данных', ha='center', va='center')
                 else:
                     self.ax4.text(0.5, 0.5, 'Нет данных', ha='center', va='center')
-            else:
-                self.ax4.text(0.5, 0.5, 'Нет данных', ha='center', va='center')
-        except Exception as e:
-            self.ax4.text(0.5, 0.5, 'Ошибка', ha='center', va='center')
+            except Exception as e:
+                self.ax4.text(0.5, 0.5, 'Ошибка', ha='center', va='center')
         
-        self.figure4.tight_layout()
-        path4 = "temp_chart_4.png"
-        self.figure4.savefig(path4, format='png', dpi=150, bbox_inches='tight')
-        self.chart_paths['graph4'] = path4
-        self.canvas4.draw()
+            self.figure4.tight_layout()
+            path4 = "temp_chart_4.png"
+            self.figure4.savefig(path4, format='png', dpi=150, bbox_inches='tight')
+            self.chart_paths['graph4'] = path4
+            self.canvas4.draw()
 
         # ===== ГРАФИК 5. НДС в бюджет по кварталам =====
-        self.ax5.clear()
-        try:
-            if 'quarter_str' in df_clean.columns:
-                vat_budget = df_clean.groupby('quarter_str').apply(
-                    lambda x: x['vat_to_budget'].sum() - x['vat_deductible'].sum()
-                ).reset_index(name='vat_budget')
-                if not vat_budget.empty and vat_budget['vat_budget'].sum() != 0:
-                    colors = plt.cm.Reds(np.linspace(0.3, 0.8, len(vat_budget)))
-                    x_pos = range(len(vat_budget))
-                    bars = self.ax5.bar(x_pos, vat_budget['vat_budget'], color=colors)
-                    self.ax5.set_title('График 5. НДС в бюджет по кварталам', fontsize=14)
-                    self.ax5.set_ylabel('Сумма НДС, ₽')
-                    self.ax5.set_xticks(x_pos)
-                    self.ax5.set_xticklabels(vat_budget['quarter_str'])
-                    self.ax5.grid(True, alpha=0.3, axis='y')
-                    for bar in bars:
-                        height = bar.get_height()
-                        if height > 0:
-                            self.ax5.text(bar.get_x() + bar.get_width()/2., height,
-                                        f'{height:,.0f}'.replace(",", " "),
-                                        ha='center', va='bottom', fontsize=9)
+        if 5 in changed:
+            self.ax5.clear()
+            try:
+                if not quarterly.empty:
+                    vat_sums = quarterly.groupby('quarter_str')[['vat_to_budget', 'vat_deductible']].sum()
+                    vat_budget = (vat_sums['vat_to_budget'] - vat_sums['vat_deductible']).reset_index(name='vat_budget')
+                    if not vat_budget.empty and vat_budget['vat_budget'].sum() != 0:
+                        colors = plt.cm.Reds(np.linspace(0.3, 0.8, len(vat_budget)))
+                        x_pos = range(len(vat_budget))
+                        bars = self.ax5.bar(x_pos, vat_budget['vat_budget'], color=colors)
+                        self.ax5.set_title('График 5. НДС в бюджет по кварталам', fontsize=14)
+                        self.ax5.set_ylabel('Сумма НДС, ₽')
+                        self.ax5.set_xticks(x_pos)
+                        self.ax5.set_xticklabels(vat_budget['quarter_str'])
+                        self.ax5.grid(True, alpha=0.3, axis='y')
+                        for bar in bars:
+                            height = bar.get_height()
+                            if height > 0:
+                                self.ax5.text(bar.get_x() + bar.get_width()/2., height,
+                                            f'{height:,.0f}'.replace(",", " "),
+                                            ha='center', va='bottom', fontsize=9)
+                    else:
+                        self.ax5.text(0.5, 0.5, 'Нет данных', ha='center', va='center')
                 else:
                     self.ax5.text(0.5, 0.5, 'Нет данных', ha='center', va='center')
-            else:
-                self.ax5.text(0.5, 0.5, 'Нет данных', ha='center', va='center')
-        except Exception as e:
-            self.ax5.text(0.5, 0.5, 'Ошибка', ha='center', va='center')
+            except Exception as e:
+                self.ax5.text(0.5, 0.5, 'Ошибка', ha='center', va='center')
         
-        self.figure5.tight_layout()
-        path5 = "temp_chart_5.png"
-        self.figure5.savefig(path5, format='png', dpi=150, bbox_inches='tight')
-        self.chart_paths['graph5'] = path5
-        self.canvas5.draw()
+            self.figure5.tight_layout()
+            path5 = "temp_chart_5.png"
+            self.figure5.savefig(path5, format='png', dpi=150, bbox_inches='tight')
+            self.chart_paths['graph5'] = path5
+            self.canvas5.draw()
 
         # ===== ГРАФИК 6. НДС по выручке по кварталам =====
-        self.ax6.clear()
-        try:
-            if not sales_df.empty and 'quarter_str' in sales_df.columns:
-                vat_sales_q = sales_df.groupby('quarter_str')['vat_to_budget'].sum().reset_index()
-                if not vat_sales_q.empty and vat_sales_q['vat_to_budget'].sum() != 0:
-                    colors = plt.cm.Greens(np.linspace(0.3, 0.8, len(vat_sales_q)))
-                    x_pos = range(len(vat_sales_q))
-                    bars = self.ax6.bar(x_pos, vat_sales_q['vat_to_budget'], color=colors)
-                    self.ax6.set_title('График 6. НДС по выручке по кварталам', fontsize=14)
-                    self.ax6.set_ylabel('Сумма НДС, ₽')
-                    self.ax6.set_xticks(x_pos)
-                    self.ax6.set_xticklabels(vat_sales_q['quarter_str'])
-                    self.ax6.grid(True, alpha=0.3, axis='y')
-                    for bar in bars:
-                        height = bar.get_height()
-                        if height > 0:
-                            self.ax6.text(bar.get_x() + bar.get_width()/2., height,
-                                        f'{height:,.0f}'.replace(",", " "),
-                                        ha='center', va='bottom', fontsize=9)
+        if 6 in changed:
+            self.ax6.clear()
+            try:
+                if not sales_q_df.empty:
+                    vat_sales_q = sales_q_df.groupby('quarter_str')['vat_to_budget'].sum().reset_index()
+                    if not vat_sales_q.empty and vat_sales_q['vat_to_budget'].sum() != 0:
+                        colors = plt.cm.Greens(np.linspace(0.3, 0.8, len(vat_sales_q)))
+                        x_pos = range(len(vat_sales_q))
+                        bars = self.ax6.bar(x_pos, vat_sales_q['vat_to_budget'], color=colors)
+                        self.ax6.set_title('График 6. НДС по выручке по кварталам', fontsize=14)
+                        self.ax6.set_ylabel('Сумма НДС, ₽')
+                        self.ax6.set_xticks(x_pos)
+                        self.ax6.set_xticklabels(vat_sales_q['quarter_str'])
+                        self.ax6.grid(True, alpha=0.3, axis='y')
+                        for bar in bars:
+                            height = bar.get_height()
+                            if height > 0:
+                                self.ax6.text(bar.get_x() + bar.get_width()/2., height,
+                                            f'{height:,.0f}'.replace(",", " "),
+                                            ha='center', va='bottom', fontsize=9)
+                    else:
+                        self.ax6.text(0.5, 0.5, 'Нет данных', ha='center', va='center')
                 else:
                     self.ax6.text(0.5, 0.5, 'Нет данных', ha='center', va='center')
-            else:
-                self.ax6.text(0.5, 0.5, 'Нет данных', ha='center', va='center')
-        except Exception as e:
-            self.ax6.text(0.5, 0.5, 'Ошибка', ha='center', va='center')
+            except Exception as e:
+                self.ax6.text(0.5, 0.5, 'Ошибка', ha='center', va='center')
         
-        self.figure6.tight_layout()
-        path6 = "temp_chart_6.png"
-        self.figure6.savefig(path6, format='png', dpi=150, bbox_inches='tight')
-        self.chart_paths['graph6'] = path6
-        self.canvas6.draw()
+            self.figure6.tight_layout()
+            path6 = "temp_chart_6.png"
+            self.figure6.savefig(path6, format='png', dpi=150, bbox_inches='tight')
+            self.chart_paths['graph6'] = path6
+            self.canvas6.draw()
 
         # ===== ГРАФИК 7. НДС по затратам по кварталам =====
-        self.ax7.clear()
-        try:
-            if not purchases_df.empty and 'quarter_str' in purchases_df.columns:
-                vat_purchases_q = purchases_df.groupby('quarter_str')['vat_deductible'].sum().reset_index()
-                if not vat_purchases_q.empty and vat_purchases_q['vat_deductible'].sum() != 0:
-                    colors = plt.cm.Oranges(np.linspace(0.3, 0.8, len(vat_purchases_q)))
-                    x_pos = range(len(vat_purchases_q))
-                    bars = self.ax7.bar(x_pos, vat_purchases_q['vat_deductible'], color=colors)
-                    self.ax7.set_title('График 7. НДС по затратам по кварталам', fontsize=14)
-                    self.ax7.set_ylabel('Сумма НДС, ₽')
-                    self.ax7.set_xticks(x_pos)
-                    self.ax7.set_xticklabels(vat_purchases_q['quarter_str'])
-                    self.ax7.grid(True, alpha=0.3, axis='y')
-                    for bar in bars:
-                        height = bar.get_height()
-                        if height > 0:
-                            self.ax7.text(bar.get_x() + bar.get_width()/2., height,
-                                        f'{height:,.0f}'.replace(",", " "),
-                                        ha='center', va='bottom', fontsize=9)
+        if 7 in changed:
+            self.ax7.clear()
+            try:
+                if not purchases_q_df.empty:
+                    vat_purchases_q = purchases_q_df.groupby('quarter_str')['vat_deductible'].sum().reset_index()
+                    if not vat_purchases_q.empty and vat_purchases_q['vat_deductible'].sum() != 0:
+                        colors = plt.cm.Oranges(np.linspace(0.3, 0.8, len(vat_purchases_q)))
+                        x_pos = range(len(vat_purchases_q))
+                        bars = self.ax7.bar(x_pos, vat_purchases_q['vat_deductible'], color=colors)
+                        self.ax7.set_title('График 7. НДС по затратам по кварталам', fontsize=14)
+                        self.ax7.set_ylabel('Сумма НДС, ₽')
+                        self.ax7.set_xticks(x_pos)
+                        self.ax7.set_xticklabels(vat_purchases_q['quarter_str'])
+                        self.ax7.grid(True, alpha=0.3, axis='y')
+                        for bar in bars:
+                            height = bar.get_height()
+                            if height > 0:
+                                self.ax7.text(bar.get_x() + bar.get_width()/2., height,
+                                            f'{height:,.0f}'.replace(",", " "),
+                                            ha='center', va='bottom', fontsize=9)
+                    else:
+                        self.ax7.text(0.5, 0.5, 'Нет данных', ha='center', va='center')
                 else:
                     self.ax7.text(0.5, 0.5, 'Нет данных', ha='center', va='center')
-            else:
-                self.ax7.text(0.5, 0.5, 'Нет данных', ha='center', va='center')
-        except Exception as e:
-            self.ax7.text(0.5, 0.5, 'Ошибка', ha='center', va='center')
+            except Exception as e:
+                self.ax7.text(0.5, 0.5, 'Ошибка', ha='center', va='center')
         
-        self.figure7.tight_layout()
-        path7 = "temp_chart_7.png"
-        self.figure7.savefig(path7, format='png', dpi=150, bbox_inches='tight')
-        self.chart_paths['graph7'] = path7
-        self.canvas7.draw()
+            self.figure7.tight_layout()
+            path7 = "temp_chart_7.png"
+            self.figure7.savefig(path7, format='png', dpi=150, bbox_inches='tight')
+            self.chart_paths['graph7'] = path7
+            self.canvas7.draw()
 
         # ===== ГРАФИК 8. Валовая прибыль по кварталам =====
-        self.ax8.clear()
-        try:
-            if not sales_df.empty and not purchases_df.empty:
-                revenue_q = sales_df.groupby('quarter_str')['sales_amount_with_vat'].sum().reset_index()
-                expenses_q = purchases_df.groupby('quarter_str')['purchase_amount_with_vat'].sum().reset_index()
-                profit_q = pd.merge(revenue_q, expenses_q, on='quarter_str', how='outer').fillna(0)
-                profit_q['gross_profit'] = profit_q['sales_amount_with_vat'] - profit_q['purchase_amount_with_vat']
-                if not profit_q.empty and profit_q['gross_profit'].sum() != 0:
-                    colors = plt.cm.Purples(np.linspace(0.3, 0.8, len(profit_q)))
-                    x_pos = range(len(profit_q))
-                    bars = self.ax8.bar(x_pos, profit_q['gross_profit'], color=colors)
-                    self.ax8.set_title('График 8. Валовая прибыль по кварталам', fontsize=14)
-                    self.ax8.set_ylabel('Прибыль, ₽')
-                    self.ax8.set_xticks(x_pos)
-                    self.ax8.set_xticklabels(profit_q['quarter_str'])
-                    self.ax8.grid(True, alpha=0.3, axis='y')
-                    for bar in bars:
-                        height = bar.get_height()
-                        if height > 0:
-                            self.ax8.text(bar.get_x() + bar.get_width()/2., height,
-                                        f'{height:,.0f}'.replace(",", " "),
-                                        ha='center', va='bottom', fontsize=9)
+        if 8 in changed:
+            self.ax8.clear()
+            try:
+                if not sales_q_df.empty and not purchases_q_df.empty:
+                    revenue_q = sales_q_df.groupby('quarter_str')['sales_amount_with_vat'].sum().reset_index()
+                    expenses_q = purchases_q_df.groupby('quarter_str')['purchase_amount_with_vat'].sum().reset_index()
+                    profit_q = pd.merge(revenue_q, expenses_q, on='quarter_str', how='outer').fillna(0)
+                    profit_q['gross_profit'] = profit_q['sales_amount_with_vat'] - profit_q['purchase_amount_with_vat']
+                    if not profit_q.empty and profit_q['gross_profit'].sum() != 0:
+                        colors = plt.cm.Purples(np.linspace(0.3, 0.8, len(profit_q)))
+                        x_pos = range(len(profit_q))
+                        bars = self.ax8.bar(x_pos, profit_q['gross_profit'], color=colors)
+                        self.ax8.set_title('График 8. Валовая прибыль по кварталам', fontsize=14)
+                        self.ax8.set_ylabel('Прибыль, ₽')
+                        self.ax8.set_xticks(x_pos)
+                        self.ax8.set_xticklabels(profit_q['quarter_str'])
+                        self.ax8.grid(True, alpha=0.3, axis='y')
+                        for bar in bars:
+                            height = bar.get_height()
+                            if height > 0:
+                                self.ax8.text(bar.get_x() + bar.get_width()/2., height,
+                                            f'{height:,.0f}'.replace(",", " "),
+                                            ha='center', va='bottom', fontsize=9)
+                    else:
+                        self.ax8.text(0.5, 0.5, 'Нет данных', ha='center', va='center')
                 else:
                     self.ax8.text(0.5, 0.5, 'Нет данных', ha='center', va='center')
-            else:
-                self.ax8.text(0.5, 0.5, 'Нет данных', ha='center', va='center')
-        except Exception as e:
-            self.ax8.text(0.5, 0.5, 'Ошибка', ha='center', va='center')
+            except Exception as e:
+                self.ax8.text(0.5, 0.5, 'Ошибка', ha='center', va='center')
         
-        self.figure8.tight_layout()
-        path8 = "temp_chart_8.png"
-        self.figure8.savefig(path8, format='png', dpi=150, bbox_inches='tight')
-        self.chart_paths['graph8'] = path8
-        self.canvas8.draw()
+            self.figure8.tight_layout()
+            path8 = "temp_chart_8.png"
+            self.figure8.savefig(path8, format='png', dpi=150, bbox_inches='tight')
+            self.chart_paths['graph8'] = path8
+            self.canvas8.draw()
 
         # ===== ГРАФИК 9. Затраты по кварталам =====
-        self.ax9.clear()
-        try:
-            if not purchases_df.empty and 'quarter_str' in purchases_df.columns:
-                expenses_q = purchases_df.groupby('quarter_str')['purchase_amount_with_vat'].sum().reset_index()
-                if not expenses_q.empty and expenses_q['purchase_amount_with_vat'].sum() != 0:
-                    colors = plt.cm.Reds(np.linspace(0.3, 0.8, len(expenses_q)))
-                    x_pos = range(len(expenses_q))
-                    bars = self.ax9.bar(x_pos, expenses_q['purchase_amount_with_vat'], color=colors)
-                    self.ax9.set_title('График 9. Затраты по кварталам (все налоги и закупки)', fontsize=14)
-                    self.ax9.set_ylabel('Сумма затрат, ₽')
-                    self.ax9.set_xticks(x_pos)
-                    self.ax9.set_xticklabels(expenses_q['quarter_str'])
-                    self.ax9.grid(True, alpha=0.3, axis='y')
-                    for bar in bars:
-                        height = bar.get_height()
-                        if height > 0:
-                            self.ax9.text(bar.get_x() + bar.get_width()/2., height,
-                                        f'{height:,.0f}'.replace(",", " "),
-                                        ha='center', va='bottom', fontsize=9)
+        if 9 in changed:
+            self.ax9.clear()
+            try:
+                if not purchases_q_df.empty:
+                    expenses_q = purchases_q_df.groupby('quarter_str')['purchase_amount_with_vat'].sum().reset_index()
+                    if not expenses_q.empty and expenses_q['purchase_amount_with_vat'].sum() != 0:
+                        colors = plt.cm.Reds(np.linspace(0.3, 0.8, len(expenses_q)))
+                        x_pos = range(len(expenses_q))
+                        bars = self.ax9.bar(x_pos, expenses_q['purchase_amount_with_vat'], color=colors)
+                        self.ax9.set_title('График 9. Затраты по кварталам (все налоги и закупки)', fontsize=14)
+                        self.ax9.set_ylabel('Сумма затрат, ₽')
+                        self.ax9.set_xticks(x_pos)
+                        self.ax9.set_xticklabels(expenses_q['quarter_str'])
+                        self.ax9.grid(True, alpha=0.3, axis='y')
+                        for bar in bars:
+                            height = bar.get_height()
+                            if height > 0:
+                                self.ax9.text(bar.get_x() + bar.get_width()/2., height,
+                                            f'{height:,.0f}'.replace(",", " "),
+                                            ha='center', va='bottom', fontsize=9)
+                    else:
+                        self.ax9.text(0.5, 0.5, 'Нет данных', ha='center', va='center')
                 else:
                     self.ax9.text(0.5, 0.5, 'Нет данных', ha='center', va='center')
-            else:
-                self.ax9.text(0.5, 0.5, 'Нет данных', ha='center', va='center')
-        except Exception as e:
-            self.ax9.text(0.5, 0.5, 'Ошибка', ha='center', va='center')
+            except Exception as e:
+                self.ax9.text(0.5, 0.5, 'Ошибка', ha='center', va='center')
         
-        self.figure9.tight_layout()
-        path9 = "temp_chart_9.png"
-        self.figure9.savefig(path9, format='png', dpi=150, bbox_inches='tight')
-        self.chart_paths['graph9'] = path9
-        self.canvas9.draw()
+            self.figure9.tight_layout()
+            path9 = "temp_chart_9.png"
+            self.figure9.savefig(path9, format='png', dpi=150, bbox_inches='tight')
+            self.chart_paths['graph9'] = path9
+            self.canvas9.draw()
     
     
     #===============================================================
@@ -3008,6 +4964,7 @@ class MainWindow(QMainWindow):
     #=====================================================================
     # ==================== ЭКСПОРТ В EXCEL ====================
     def export_to_excel(self):
+        self._ensure_current_df()
         if self.current_df is None or self.current_df.empty:
             QMessageBox.warning(self, "Предупреждение", "Нет данных для экспорта")
             return
@@ -3080,20 +5037,15 @@ class MainWindow(QMainWindow):
                 })
                 summary_df.to_excel(writer, sheet_name='Итоги', index=False)
 
+                # Ширина колонок по выборке значений (ColumnWidthEstimator), а не по каждой ячейке
                 workbook = writer.book
-                for sheet_name in workbook.sheetnames:
+                sheets = [('Данные', df_export, ('export', repr(sorted(self.current_filters.items())))),
+                          ('Итоги', summary_df, None)]
+                for sheet_name, frame, projection in sheets:
                     worksheet = workbook[sheet_name]
-                    for column in worksheet.columns:
-                        max_length = 0
-                        column_letter = column[0].column_letter
-                        for cell in column:
-                            try:
-                                if len(str(cell.value)) > max_length:
-                                    max_length = len(str(cell.value))
-                            except:
-                                pass
-                        adjusted_width = min(max_length + 2, 50)
-                        worksheet.column_dimensions[column_letter].width = adjusted_width
+                    for number, name in enumerate(frame.columns, start=1):
+                        max_length = self.export_widths.width(projection, name, frame[name].to_numpy(), header=name)
+                        worksheet.column_dimensions[get_column_letter(number)].width = min(max_length + 2, 50)
                     for cell in worksheet[1]:
                         cell.font = Font(bold=True)
 
@@ -3110,6 +5062,7 @@ class MainWindow(QMainWindow):
                 print(f"{key}: {path} exists: {os.path.exists(path)}") """
 
         """Экспорт отчета в PDF с отдельными графиками"""
+        self._ensure_current_df()
         if self.current_df is None or self.current_df.empty:
             QMessageBox.warning(self, "Предупреждение", "Нет данных для экспорта")
             return
@@ -3204,7 +5157,7 @@ class MainWindow(QMainWindow):
             elements.append(Paragraph("Таблица 1. Основные финансовые показатели", subtitle_style))
             elements.append(Spacer(1, 5))
 
-            fin = self.calculate_financials()
+            fin = self._current_financials()
             
             table_data = [
                 ['Наименование показателя', 'Значение'],
@@ -3547,6 +5500,7 @@ class MainWindow(QMainWindow):
     # ==================== ЭКСПОРТ В WORD ====================
     def export_to_word(self):
         """Экспорт отчета в Word с отдельными графиками"""
+        self._ensure_current_df()
         if self.current_df is None or self.current_df.empty:
             QMessageBox.warning(self, "Предупреждение", "Нет данных для экспорта")
             return
@@ -3617,7 +5571,7 @@ class MainWindow(QMainWindow):
             # ===== ТАБЛИЦА 1. Финансовые показатели =====
             doc.add_heading('Таблица 1. Основные финансовые показатели', level=2)
             
-            fin = self.calculate_financials()
+            fin = self._current_financials()
             
             table = doc.add_table(rows=12, cols=2)
             table.style = 'LightShading-Accent1'
@@ -3935,11 +5889,12 @@ class MainWindow(QMainWindow):
     #=====================================================================================
     # ==================== БЫСТРЫЙ ОТЧЕТ ====================
     def generate_quick_report(self):
+        self._ensure_current_df()
         if self.current_df is None or self.current_df.empty:
             QMessageBox.warning(self, "Предупреждение", "Нет данных для отчета")
             return
 
-        fin = self.calculate_financials()
+        fin = self._current_financials()
 
         company_name = "Неизвестная компания"
         if not self.current_df.empty and 'company' in self.current_df.columns:
@@ -4071,6 +6026,17 @@ class MainWindow(QMainWindow):
             return "\n".join(lines)
         return "Нет данных"
 
+    # ==================== ДИАГНОСТИКА ЗАПРОСОВ ====================
+    def show_query_plan(self):
+        """Показывает EXPLAIN QUERY PLAN для запроса с текущими фильтрами"""
+        plan, full_scan = self.db.explain_filtered_data(**self._filter_args_from_combos())
+        text = "\n".join(plan)
+        if full_scan:
+            text += "\n\n✗ Полный просмотр таблицы reports без индекса"
+        else:
+            text += "\n\n✓ Запрос использует индексы"
+        QMessageBox.information(self, "План запроса", text)
+
     # ==================== О ПРОГРАММЕ ====================
     def show_about(self):
         # Создаём диалог
@@ -4127,6 +6093,14 @@ class MainWindow(QMainWindow):
 
 # ==================== ЗАПУСК ПРОГРАММЫ ====================
 def main():
+    # Для собранного exe: дочерние процессы параллельного импорта не должны запускать окно
+    multiprocessing.freeze_support()
+    # Замер разбора ОСВ 41 без окна: python buh_tuund.py --bench-osv41 [число номенклатур]
+    if '--bench-osv41' in sys.argv:
+        position = sys.argv.index('--bench-osv41')
+        count = sys.argv[position + 1] if len(sys.argv) > position + 1 else '100000'
+        benchmark_osv41(int(count))
+        return
     app = QApplication(sys.argv)
     app.setStyle('Fusion')
     # Устанавливаем иконку приложения
@@ -0,0 +1,164 @@
+"""
+Книги покупок и продаж: разбор масками (_classify_book_rows) против прежнего цикла по строкам
+на сгенерированных листах - промежуточные итоги, финальное 'Всего', счета-фактуры с числом
+в первой ячейке и контрагент, протянутый от заголовков и от колонки самих счетов-фактур
+"""
+import random
+from types import SimpleNamespace
+
+import pytest
+
+from buh_tuund import ReportParser
+
+
+PURCHASE_HEADER = [str(n) for n in range(1, 20)]
+SALES_HEADER = [str(n) for n in range(1, 13)] + ['13а', '13б'] + [str(n) for n in range(14, 20)]
+
+PARTIES = ['ООО Поставщик', 'АО Ёлка', 'ИП Сидоров', '  ООО Пробел  ']
+FIRST_CELLS = ['1', '12', '3.', '4,5', '7.1']
+DOCUMENTS = ['123 от 01.02.2025', '45  ОТ 03.03.2025', 'б/н', '', '7 от', 'А-1 от 05.05.2025 от 06.06.2025']
+AMOUNTS = ['1 234,56', '0', '', '-12.5', '1 000,00', '99', '0,00', 'нет']
+
+
+def generate_book(rnd, header, party_col, subtotal, rows=120, final_total=True):
+    """Лист книги: шапка с компанией и периодом, строка номеров колонок и тело из строк всех видов"""
+    keyword = 'Покупатель' if subtotal == 'Всего по продавцу' else 'Продавец'
+    sheet = [
+        ['Книга'],
+        [keyword, '', 'ООО Ромашка'],
+        ['за период с 01.01.2025 по 31.03.2025'],
+        [],
+        header,
+    ]
+    width = len(header)
+    for _ in range(rows):
+        kind = rnd.random()
+        if kind < 0.08:
+            sheet.append(rnd.choice([[], [''] * width, ['  ']]))
+        elif kind < 0.18:
+            # Заголовок контрагента; '1С-Софт' начинается с цифры - не заголовок и не счет-фактура
+            sheet.append([rnd.choice(PARTIES + ['1С-Софт', '1.2.3'])])
+        elif kind < 0.25:
+            sheet.append([rnd.choice([subtotal, subtotal.upper() + ' ООО Поставщик'])] + [''] * 5)
+        else:
+            row = [rnd.choice(FIRST_CELLS)] + [rnd.choice(['01', '02', ''])] + [rnd.choice(DOCUMENTS)]
+            row += [rnd.choice(AMOUNTS) for _ in range(width - len(row))]
+            row[party_col] = rnd.choice(['', '', ' ', rnd.choice(PARTIES)])
+            if rnd.random() < 0.1:
+                # Короткая строка из потока: колонок с суммами нет
+                row = row[:party_col + 1]
+            sheet.append(row)
+    if final_total:
+        sheet.append(['Всего', '', '', '100'])
+        sheet.append([rnd.choice(PARTIES)])
+        sheet.append(['1', '01', '9 от 09.09.2025'] + ['5'] * (width - 3))
+    return sheet
+
+
+def reference_book(parser, body, party_col, subtotal, columns):
+    """Прежний разбор книги по одной строке; columns - имя поля -> индекс колонки, суммы - с '#'"""
+    records = []
+    current_party = None
+    for row in body:
+        first_cell = str(row[0]).strip().lower() if len(row) > 0 and row[0] else ''
+        if not first_cell:
+            continue
+        if subtotal in first_cell:
+            current_party = None
+            continue
+        if first_cell == 'всего':
+            break
+        if first_cell.replace('.', '', 1).replace(',', '').isdigit():
+            party = current_party
+            if party_col < len(row) and row[party_col] and row[party_col].strip():
+                party = current_party = row[party_col].strip()
+            elif not party:
+                continue
+            record = {'party': party}
+            record['document_number'], record['document_date'] = parser._split_document(
+                row[columns['document']] if columns['document'] < len(row) else '')
+            for name, col in columns.items():
+                value = row[col] if col < len(row) else ''
+                if name.startswith('#'):
+                    record[name[1:]] = parser._clean_number(value)
+                elif name != 'document':
+                    record[name] = value
+            if all(record[name[1:]] == 0 for name in columns if name.startswith('#')):
+                continue
+            records.append(record)
+        elif not first_cell[0].isdigit():
+            current_party = row[0].strip()
+    return records
+
+
+def parsed(records, party, names):
+    frame = records.to_frame()
+    return [dict(zip(['party'] + names, values))
+            for values in zip(frame[party], *(frame[name] for name in names))]
+
+
+@pytest.fixture(params=[7, ReportParser.ROWS_CHUNK], ids=['chunk7', 'chunk10000'])
+def parser(request, monkeypatch):
+    # Маленький кусок - контрагент и 'Всего' попадают на границы кусков
+    monkeypatch.setattr(ReportParser, 'ROWS_CHUNK', request.param)
+    return ReportParser()
+
+
+@pytest.mark.parametrize('seed', range(6))
+def test_purchase_book_matches_row_loop(parser, seed):
+    rnd = random.Random(seed)
+    sheet = generate_book(rnd, PURCHASE_HEADER, 8, 'Всего по продавцу', final_total=seed % 3 != 0)
+    book = SimpleNamespace(file_path='purchase.xlsx', iter_rows=lambda: iter(sheet))
+
+    records = parser._parse_purchase_book(book)
+
+    columns = {'operation_code': 1, 'document': 2, 'acceptance_date': 7,
+               '#purchase_amount_with_vat': 13, '#vat_deductible': 14}
+    expected = reference_book(parser, sheet[5:], 8, 'всего по продавцу', columns)
+    names = ['document_number', 'document_date', 'operation_code', 'acceptance_date',
+             'purchase_amount_with_vat', 'vat_deductible']
+    assert expected
+    assert parsed(records, 'seller', names) == [{name: row[name] for name in ['party'] + names} for row in expected]
+
+
+@pytest.mark.parametrize('seed', range(6))
+def test_sales_book_matches_row_loop(parser, seed):
+    rnd = random.Random(100 + seed)
+    sheet = generate_book(rnd, SALES_HEADER, 6, 'Всего по покупателю', final_total=seed % 3 != 0)
+    book = SimpleNamespace(file_path='sales.xlsx', iter_rows=lambda: iter(sheet))
+
+    records = parser._parse_sales_book(book)
+
+    columns = {'operation_code': 1, 'document': 2, 'payment_document': 10,
+               '#sales_amount_with_vat': 13, '#sales_amount_without_vat': 14, '#vat_to_budget': 17}
+    expected = reference_book(parser, sheet[5:], 6, 'всего по покупателю', columns)
+    names = ['document_number', 'document_date', 'operation_code', 'payment_document',
+             'sales_amount_with_vat', 'sales_amount_without_vat', 'vat_to_budget']
+    assert expected
+    assert parsed(records, 'buyer', names) == [{name: row[name] for name in ['party'] + names} for row in expected]
+
+
+def test_classify_book_rows():
+    parser = ReportParser()
+    grid = parser._rows_grid([
+        ['ООО Альфа'],                      # 0 заголовок
+        ['1', '', 'doc'],                   # 1 счет-фактура Альфы
+        ['2', 'ООО Бета', 'doc'],           # 2 контрагент из колонки счета-фактуры
+        ['3,1', '', 'doc'],                 # 3 протянут от строки 2
+        ['Всего по продавцу'],              # 4 сброс
+        ['4', '', 'doc'],                   # 5 без контрагента - пропускается
+        [''],
+        ['1С-Софт'],                        # 7 начинается с цифры - не заголовок
+        ['5.', ' ООО Гамма ', 'doc'],       # 8
+        ['всего'],                          # 9 конец книги
+        ['6', 'ООО Дельта', 'doc'],
+    ])
+    positions, parties, end_party, stop = parser._classify_book_rows(grid, 1, 'всего по продавцу', None)
+    assert positions == [1, 2, 3, 8]
+    assert parties == ['ООО Альфа', 'ООО Бета', 'ООО Бета', 'ООО Гамма']
+    assert (end_party, stop) == ('ООО Гамма', 9)
+
+    # Контрагент с прошлого куска
+    positions, parties, end_party, stop = parser._classify_book_rows(
+        parser._rows_grid([['7', '', 'doc'], ['8', '', 'doc']]), 1, 'всего по продавцу', 'ООО Гамма')
+    assert (positions, parties, end_party, stop) == ([0, 1], ['ООО Гамма', 'ООО Гамма'], 'ООО Гамма', None)
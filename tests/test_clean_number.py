@@ -0,0 +1,50 @@
+"""clean_number_array должен давать то же, что _clean_number по каждой ячейке"""
+import numpy as np
+import pytest
+
+from buh_tuund import ReportParser
+
+
+CASES = {
+    'обычные': ['1 234,50', '0', '-15,3', '1234.5', '  7 ', '100'],
+    'минусы и тире': ['−12,5', '—3', '-0,5', '-.5', '.5', '5.'],
+    'не числа': ['', ' ', '-', '.', '1.2.3', '5-', '--1', 'abc', 'итого', '1,2,3'],
+    'мусор вокруг': ['12 руб.', '₽ 1 000', '(500)', '+5', '1e5', '1_000', '50%'],
+    'пробелы': ['1 234,00', '1 000', '\t42\r', '3 4 5'],
+    'цифры других письменностей': ['1 234,50', '١٢٣', '5', '٣,٥', '१२'],
+    'большие': ['1' * 30, '9' * 400, '0.' + '0' * 50 + '1'],
+    'перевод строки в ячейке': ['1\n2', '3'],
+    'пустая колонка': [],
+}
+
+MIXED = {
+    'числа и None': [1, 2.5, None, '3,5', np.nan],
+    'байты': [b'12,5', '4'],
+}
+
+
+@pytest.fixture
+def parser():
+    return ReportParser()
+
+
+def expected(parser, values):
+    return np.array([parser._clean_number(v) for v in values], dtype=float)
+
+
+@pytest.mark.parametrize('values', list(CASES.values()) + list(MIXED.values()),
+                         ids=list(CASES) + list(MIXED))
+def test_clean_number_array_matches_clean_number(parser, values):
+    result = parser.clean_number_array(values)
+    np.testing.assert_array_equal(result, expected(parser, values))
+
+
+def test_clean_number_array_per_cell(parser):
+    # Каждая ячейка отдельно - тот же результат, что в колонке
+    for values in CASES.values():
+        for value in values:
+            assert parser.clean_number_array([value])[0] == parser._clean_number(value)
+
+
+def test_unicode_digits_do_not_abort_column(parser):
+    assert parser.clean_number_array(['1 234,50', '١٢٣', '5']).tolist() == [1234.5, 123.0, 5.0]
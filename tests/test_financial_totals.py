@@ -0,0 +1,69 @@
+"""get_financial_totals (SQL) должен совпадать с MainWindow.calculate_financials по тем же строкам"""
+from types import SimpleNamespace
+
+import pandas as pd
+import pytest
+
+from buh_tuund import DatabaseManager, MainWindow
+
+
+ROWS = [
+    # doc_type, company, period_start, period_end, продажа с НДС, без НДС, НДС продажи, покупка с НДС, НДС покупки
+    ('sales_book', 'ООО Ромашка', '2025-01-01', '2025-03-31', 1200.0, 1000.0, 200.0, 0.0, 0.0),
+    ('sales_book', 'ООО Ромашка', '2025-04-01', '2025-06-30', 600.5, 500.4, 100.1, 0.0, 0.0),
+    ('sales_book', 'ООО Лютик', '2025-01-01', '2025-03-31', 360.0, 300.0, 60.0, 0.0, 0.0),
+    ('purchase_book', 'ООО Ромашка', '2025-01-01', '2025-03-31', 0.0, 0.0, 0.0, 480.0, 80.0),
+    ('purchase_book', 'ООО Ромашка', '2025-04-01', '2025-06-30', 0.0, 0.0, 0.0, 240.25, 40.05),
+    ('purchase_book', 'ООО Лютик', '2025-04-01', '2025-06-30', 0.0, 0.0, 0.0, 120.0, 20.0),
+    # Суммы ОСВ не входят в итоги
+    ('osv_41', 'ООО Ромашка', '2025-01-01', '2025-03-31', 999.0, 999.0, 999.0, 999.0, 999.0),
+]
+
+AMOUNTS = ['sales_amount_with_vat', 'sales_amount_without_vat', 'vat_to_budget',
+           'purchase_amount_with_vat', 'vat_deductible']
+
+FILTERS = [
+    {},
+    {'company': 'ООО Ромашка'},
+    {'date_from': '2025-04-01', 'date_to': '2025-06-30'},
+    {'company': 'ООО Лютик', 'date_from': '2025-01-01', 'date_to': '2025-03-31'},
+    {'doc_type': 'sales_book'},
+    {'company': 'Нет такой'},
+]
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = DatabaseManager(str(tmp_path / 'reports.db'))
+    df = pd.DataFrame(ROWS, columns=['doc_type', 'company', 'period_start', 'period_end'] + AMOUNTS)
+    db.save_data(df)
+    # Строки из старых БД: суммы NULL вместо 0
+    db.conn.execute("UPDATE reports SET sales_amount_without_vat = NULL, vat_to_budget = NULL "
+                    "WHERE doc_type = 'sales_book' AND company = 'ООО Лютик'")
+    db.conn.execute("UPDATE reports SET vat_deductible = NULL WHERE doc_type = 'purchase_book' "
+                    "AND period_start = '2025-04-01' AND company = 'ООО Ромашка'")
+    db.conn.commit()
+    yield db
+    db.conn.close()
+
+
+def calculate_financials(df):
+    # Метод окна считает по переданному DataFrame и не обращается к самому окну
+    return MainWindow.calculate_financials(SimpleNamespace(), df)
+
+
+@pytest.mark.parametrize('filters', FILTERS, ids=[repr(f) for f in FILTERS])
+def test_financial_totals_match_calculate_financials(db, filters):
+    from_sql = db.get_financial_totals(**filters)
+    from_rows = calculate_financials(db.get_filtered_data(**filters))
+
+    assert from_sql.keys() == from_rows.keys()
+    for key in from_sql:
+        assert from_sql[key] == pytest.approx(from_rows[key]), key
+
+
+def test_null_amounts_are_skipped(db):
+    totals = db.get_financial_totals(company='ООО Лютик')
+    assert totals['revenue_with_vat'] == pytest.approx(360.0)
+    assert totals['revenue_without_vat'] == pytest.approx(0.0)
+    assert totals['vat_purchases'] == pytest.approx(20.0)
@@ -0,0 +1,73 @@
+"""ImportWorker в режиме пула процессов: ход чтения строк из процессов и отмена внутри разбора"""
+import openpyxl
+import pytest
+
+from buh_tuund import DatabaseManager, ImportWorker, LoadedWorkbook
+
+
+BOOK_ROWS = LoadedWorkbook.PROGRESS_ROWS + 500
+
+
+def write_purchase_book(path, rows):
+    workbook = openpyxl.Workbook()
+    sheet = workbook.active
+    sheet.append(['Книга покупок'])
+    sheet.append(['Покупатель', 'ООО Ромашка'])
+    sheet.append(['за период с 01.01.2025 по 31.03.2025'])
+    sheet.append([str(n) for n in range(1, 20)])
+    sheet.append(['ООО Поставщик'])
+    for k in range(rows):
+        sheet.append([str(k + 1), '01', f'{k} от 01.02.2025'] + [''] * 10 + ['120,00', '20,00'])
+    sheet.append(['Всего'])
+    workbook.save(path)
+
+
+@pytest.fixture(scope='module')
+def books(tmp_path_factory):
+    directory = tmp_path_factory.mktemp('books')
+    paths = [str(directory / f'book{n}.xlsx') for n in range(2)]
+    for path in paths:
+        write_purchase_book(path, BOOK_ROWS)
+    return paths
+
+
+def run_worker(db_path, paths, on_rows=None):
+    """ImportWorker.run в этом потоке; сигналы собираются в список событий"""
+    worker = ImportWorker(db_path, paths, workers=2)
+    events, result = [], {}
+    worker.file_started.connect(lambda index, name: events.append(('file', index)))
+    worker.rows_read.connect(lambda rows: events.append(('rows', rows)))
+    if on_rows is not None:
+        worker.rows_read.connect(lambda rows: on_rows(worker))
+    worker.batch_finished.connect(result.update)
+    worker.run()
+    return events, result
+
+
+def test_parallel_import_forwards_row_progress(tmp_path, books):
+    events, result = run_worker(str(tmp_path / 'reports.db'), books)
+
+    assert result['success'] == 2 and not result['errors'] and not result['cancelled']
+    assert result['rows'] == 2 * BOOK_ROWS
+    # Ход каждого файла приходит после его file_started
+    progress = {0: [], 1: []}
+    current = None
+    for kind, value in events:
+        if kind == 'file':
+            current = value
+        else:
+            progress[current].append(value)
+    for index in progress:
+        assert progress[index] and progress[index][-1] >= LoadedWorkbook.PROGRESS_ROWS
+        assert progress[index] == sorted(progress[index])
+
+
+def test_parallel_import_cancel_stops_parsing(tmp_path, books):
+    db_path = str(tmp_path / 'reports.db')
+    events, result = run_worker(db_path, books, on_rows=lambda worker: worker.cancel())
+
+    assert result['cancelled']
+    assert result['success'] == 0 and result['rows'] == 0 and not result['errors']
+    db = DatabaseManager(db_path)
+    assert db.count_filtered_data() == 0
+    db.conn.close()
@@ -0,0 +1,22 @@
+"""LoadedWorkbook._cell_text: значения ячеек openpyxl в текст, как их дает read_excel(dtype=str)"""
+import pytest
+
+from buh_tuund import LoadedWorkbook
+
+
+@pytest.mark.parametrize('value, text', [
+    (None, ''),
+    ('  ООО Ромашка ', 'ООО Ромашка'),
+    ('#N/A', ''),
+    (True, 'True'),
+    (2, '2'),
+    (2.0, '2'),
+    (2.5, '2.5'),
+    (1e20, '100000000000000000000'),
+    # Не целые и не конечные: int(inf) бросал OverflowError, int(nan) - ValueError
+    (float('inf'), 'inf'),
+    (float('-inf'), '-inf'),
+    (float('nan'), ''),
+])
+def test_cell_text(value, text):
+    assert LoadedWorkbook('book.xlsx')._cell_text(value) == text
@@ -0,0 +1,82 @@
+"""ОСВ 41: разбор масками типов строк против прежнего цикла по строкам на листе generate_osv41_sheet"""
+import re
+
+import numpy as np
+import pytest
+
+from buh_tuund import DatabaseManager, LoadedWorkbook, ReportParser, benchmark_osv41, generate_osv41_sheet
+
+
+FIELDS = ['doc_type', 'account', 'nomenclature', 'article', 'document_date', 'payment_document',
+          'purchase_amount_with_vat', 'cost_price', 'quantity', 'osv_begin_balance', 'osv_end_balance',
+          'osv_turnover_debit', 'osv_turnover_credit']
+
+
+def reference_osv41(parser, df):
+    """Прежний разбор ОСВ 41: шаг по две строки от блока к блоку, суммы - из строки 'Кол.' под оборотом"""
+    cells = df.values.tolist()
+    number = lambda i, col: parser._clean_number(cells[i][col])
+    data_start = next(i for i, row in enumerate(cells) if row[0].strip() == '41')
+    records = []
+    account = nomenclature = article = None
+    i = data_start
+    while i < len(cells):
+        while i < len(cells) and (not cells[i][0] or cells[i][0] == 'nan'):
+            i += 1
+        if i >= len(cells):
+            break
+        row = cells[i]
+        first_cell = row[0].strip().lower()
+        if 'итого' in first_cell:
+            break
+        if first_cell.replace('.', '').isdigit() and len(first_cell) < 10:
+            account = row[0].strip()
+        elif first_cell[0].isdigit() and len(first_cell) > 10:
+            parts = row[0].split(' ', 1)
+            nomenclature = parts[1] if len(parts) == 2 else row[0]
+            article = row[1].strip()
+        elif 'обороты за' in first_cell and i + 1 < len(cells):
+            date_match = re.search(r'(\d{2}\.\d{2}\.\d{2,4})', first_cell)
+            op_date = date_match.group(1) if date_match else ''
+            debit, credit = number(i + 1, 5), number(i + 1, 6)
+            common = {'doc_type': 'osv_41', 'account': account, 'nomenclature': nomenclature,
+                      'article': article, 'document_date': op_date, 'payment_document': row[0],
+                      'osv_begin_balance': 0.0, 'osv_end_balance': 0.0}
+            if debit > 0:
+                records.append(dict(common, purchase_amount_with_vat=debit, cost_price=0.0, quantity=debit,
+                                    osv_turnover_debit=debit, osv_turnover_credit=0.0))
+            if credit > 0:
+                records.append(dict(common, purchase_amount_with_vat=0.0, cost_price=credit, quantity=credit,
+                                    osv_turnover_debit=0.0, osv_turnover_credit=credit))
+        i += 2
+
+    j = next(j for j in range(data_start, len(cells)) if 'итого' in cells[j][0].lower())
+    records.append({'doc_type': 'osv_41_summary', 'account': '41_ИТОГО', 'nomenclature': 'ИТОГО по счету 41',
+                    'article': '', 'document_date': '', 'payment_document': 'Итоговые данные',
+                    'purchase_amount_with_vat': number(j, 5), 'cost_price': 0.0, 'quantity': 0,
+                    'osv_begin_balance': number(j, 3), 'osv_end_balance': number(j, 7),
+                    'osv_turnover_debit': number(j, 5), 'osv_turnover_credit': number(j, 6)})
+    return [[record[name] for name in FIELDS] for record in records]
+
+
+def record_rows(records):
+    """Строки записей по FIELDS; не заданные парсером колонки - со значением по умолчанию, как при записи"""
+    columns = [records.column(name, DatabaseManager.REPORT_COLUMNS[name]) for name in FIELDS]
+    columns = [column if isinstance(column, np.ndarray) else [column] * len(records) for column in columns]
+    return [list(row) for row in zip(*columns)]
+
+
+@pytest.mark.parametrize('sku_count', [1, 60, 250])
+def test_osv41_matches_row_loop(sku_count):
+    parser = ReportParser()
+    frame = generate_osv41_sheet(sku_count)
+
+    records = parser._parse_osv_41_detailed(LoadedWorkbook.from_frame(frame, 'osv41.xlsx'))
+
+    assert record_rows(records) == reference_osv41(parser, frame)
+    assert records.column('company') == 'ООО Замер'
+    assert records.column('period_start') == '2025-01-01'
+
+
+def test_benchmark_osv41_runs():
+    assert benchmark_osv41(50) > 0
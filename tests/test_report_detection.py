@@ -0,0 +1,84 @@
+"""Распознавание типа отчета по шапке (REPORT_DETECTORS) без запуска парсеров"""
+import openpyxl
+import pytest
+
+from buh_tuund import ReportParser
+
+
+OSV_COLUMNS = [['Счет', 'Сальдо на начало периода', 'Обороты за период', 'Сальдо на конец периода'],
+               ['', 'Дебет', 'Кредит', 'Дебет', 'Кредит']]
+
+HEADERS = {
+    'purchase_book': [
+        ['Книга покупок'], ['Покупатель', 'ООО Ромашка'], ['Покупки за период с 01.01.2025 по 31.03.2025'],
+        ['№ п/п', 'Код вида операции', 'Номер и дата счета-фактуры продавца',
+         'Дата принятия на учет товаров', 'Наименование продавца', 'ИНН/КПП продавца'],
+    ],
+    'sales_book': [
+        ['Книга продаж'], ['Продавец', 'ООО Ромашка'], ['Продажи за период с 01.01.2025 по 31.03.2025'],
+        ['№ п/п', 'Код вида операции', 'Номер и дата счета-фактуры продавца',
+         'Наименование покупателя', 'ИНН/КПП покупателя', 'Стоимость продаж по счету-фактуре'],
+    ],
+    'osv_19': [['ООО Ромашка'], ['Оборотно-сальдовая ведомость по счету 19 за 2025 г.']] + OSV_COLUMNS,
+    'osv_41': [['ООО Ромашка'], ['Оборотно-сальдовая ведомость по счету 41 за 2025 г.'],
+               ['Номенклатура', 'Артикул']] + OSV_COLUMNS,
+    'osv_44': [['ООО Ромашка'], ['Оборотно-сальдовая ведомость по счету 44 за 2025 г.']] + OSV_COLUMNS,
+    'osv_60': [['ООО Ромашка'], ['Оборотно-сальдовая ведомость по счету 60 за 2025 г.'],
+               ['Контрагенты', 'Договоры']] + OSV_COLUMNS,
+    'osv_62': [['ООО Ромашка'], ['Оборотно-сальдовая ведомость по счету 62 за 2025 г.']] + OSV_COLUMNS,
+    'osv_68': [['ООО Ромашка'], ['Оборотно-сальдовая ведомость по счету 68 за 2025 г.']] + OSV_COLUMNS,
+    'osv_90': [['ООО Ромашка'], ['Оборотно-сальдовая ведомость по счету 90 за 2025 г.']] + OSV_COLUMNS,
+    'osv_91': [['ООО Ромашка'], ['Оборотно-сальдовая ведомость по счету 91 за 2025 г.']] + OSV_COLUMNS,
+    'sales_report': [['Отчет по продажам за март 2025'],
+                     ['Номенклатура', 'Количество', 'Выручка', 'Себестоимость', 'Валовая прибыль']],
+}
+
+
+def preview(rows):
+    """Текст шапки так же, как LoadedWorkbook.preview_text"""
+    return ' '.join(' '.join(row) for row in rows).lower()
+
+
+@pytest.fixture
+def parser():
+    return ReportParser()
+
+
+def test_registry_covers_every_header():
+    assert HEADERS.keys() == ReportParser.REPORT_DETECTORS.keys()
+
+
+@pytest.mark.parametrize('report_type', list(HEADERS))
+def test_detects_header(parser, report_type):
+    assert parser.detect_report_type(preview(HEADERS[report_type])) == report_type
+
+
+@pytest.mark.parametrize('rows, expected', [
+    # Книга продаж со ссылкой на книгу покупок: оба заголовка, решают подписи шапки книги продаж
+    (HEADERS['sales_book'] + [['Расхождения с книга покупок контрагента']], 'sales_book'),
+    (HEADERS['purchase_book'] + [['См. также книга продаж']], 'purchase_book'),
+    # Две ОСВ в одной шапке: номенклатура - признак ОСВ 41, контрагенты - ОСВ 60
+    (HEADERS['osv_41'] + [['Оборотно-сальдовая ведомость по счету 60']], 'osv_41'),
+    (HEADERS['osv_60'] + [['Оборотно-сальдовая ведомость по счету 41']], 'osv_60'),
+    # Одинаковый счет - больший приоритет
+    ([['Книга покупок'], ['Книга продаж'], ['Продавец', 'Покупатель']], 'purchase_book'),
+    # Подписи шапки без заголовка отчета не распознаются
+    (OSV_COLUMNS + [['Номенклатура', 'Контрагент']], None),
+    ([['Реестр платежей']], None),
+])
+def test_mixed_headers(parser, rows, expected):
+    assert parser.detect_report_type(preview(rows)) == expected
+
+
+def test_detect_file_does_not_parse(parser, tmp_path, monkeypatch):
+    for detector in ReportParser.REPORT_DETECTORS.values():
+        monkeypatch.setattr(ReportParser, detector['parser'],
+                            lambda *args: pytest.fail('распознавание не должно запускать парсер'), raising=False)
+
+    for report_type, rows in HEADERS.items():
+        workbook = openpyxl.Workbook()
+        for row in rows:
+            workbook.active.append(row)
+        path = tmp_path / f'{report_type}.xlsx'
+        workbook.save(path)
+        assert parser.detect_file(str(path)) == report_type
@@ -0,0 +1,96 @@
+"""Постраничное чтение get_data_page: продолжение по ключу и план запроса по индексу порядка"""
+import random
+
+import pandas as pd
+import pytest
+
+from buh_tuund import DatabaseManager, ReportsTableModel
+
+
+COMPANIES = ['ООО Ромашка', 'ООО Лютик', 'ооо ромашка', 'ИП Ёлкин', '']
+GROUPS = ['Продукты', 'Бытовая химия', '']
+DEFAULT_ORDER = ReportsTableModel.DEFAULT_ORDER
+KEY_START = len(ReportsTableModel.COLUMNS)
+
+FILTERS = [
+    {},
+    {'company': 'ООО Ромашка'},
+    {'doc_type': 'sales_book'},
+    {'product_group': 'Продукты'},
+    {'date_from': '2025-04-01'},
+    {'company': 'ООО Лютик', 'date_from': '2025-04-01', 'date_to': '2025-09-30'},
+    {'company': 'ООО Ромашка', 'doc_type': 'purchase_book'},
+]
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = DatabaseManager(str(tmp_path / 'reports.db'))
+    rnd = random.Random(2)
+    db.save_data(pd.DataFrame([{
+        'company': rnd.choice(COMPANIES),
+        'period_start': f'2025-0{rnd.randint(1, 9)}-01',
+        'period_end': '2025-09-30',
+        'doc_type': rnd.choice(['sales_book', 'purchase_book', 'osv_41']),
+        'product_group': rnd.choice(GROUPS),
+        'seller': rnd.choice(COMPANIES),
+    } for _ in range(400)]))
+    # Строки из старых БД: NULL в колонках ключа
+    db.conn.execute("UPDATE reports SET period_start = NULL WHERE id % 23 = 0")
+    db.conn.execute("UPDATE reports SET company = NULL WHERE id % 19 = 0")
+    db.conn.commit()
+    yield db
+    db.conn.close()
+
+
+def read_pages(db, order, filters, limit=9):
+    """id всех строк, прочитанных страницами по ключу последней строки"""
+    ids, after = [], None
+    while True:
+        rows = db.get_data_page('table', order, after=after, limit=limit, **filters)
+        ids += [row[0] for row in rows]
+        if len(rows) < limit:
+            return ids
+        after = rows[-1][KEY_START:]
+
+
+def ordered_ids(db, order, filters):
+    """Тот же порядок одним запросом без LIMIT"""
+    where, params = db._build_filter_query(**filters)
+    order_by = ', '.join(f"{db._sort_expr(col)}{' DESC' if desc else ''}" for col, desc in order)
+    return [row[0] for row in db.conn.execute(f"SELECT id FROM reports {where} ORDER BY {order_by}", params)]
+
+
+@pytest.mark.parametrize('filters', FILTERS, ids=[repr(f) for f in FILTERS])
+def test_default_order_continuation(db, filters):
+    ids = read_pages(db, DEFAULT_ORDER, filters)
+    assert ids == ordered_ids(db, DEFAULT_ORDER, filters)
+    assert len(ids) == db.count_filtered_data(**filters)
+
+
+@pytest.mark.parametrize('order', [
+    [('seller', False), ('id', False)],
+    [('seller', True), ('id', True)],
+    [('company', False), ('period_start', True), ('id', False)],
+])
+def test_text_order_continuation(db, order):
+    assert read_pages(db, order, {}) == ordered_ids(db, order, {})
+    assert read_pages(db, order, {'doc_type': 'sales_book'}) == ordered_ids(db, order, {'doc_type': 'sales_book'})
+
+
+@pytest.mark.parametrize('filters', FILTERS, ids=[repr(f) for f in FILTERS])
+def test_default_order_served_by_index(db, filters):
+    first_page = db.get_data_page('table', DEFAULT_ORDER, limit=9, **filters)
+    for after in (None, first_page[-1][KEY_START:]):
+        plan, full_scan = db.explain_filtered_data(order=DEFAULT_ORDER, after=after, **filters)
+        assert not full_scan
+        assert not any('TEMP B-TREE' in line for line in plan), plan
+        assert any('table_order' in line for line in plan), plan
+
+
+def test_sort_expressions_compare_binary(db):
+    # Сопоставление из Python сделало бы каждое сравнение ORDER BY вызовом функции
+    for column in ReportsTableModel.COLUMNS:
+        assert 'COLLATE' not in db._sort_expr(column)
+    query, _ = db._data_page_query('table', DEFAULT_ORDER, None, 500)
+    assert 'COLLATE' not in query
@@ -0,0 +1,104 @@
+"""Сортировка ReportsTableModel по колонке: русский порядок текста, пустые в конце, продолжение по страницам"""
+import random
+
+import pandas as pd
+import pytest
+from PyQt6.QtCore import Qt
+
+from buh_tuund import DatabaseManager, ReportsTableModel
+
+
+NAMES = ['ёлка', 'Елка', 'елка', 'Ель', 'ЯБЛОКО', 'яблоко', 'абрикос', 'Абрикос',
+         'Zebra', 'apple', 'Apple', '', 'ёж', 'Еж']
+DOC_TYPES = list(DatabaseManager.DOC_TYPE_NAMES) + ['unknown_type']
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = DatabaseManager(str(tmp_path / 'reports.db'))
+    rnd = random.Random(1)
+    db.save_data(pd.DataFrame([{
+        'company': rnd.choice(NAMES),
+        'period_start': f'2025-0{rnd.randint(1, 9)}-01',
+        'period_end': '2025-09-30',
+        'doc_type': rnd.choice(DOC_TYPES),
+        'nomenclature': rnd.choice(NAMES),
+        'revenue': float(rnd.randint(0, 5)),
+    } for _ in range(300)]))
+    # Строки из старых БД: NULL вместо пустых значений
+    db.conn.execute("UPDATE reports SET nomenclature = NULL WHERE id % 17 = 0")
+    db.conn.execute("UPDATE reports SET revenue = NULL WHERE id % 13 = 0")
+    db.conn.commit()
+    yield db
+    db.conn.close()
+
+
+def expected_ids(db, column, desc, label=lambda value: value, where=''):
+    """Порядок, собранный в Python: ключ collation_key (числа - значение), пустые в конце, равные по id"""
+    rows = db.conn.execute(f"SELECT id, {column} FROM reports {where}").fetchall()
+    filled = [row for row in rows if row[1] not in (None, '')]
+    empty = [row for row in rows if row[1] in (None, '')]
+    if isinstance(filled[0][1], str):
+        key = lambda row: (DatabaseManager.collation_key(label(row[1])), row[0])
+    else:
+        key = lambda row: (row[1], row[0])
+    filled.sort(key=key, reverse=desc)
+    empty.sort(key=lambda row: row[0], reverse=desc)
+    return [row[0] for row in filled + empty]
+
+
+def model_ids(model):
+    """id всех строк модели, дочитанных страницами как при прокрутке"""
+    while model.canFetchMore():
+        model.fetchMore()
+    return [model.data(model.index(row, 0), Qt.ItemDataRole.UserRole + 1) for row in range(model.rowCount())]
+
+
+def default_ids(db, where=''):
+    """Порядок по умолчанию (DEFAULT_ORDER) одним запросом"""
+    query = f"SELECT id FROM reports {where} ORDER BY period_start DESC, company, id"
+    return [row[0] for row in db.conn.execute(query)]
+
+
+@pytest.fixture
+def model(db, monkeypatch):
+    monkeypatch.setattr(ReportsTableModel, 'PAGE_SIZE', 7)
+    model = ReportsTableModel()
+    model.set_query(db)
+    return model
+
+
+def test_collation_key():
+    key = DatabaseManager.collation_key
+    assert key('Ёлка') == key('елка') == key('ЕЛКА')
+    assert sorted(['яблоко', 'Ель', 'ёж', 'Абрикос', 'елка'], key=key) == ['Абрикос', 'ёж', 'елка', 'Ель', 'яблоко']
+
+
+@pytest.mark.parametrize('column', ['company', 'nomenclature', 'revenue'])
+@pytest.mark.parametrize('desc', [False, True])
+def test_sort_by_column(db, model, column, desc):
+    order = Qt.SortOrder.DescendingOrder if desc else Qt.SortOrder.AscendingOrder
+    model.sort(ReportsTableModel.COLUMNS.index(column), order)
+    assert model_ids(model) == expected_ids(db, column, desc)
+
+
+@pytest.mark.parametrize('desc', [False, True])
+def test_doc_type_sorted_by_label(db, model, desc):
+    names = DatabaseManager.DOC_TYPE_NAMES
+    order = Qt.SortOrder.DescendingOrder if desc else Qt.SortOrder.AscendingOrder
+    model.sort(ReportsTableModel.COLUMNS.index('doc_type'), order)
+    assert model_ids(model) == expected_ids(db, 'doc_type', desc, lambda value: names.get(value, value))
+
+
+def test_sort_with_filter_and_reset(db, model):
+    model.set_query(db, {'company': 'Ель'})
+    model.sort(ReportsTableModel.COLUMNS.index('nomenclature'), Qt.SortOrder.DescendingOrder)
+    assert model_ids(model) == expected_ids(db, 'nomenclature', True, where="WHERE company = 'Ель'")
+
+    # Без колонки - снова порядок по умолчанию
+    model.sort(-1)
+    assert model_ids(model) == default_ids(db, "WHERE company = 'Ель'")
+
+
+def test_default_order_pages(db, model):
+    assert model_ids(model) == default_ids(db)